@@ -1,14 +1,43 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import time
+
+# Measured from here so /metrics can report how long importing the app took
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, File, Form, Query, Request, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import uvicorn
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
-import os
+import asyncio
+import dataclasses
+import hashlib
+import json
+import math
+import sqlite3
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 
-from models import AnalysisRequest, AnalysisResponse
+from models import (
+    AnalysisResponse, BatchSubmitResponse, BatchStatusResponse, PatientHistoryResponse,
+    PatientTrendsResponse
+)
 from services.ai_service import AIService
+from services.batch import (
+    IMAGE_EXTENSIONS, BatchJobStore, BatchTooLargeError, BatchWorkerPool, detect_file_type, expand_zip_archive,
+    is_zip_archive
+)
+from services.cache import AnalysisCache
+from services.coalescing import SingleFlight
 from services.file_processor import FileProcessor
+from services.history import AnalysisHistory, ReportRef
+from services.model_client import get_model_client
+from services.semantic_cache import SemanticCache
+from utils.concurrency import shutdown_process_pool
 from utils.config import get_settings
+from utils import metrics
+from utils.metrics import IN_FLIGHT, REQUEST_SECONDS, STAGE_SECONDS, STARTUP_SECONDS
+from utils.rate_limit import SharedTokenBucket
+from utils.resilience import UpstreamUnavailableError
+from utils.sqlite import is_busy_error
+from utils.uploads import scan_upload
 
 # Load environment variables
 load_dotenv()
@@ -20,7 +49,62 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Add CORS middleware
+# Allowance for multipart boundaries and headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    """Reject oversized upload requests from Content-Length before reading the body"""
+    content_length = request.headers.get("content-length")
+    if request.method == "POST" and content_length and content_length.isdigit():
+        if request.url.path.startswith("/analyze/batch"):
+            limit = int(settings.max_batch_request_mb * 1024 * 1024)
+        elif request.url.path.startswith("/analyze/image"):
+            # Each image of a multi-file report is size-checked on its own
+            limit = (max_upload_bytes + MULTIPART_OVERHEAD_BYTES) * max(1, settings.image_max_files)
+        else:
+            limit = max_upload_bytes + MULTIPART_OVERHEAD_BYTES
+        if int(content_length) > limit:
+            return JSONResponse(status_code=413, content={"detail": "Request body too large"})
+    return await call_next(request)
+
+_first_request_pending = True
+
+@app.middleware("http")
+async def track_analysis_requests(request: Request, call_next):
+    """Record latency and in-flight counts for analysis endpoints, up to the last byte of the body"""
+    if not metrics.enabled() or request.method != "POST" or not request.url.path.startswith("/analyze"):
+        return await call_next(request)
+    started = time.perf_counter()
+    IN_FLIGHT.inc(kind="request")
+    try:
+        response = await call_next(request)
+    except BaseException:
+        IN_FLIGHT.dec(kind="request")
+        raise
+    # Label by route template so ids in the path (/analyze/batch/{job_id}) do not each get a series
+    route = request.scope.get("route")
+    endpoint = getattr(route, "path", "unmatched")
+    # The response is sent as its body iterator is consumed; for the /stream endpoints that is
+    # where the analysis runs, so the request is only finished once the iterator is exhausted
+    response.body_iterator = _track_body(response.body_iterator, endpoint, started)
+    return response
+
+async def _track_body(body: AsyncIterator[bytes], endpoint: str, started: float) -> AsyncIterator[bytes]:
+    global _first_request_pending
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        elapsed = time.perf_counter() - started
+        IN_FLIGHT.dec(kind="request")
+        REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+        if _first_request_pending:
+            # The first request pays for lazy imports and client construction
+            _first_request_pending = False
+            STARTUP_SECONDS.set(elapsed, phase="first_request")
+
+# Add CORS middleware (added last so it also wraps 413 responses)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Configure appropriately for production
@@ -31,8 +115,380 @@ app.add_middleware(
 
 # Initialize services
 settings = get_settings()
+max_upload_bytes = int(settings.max_upload_mb * 1024 * 1024)
+# Built at import so a bad MODEL_BACKEND or replay file stops the app from starting
+model_client = get_model_client()
 ai_service = AIService()
 file_processor = FileProcessor()
+analysis_cache = AnalysisCache(
+    max_entries=settings.analysis_cache_max_entries,
+    ttl_seconds=settings.analysis_cache_ttl_seconds,
+    db_path=settings.analysis_cache_db_path or None
+) if settings.analysis_cache_enabled else None
+# Near-duplicate reports (re-exports with a new print date or letterhead), matched on the extracted text
+semantic_cache = SemanticCache(
+    threshold=settings.semantic_cache_threshold,
+    max_entries=settings.semantic_cache_max_entries
+) if settings.semantic_cache_enabled else None
+# Analyses currently running, by content key, so identical concurrent uploads share one
+in_flight_analyses = SingleFlight()
+history = AnalysisHistory(
+    settings.history_db_path,
+    batch_size=settings.history_batch_size,
+    flush_seconds=settings.history_flush_seconds
+) if settings.history_enabled else None
+
+def _cache_key(content_hash: str, file_type: str) -> str:
+    """Key for report content under the current model and prompts (cache and in-flight sharing)"""
+    return AnalysisCache.make_key(content_hash, file_type, ai_service.model_name, ai_service.prompt_version)
+
+def _build_response(analysis: Dict[str, Any]) -> AnalysisResponse:
+    """Build the API response from an AIService analysis"""
+    return AnalysisResponse(
+        success=True,
+        summary=analysis["summary"],
+        key_findings=analysis["key_findings"],
+        lifestyle_recommendations=analysis["lifestyle_recommendations"],
+        precautions=analysis["precautions"],
+        confidence_score=analysis["confidence_score"],
+        complex_terms=analysis.get("complex_terms", {}),
+        lab_results=analysis.get("lab_results", [])
+    )
+
+def _report_ref(patient_id: Optional[str], report_id: Optional[str], report_date: Optional[str]) -> Optional[ReportRef]:
+    """History reference from the optional form fields of an analysis request"""
+    if patient_id is None:
+        return None
+    try:
+        return ReportRef.parse(patient_id, report_id, report_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid history fields: {str(e)}")
+
+def _record_history(ref: Optional[ReportRef], file_type: str, payload: Dict[str, Any]) -> None:
+    """Queue a finished analysis for the patient's history"""
+    if history is not None and ref is not None:
+        history.record(ref.patient_id, ref.report_id, ref.reported_at, file_type, payload)
+
+def _validate_image_upload(files: List[UploadFile]) -> None:
+    """Reject image reports with too many files or files that are not images"""
+    if len(files) > settings.image_max_files:
+        raise HTTPException(status_code=400, detail=f"At most {settings.image_max_files} images per report")
+    for file in files:
+        # Validate file type with fallback for None content_type
+        if file.content_type is None:
+            # Check file extension as fallback
+            if not file.filename or not file.filename.lower().endswith(IMAGE_EXTENSIONS):
+                raise HTTPException(status_code=400, detail="File must be an image (JPG, PNG, GIF, BMP, TIFF)")
+        elif not file.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+
+def _validate_pdf_upload(file: UploadFile) -> None:
+    """Reject uploads that are not PDFs"""
+    # Validate file type with fallback for None content_type
+    if file.content_type is None:
+        # Check file extension as fallback
+        if not file.filename or not file.filename.lower().endswith('.pdf'):
+            raise HTTPException(status_code=400, detail="File must be a PDF")
+    elif file.content_type != 'application/pdf':
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+
+async def _scan_uploads(files: List[UploadFile]) -> str:
+    """Size-check and hash the files of one report; the hash covers them all, in order"""
+    with STAGE_SECONDS.time(stage="upload_read"):
+        hashes = [(await scan_upload(file, max_upload_bytes)).sha256 for file in files]
+    if len(hashes) == 1:
+        return hashes[0]
+    return hashlib.sha256("\n".join(hashes).encode()).hexdigest()
+
+async def _read_uploads(files: List[UploadFile]) -> List[bytes]:
+    """Read the files of one report into memory"""
+    # Read in the request, not the shared task: the upload is closed when its request ends
+    with STAGE_SECONDS.time(stage="upload_read"):
+        return [await file.read() for file in files]
+
+async def _analyze_upload(files: List[UploadFile], file_type: str, ref: Optional[ReportRef] = None) -> AnalysisResponse:
+    """
+    Run extraction and analysis for an upload, serving repeats from the cache
+
+    The upload is size-checked and hashed in one chunked pass; its bytes are
+    only loaded into memory on a cache miss.
+
+    Args:
+        files: Uploaded files of one report (several only for images), in page order
+        file_type: Type of file (image/pdf)
+        ref: Patient history entry to file the analysis under, if any
+
+    Returns:
+        The analysis response
+    """
+    content_hash = await _scan_uploads(files)
+    key = _cache_key(content_hash, file_type)
+    cached = await analysis_cache.get(key) if analysis_cache is not None else None
+    if cached is not None:
+        response = AnalysisResponse(**cached)
+    else:
+        response = await _run_coalesced(key, await _read_uploads(files), file_type)
+
+    if ref is not None:
+        _record_history(dataclasses.replace(ref, report_id=ref.report_id or content_hash), file_type, response.model_dump())
+    return response
+
+async def _analyze_bytes(data: bytes, file_type: str) -> AnalysisResponse:
+    """
+    Run extraction and analysis for raw report bytes, serving repeats from the cache
+
+    Args:
+        data: Report file bytes
+        file_type: Type of file (image/pdf)
+
+    Returns:
+        The analysis response
+    """
+    key = _cache_key(hashlib.sha256(data).hexdigest(), file_type)
+    if analysis_cache is not None:
+        cached = await analysis_cache.get(key)
+        if cached is not None:
+            return AnalysisResponse(**cached)
+
+    return await _run_coalesced(key, [data], file_type)
+
+async def _run_coalesced(key: str, data: List[bytes], file_type: str) -> AnalysisResponse:
+    """
+    Run extraction and analysis once for all concurrent requests with the same content
+
+    Identical uploads arriving while an analysis is running (client retries,
+    double submits) wait for that analysis instead of starting their own.
+    """
+    cache_key = key if analysis_cache is not None else None
+    return await in_flight_analyses.run(key, lambda: _run_analysis(data, file_type, cache_key))
+
+async def _extract_content(data: List[bytes], file_type: str) -> str:
+    """Extract report text from the bytes of a PDF or of the images of one report"""
+    if file_type == "pdf":
+        with STAGE_SECONDS.time(stage="process_pdf"):
+            return await file_processor.process_pdf_bytes(data[0])
+    with STAGE_SECONDS.time(stage="process_image"):
+        return await file_processor.process_images_bytes(data)
+
+def _semantic_namespace(file_type: str) -> str:
+    """Everything besides the report text that affects an analysis"""
+    return f"{file_type}:{ai_service.model_name}:{ai_service.prompt_version}"
+
+async def _run_analysis(data: List[bytes], file_type: str, cache_key: Optional[str]) -> AnalysisResponse:
+    """Extract and analyze report bytes, caching the result under cache_key"""
+    # Extract the report text
+    content = await _extract_content(data, file_type)
+
+    similar = semantic_cache.lookup(content, _semantic_namespace(file_type)) if semantic_cache is not None else None
+    if similar is not None:
+        response = AnalysisResponse(**similar)
+    else:
+        # Analyze with AI
+        analysis = await ai_service.analyze_medical_report(content, file_type)
+        response = _build_response(analysis)
+        if semantic_cache is not None:
+            semantic_cache.add(content, _semantic_namespace(file_type), response.model_dump())
+
+    if cache_key is not None:
+        await analysis_cache.set(cache_key, response.model_dump())
+
+    return response
+
+def _sse(event: str, data: Any) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _stream_upload(files: List[UploadFile], file_type: str, ref: Optional[ReportRef] = None) -> StreamingResponse:
+    """
+    Size-check and hash an upload, then stream its analysis as Server-Sent Events
+
+    Args:
+        files: Uploaded files of one report (several only for images), in page order
+        file_type: Type of file (image/pdf)
+        ref: Patient history entry to file the analysis under, if any
+
+    Returns:
+        Streaming response emitting one event per finished stage
+    """
+    content_hash = await _scan_uploads(files)
+    key = _cache_key(content_hash, file_type)
+    if ref is not None:
+        ref = dataclasses.replace(ref, report_id=ref.report_id or content_hash)
+    cache_key = None
+    cached = None
+    if analysis_cache is not None:
+        cache_key = key
+        cached = await analysis_cache.get(cache_key)
+
+    shared = in_flight_analyses.get(key)
+    if cached is not None:
+        _record_history(ref, file_type, cached)
+        events = _stream_cached(cached)
+    elif shared is not None:
+        # The same report is already being analyzed; report its result when it finishes
+        events = _stream_shared(shared, file_type, ref)
+    else:
+        data = await _read_uploads(files)
+        # Registered like any other analysis, so identical uploads (streamed or not) arriving
+        # while this one runs wait for its result instead of starting their own
+        progress: "asyncio.Queue[Optional[tuple]]" = asyncio.Queue()
+        task, leader = in_flight_analyses.start(
+            key, lambda: _run_streamed_analysis(data, file_type, cache_key, progress.put_nowait)
+        )
+        events = _stream_progress(task, progress, file_type, ref) if leader else _stream_shared(task, file_type, ref)
+
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _stream_cached(cached: Dict[str, Any]) -> AsyncIterator[str]:
+    """Emit a cached analysis as a single completion event"""
+    yield _sse("complete", cached)
+
+async def _stream_shared(task: "asyncio.Task[AnalysisResponse]", file_type: str,
+                         ref: Optional[ReportRef] = None) -> AsyncIterator[str]:
+    """Emit the result of an analysis already running for another request"""
+    try:
+        response = await asyncio.shield(task)
+        _record_history(ref, file_type, response.model_dump())
+        yield _sse("complete", response.model_dump())
+    except UpstreamUnavailableError as e:
+        yield _sse("error", {"detail": str(e), "retry_after": math.ceil(e.retry_after)})
+    except Exception as e:
+        yield _sse("error", {"detail": f"Analysis failed: {str(e)}"})
+
+async def _run_streamed_analysis(data: List[bytes], file_type: str, cache_key: Optional[str],
+                                 emit: Callable[[Optional[tuple]], None]) -> AnalysisResponse:
+    """
+    Run extraction and analysis for report bytes, reporting each stage as it finishes
+
+    Runs as the shared in-flight task for the report, so it keeps going (and
+    caches its result) if the client that started it disconnects.
+
+    Args:
+        data: Report file bytes (several files only for images)
+        file_type: Type of file (image/pdf)
+        cache_key: Key to store the final result under, if caching is enabled
+        emit: Called with (event, payload) for each finished stage, then with None
+
+    Returns:
+        The analysis response
+    """
+    try:
+        # Extract the report text
+        content = await _extract_content(data, file_type)
+        emit(("extracted", {"text": content}))
+
+        similar = semantic_cache.lookup(content, _semantic_namespace(file_type)) if semantic_cache is not None else None
+        if similar is not None:
+            if cache_key is not None:
+                await analysis_cache.set(cache_key, similar)
+            return AnalysisResponse(**similar)
+
+        # Stream the analysis stage by stage
+        response = None
+        async for event, payload in ai_service.stream_medical_report(content, file_type):
+            if event == "analysis":
+                response = _build_response(payload)
+                if cache_key is not None:
+                    await analysis_cache.set(cache_key, response.model_dump())
+                if semantic_cache is not None:
+                    semantic_cache.add(content, _semantic_namespace(file_type), response.model_dump())
+            else:
+                emit((event, payload))
+        if response is None:
+            raise Exception("Analysis stream ended without a result")
+        return response
+    finally:
+        emit(None)
+
+async def _stream_progress(task: "asyncio.Task[AnalysisResponse]", progress: "asyncio.Queue[Optional[tuple]]",
+                           file_type: str, ref: Optional[ReportRef] = None) -> AsyncIterator[str]:
+    """
+    Emit SSE events as the stages of an analysis this request started finish, then its result
+
+    Args:
+        task: The in-flight analysis started for this request
+        progress: Stage events put by the task, ending with None
+        file_type: Type of file (image/pdf)
+        ref: Patient history entry to file the analysis under, if any
+
+    Yields:
+        Formatted SSE events
+    """
+    try:
+        while True:
+            item = await progress.get()
+            if item is None:
+                break
+            yield _sse(*item)
+        response = await asyncio.shield(task)
+        _record_history(ref, file_type, response.model_dump())
+        yield _sse("complete", response.model_dump())
+
+    except UpstreamUnavailableError as e:
+        yield _sse("error", {"detail": str(e), "retry_after": math.ceil(e.retry_after)})
+    except Exception as e:
+        import traceback
+        print(f"Error in streaming analysis: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        yield _sse("error", {"detail": f"Analysis failed: {str(e)}"})
+
+async def _analyze_batch_item(data: bytes, file_type: str) -> Dict[str, Any]:
+    """Analyze one queued batch file"""
+    response = await _analyze_bytes(data, file_type)
+    return response.model_dump()
+
+batch_store = BatchJobStore(settings.batch_db_path, lease_seconds=settings.batch_lease_seconds)
+batch_pool = BatchWorkerPool(
+    batch_store,
+    _analyze_batch_item,
+    concurrency=settings.batch_concurrency,
+    rate_limiter=SharedTokenBucket(settings.batch_db_path, "batch", settings.batch_rate_limit_per_minute),
+    retention_seconds=settings.batch_retention_seconds
+)
+
+# Background client warm-up started with the app
+_client_warm_up: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def startup():
+    """Start the batch workers and history writer, and build the model clients in the background"""
+    global _client_warm_up
+    await batch_pool.start()
+    if history is not None:
+        await history.start()
+    if settings.warm_clients_on_startup:
+        _client_warm_up = asyncio.create_task(_warm_up_clients())
+
+async def _warm_up_clients() -> None:
+    """Build the shared clients off the event loop; failures are retried on first use"""
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(model_client.warm_up)
+    except Exception as e:
+        print(f"Client warm-up failed: {str(e)}")
+        return
+    STARTUP_SECONDS.set(time.perf_counter() - started, phase="client_warm_up")
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Drain and stop the batch workers, write pending history and release worker processes used for extraction"""
+    await batch_pool.stop(drain_timeout=settings.batch_drain_seconds)
+    if history is not None:
+        await history.stop()
+    shutdown_process_pool()
+
+@app.exception_handler(UpstreamUnavailableError)
+async def upstream_unavailable(request: Request, exc: UpstreamUnavailableError):
+    """Tell clients to back off while the model API is throttling or down"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Analysis temporarily unavailable: {str(exc)}"},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))}
+    )
 
 @app.get("/health")
 async def health_check():
@@ -40,35 +496,24 @@ async def health_check():
     return {"status": "healthy", "message": "Medical Report Analyzer API is running"}
 
 @app.post("/analyze/image", response_model=AnalysisResponse)
-async def analyze_image(file: UploadFile = File(...)):
+async def analyze_image(file: List[UploadFile] = File(...), patient_id: Optional[str] = Form(None),
+                        report_id: Optional[str] = Form(None), report_date: Optional[str] = Form(None)):
     """
     Analyze a medical report image and provide insights
+
+    A report photographed as several pictures is sent as repeated "file"
+    fields, in page order; multi-page TIFFs are read page by page. With a
+    patient_id, the analysis is also filed in that patient's history.
     """
     try:
-        # Validate file type with fallback for None content_type
-        if file.content_type is None:
-            # Check file extension as fallback
-            if not file.filename or not any(file.filename.lower().endswith(ext) for ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp']):
-                raise HTTPException(status_code=400, detail="File must be an image (JPG, PNG, GIF, BMP)")
-        elif not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
+        _validate_image_upload(file)
+        ref = _report_ref(patient_id, report_id, report_date)
         
-        # Process the image
-        image_data = await file_processor.process_image(file)
-        
-        # Analyze with AI
-        analysis = await ai_service.analyze_medical_report(image_data, "image")
-        
-        return AnalysisResponse(
-            success=True,
-            summary=analysis["summary"],
-            key_findings=analysis["key_findings"],
-            lifestyle_recommendations=analysis["lifestyle_recommendations"],
-            precautions=analysis["precautions"],
-            confidence_score=analysis["confidence_score"],
-            complex_terms=analysis.get("complex_terms", {})
-        )
+        # Process and analyze the image
+        return await _analyze_upload(file, "image", ref)
     
+    except (HTTPException, UpstreamUnavailableError):
+        raise
     except Exception as e:
         import traceback
         print(f"Error in analyze_image: {str(e)}")
@@ -76,41 +521,161 @@ async def analyze_image(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 @app.post("/analyze/pdf", response_model=AnalysisResponse)
-async def analyze_pdf(file: UploadFile = File(...)):
+async def analyze_pdf(file: UploadFile = File(...), patient_id: Optional[str] = Form(None),
+                      report_id: Optional[str] = Form(None), report_date: Optional[str] = Form(None)):
     """
     Analyze a PDF medical report and provide insights
+
+    With a patient_id, the analysis is also filed in that patient's history.
     """
     try:
-        # Validate file type with fallback for None content_type
-        if file.content_type is None:
-            # Check file extension as fallback
-            if not file.filename or not file.filename.lower().endswith('.pdf'):
-                raise HTTPException(status_code=400, detail="File must be a PDF")
-        elif file.content_type != 'application/pdf':
-            raise HTTPException(status_code=400, detail="File must be a PDF")
+        _validate_pdf_upload(file)
+        ref = _report_ref(patient_id, report_id, report_date)
         
-        # Process the PDF
-        pdf_data = await file_processor.process_pdf(file)
-        
-        # Analyze with AI
-        analysis = await ai_service.analyze_medical_report(pdf_data, "pdf")
-        
-        return AnalysisResponse(
-            success=True,
-            summary=analysis["summary"],
-            key_findings=analysis["key_findings"],
-            lifestyle_recommendations=analysis["lifestyle_recommendations"],
-            precautions=analysis["precautions"],
-            confidence_score=analysis["confidence_score"],
-            complex_terms=analysis.get("complex_terms", {})
-        )
+        # Process and analyze the PDF
+        return await _analyze_upload([file], "pdf", ref)
     
+    except (HTTPException, UpstreamUnavailableError):
+        raise
     except Exception as e:
         import traceback
         print(f"Error in analyze_pdf: {str(e)}")
         print(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
+@app.post("/analyze/image/stream")
+async def analyze_image_stream(file: List[UploadFile] = File(...), patient_id: Optional[str] = Form(None),
+                               report_id: Optional[str] = Form(None), report_date: Optional[str] = Form(None)):
+    """
+    Analyze a medical report image (or several images of one report), streaming results as Server-Sent Events
+    """
+    _validate_image_upload(file)
+    return await _stream_upload(file, "image", _report_ref(patient_id, report_id, report_date))
+
+@app.post("/analyze/pdf/stream")
+async def analyze_pdf_stream(file: UploadFile = File(...), patient_id: Optional[str] = Form(None),
+                             report_id: Optional[str] = Form(None), report_date: Optional[str] = Form(None)):
+    """
+    Analyze a PDF medical report, streaming results as Server-Sent Events
+    """
+    _validate_pdf_upload(file)
+    return await _stream_upload([file], "pdf", _report_ref(patient_id, report_id, report_date))
+
+@app.post("/analyze/batch", response_model=BatchSubmitResponse)
+async def analyze_batch(files: List[UploadFile] = File(...)):
+    """
+    Queue many report files (or zip archives of them) for background analysis
+    """
+    batch_files = []
+    # Extracted archives count against the same limits as the upload itself
+    max_batch_bytes = int(settings.max_batch_request_mb * 1024 * 1024)
+    batch_bytes = 0
+    for file in files:
+        if is_zip_archive(file.filename, file.content_type):
+            await scan_upload(file, max_batch_bytes)
+        else:
+            await scan_upload(file, max_upload_bytes)
+        data = await file.read()
+        if is_zip_archive(file.filename, file.content_type):
+            try:
+                extracted = await asyncio.to_thread(
+                    expand_zip_archive, data, max_upload_bytes, max_batch_bytes - batch_bytes,
+                    settings.batch_max_files - len(batch_files)
+                )
+            except BatchTooLargeError as e:
+                raise HTTPException(status_code=413, detail=f"{file.filename}: {str(e)}")
+            except Exception:
+                raise HTTPException(status_code=400, detail=f"Invalid zip archive: {file.filename}")
+            batch_files.extend(extracted)
+            batch_bytes += sum(len(content) for _, _, content in extracted)
+            continue
+
+        file_type = detect_file_type(file.filename, file.content_type)
+        if file_type is None:
+            raise HTTPException(status_code=400, detail=f"Unsupported file: {file.filename}")
+        if len(batch_files) >= settings.batch_max_files:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {settings.batch_max_files} files")
+        batch_files.append((file.filename or "upload", file_type, data))
+        batch_bytes += len(data)
+
+    if not batch_files:
+        raise HTTPException(status_code=400, detail="No PDF or image files found in the batch")
+
+    try:
+        job_id = await asyncio.to_thread(batch_store.create_job, batch_files)
+    except sqlite3.OperationalError as e:
+        if not is_busy_error(e):
+            raise
+        # Other server workers held the queue past the busy timeout
+        raise HTTPException(status_code=503, detail="Batch queue is busy, try again", headers={"Retry-After": "5"})
+    batch_pool.notify()
+
+    return BatchSubmitResponse(job_id=job_id, status="queued", total=len(batch_files))
+
+@app.get("/analyze/batch/{job_id}", response_model=BatchStatusResponse)
+async def batch_status(job_id: str):
+    """
+    Get batch job progress and the results of files analyzed so far
+    """
+    job = await asyncio.to_thread(batch_store.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job
+
+def _require_history() -> AnalysisHistory:
+    if history is None:
+        raise HTTPException(status_code=404, detail="Analysis history is disabled (set HISTORY_ENABLED=true)")
+    return history
+
+@app.get("/history/{patient_id}", response_model=PatientHistoryResponse)
+async def patient_history(patient_id: str, limit: int = 50):
+    """
+    A patient's stored analyses, newest report first
+
+    Not authenticated here: deploy behind an authenticating proxy before enabling the history store.
+    """
+    reports = await _require_history().reports(patient_id, limit)
+    return PatientHistoryResponse(patient_id=patient_id, reports=reports)
+
+@app.get("/history/{patient_id}/trends", response_model=PatientTrendsResponse)
+async def patient_trends(patient_id: str, test: List[str] = Query(default=[]), points: int = 20):
+    """
+    Per-test trends across a patient's stored reports, without calling the model
+
+    Repeat ?test= to limit the response to some tests; each test lists its
+    most recent `points` values, oldest first, and the change between the
+    last two. Not authenticated here, like /history/{patient_id}.
+    """
+    trends = await _require_history().trends(patient_id, test, points)
+    return PatientTrendsResponse(patient_id=patient_id, trends=trends)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Analysis cache hit/miss counters and the number of analyses currently running"""
+    semantic = {"enabled": True, **semantic_cache.stats()} if semantic_cache is not None else {"enabled": False}
+    if analysis_cache is None:
+        return {"enabled": False, "in_flight": len(in_flight_analyses), "semantic": semantic}
+    return {"enabled": True, "in_flight": len(in_flight_analyses), **analysis_cache.stats(), "semantic": semantic}
+
+@app.get("/glossary/stats")
+async def glossary_stats():
+    """Glossary size, lookup throughput and the share of complex terms explained locally"""
+    if ai_service.glossary is None:
+        return {"enabled": False}
+    return {"enabled": True, **ai_service.glossary.stats()}
+
+@app.get("/ocr/stats")
+async def ocr_stats():
+    """Per-engine OCR latency and escalation counters"""
+    return file_processor.ocr.stats()
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics for pipeline stages, fallbacks, cache, OCR and model usage"""
+    if not metrics.enabled():
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED=false)")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
@@ -120,14 +685,26 @@ async def root():
         "endpoints": {
             "health": "/health",
             "analyze_image": "/analyze/image",
-            "analyze_pdf": "/analyze/pdf"
+            "analyze_pdf": "/analyze/pdf",
+            "analyze_image_stream": "/analyze/image/stream",
+            "analyze_pdf_stream": "/analyze/pdf/stream",
+            "analyze_batch": "/analyze/batch",
+            "cache_stats": "/cache/stats",
+            "ocr_stats": "/ocr/stats",
+            "glossary_stats": "/glossary/stats",
+            "patient_history": "/history/{patient_id}",
+            "patient_trends": "/history/{patient_id}/trends",
+            "metrics": "/metrics"
         }
     }
 
+STARTUP_SECONDS.set(time.perf_counter() - _IMPORT_STARTED, phase="import")
+
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(
         "main:app",
         host=settings.backend_host,
         port=settings.backend_port,
         reload=True
-    ) 
\ No newline at end of file
+    ) 
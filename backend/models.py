@@ -6,6 +6,15 @@ class AnalysisRequest(BaseModel):
     file_type: str
     content: str
 
+class LabResult(BaseModel):
+    """A lab value parsed from the report, checked against its reference range"""
+    test: str
+    value: float
+    unit: str
+    low: Optional[float] = None
+    high: Optional[float] = None
+    status: str
+
 class AnalysisResponse(BaseModel):
     """Response model for medical report analysis"""
     success: bool
@@ -15,8 +24,71 @@ class AnalysisResponse(BaseModel):
     precautions: List[str]
     confidence_score: float
     complex_terms: Optional[Dict[str, str]] = None
+    lab_results: List[LabResult] = []
     error_message: Optional[str] = None
 
+class BatchSubmitResponse(BaseModel):
+    """Response model for a newly queued batch job"""
+    job_id: str
+    status: str
+    total: int
+
+class BatchItemResult(BaseModel):
+    """Status and result of a single file in a batch job"""
+    position: int
+    filename: str
+    file_type: str
+    status: str
+    result: Optional[AnalysisResponse] = None
+    error: Optional[str] = None
+
+class BatchStatusResponse(BaseModel):
+    """Response model for batch job progress and results"""
+    job_id: str
+    status: str
+    created_at: float
+    total: int
+    completed: int
+    failed: int
+    items: List[BatchItemResult]
+
+class HistoryReport(BaseModel):
+    """A stored analysis of one of a patient's reports"""
+    report_id: str
+    reported_at: str
+    file_type: str
+    analysis: AnalysisResponse
+
+class PatientHistoryResponse(BaseModel):
+    """A patient's stored analyses, newest report first"""
+    patient_id: str
+    reports: List[HistoryReport]
+
+class TrendPoint(BaseModel):
+    """One stored value of a lab test"""
+    test: str
+    value: float
+    unit: str
+    low: Optional[float] = None
+    high: Optional[float] = None
+    status: str
+    reported_at: str
+    report_id: str
+
+class LabTrend(BaseModel):
+    """A lab test's values across a patient's reports, oldest first"""
+    test: str
+    unit: str
+    values: List[TrendPoint]
+    change: Optional[float] = None
+    change_percent: Optional[float] = None
+    direction: Optional[str] = None
+
+class PatientTrendsResponse(BaseModel):
+    """Per-test trends across a patient's stored reports"""
+    patient_id: str
+    trends: List[LabTrend]
+
 class HealthResponse(BaseModel):
     """Health check response model"""
     status: str
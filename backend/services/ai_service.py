@@ -1,25 +1,76 @@
-import google.generativeai as genai
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.schema import HumanMessage
-import base64
+import asyncio
 import json
-from typing import Dict, Any
+import os
+from typing import Dict, Any, AsyncIterator, Awaitable, List, Optional, Tuple
+from services.chunking import split_report
+from services.compaction import compact_report, estimate_tokens
+from services.glossary import Glossary
+from services.json_stream import IncrementalJSONParser, ParseResult, model_field_validators, parse_json_object
+from services.lab_values import LabTable, parse_lab_values
+from services.model_client import ModelClient, ModelResponse, get_model_client
 from utils.config import get_settings
+from models import AnalysisResponse
+from utils.metrics import FALLBACKS, LAB_REPORTS, MODEL_OUTPUT_PARSES, MODEL_TOKENS, STAGE_SECONDS, TOKENS_SAVED
+from utils.resilience import UpstreamUnavailableError, get_model_guard, is_retryable
+
+# Glossary bundled with the backend, used when GLOSSARY_SEED_PATH is not set
+GLOSSARY_SEED_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "glossary.json")
+
+# Bump whenever the analysis or terms prompts change so cached results are not reused
+PROMPT_VERSION = "5"
+
+# Complex terms returned per report, and unknown candidates sent to the model per report
+MAX_COMPLEX_TERMS = 10
+MAX_UNKNOWN_TERMS = 30
+
+# Model answers are checked field by field against the API response model
+ANALYSIS_FIELD_VALIDATORS = model_field_validators(AnalysisResponse, exclude=("success", "error_message", "lab_results"))
+
+# Output tokens budgeted per call when reserving tokens/minute capacity
+EXPECTED_OUTPUT_TOKENS = 1024
+
+def _estimate_tokens(prompt: str) -> int:
+    """Prompt + expected output token count for rate limiting"""
+    return estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS
+
+class _SummaryStreamExtractor:
+    """Pull the "summary" string out of a streamed JSON analysis as it arrives"""
+    
+    def __init__(self):
+        self.parser = IncrementalJSONParser(ANALYSIS_FIELD_VALIDATORS)
+        self.emitted = 0
+    
+    @property
+    def buffer(self) -> str:
+        return self.parser.buffer
+    
+    def feed(self, chunk: str) -> str:
+        """Add streamed text and return any summary text not returned before"""
+        self.parser.feed(chunk)
+        text = self.parser.partial_string("summary") or ""
+        new_text = text[self.emitted:]
+        self.emitted = len(text)
+        return new_text
 
 class AIService:
     """Service for AI-powered medical report analysis using Gemini 2.0 Flash"""
     
     def __init__(self):
-        settings = get_settings()
-        genai.configure(api_key=settings.google_api_key)
-        
-        # Initialize Gemini model
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",
-            google_api_key=settings.google_api_key,
-            temperature=0.1
-        )
+        self.settings = get_settings()
+        self.glossary = Glossary(
+            seed_path=self.settings.glossary_seed_path or GLOSSARY_SEED_PATH,
+            db_path=self.settings.glossary_db_path or None
+        ) if self.settings.glossary_enabled else None
+    
+    @property
+    def client(self) -> ModelClient:
+        """Shared model client (MODEL_BACKEND), built on first use"""
+        return get_model_client()
+    
+    @property
+    def model_name(self) -> str:
+        """Model (and routing) answering the prompts, used in cache keys"""
+        return self.client.name
     
     async def analyze_medical_report(self, content: str, file_type: str) -> Dict[str, Any]:
         """
@@ -33,43 +84,346 @@ class AIService:
         Returns:
             Dictionary containing analysis results
         """
+        content = self._compact(content)
+        
+        # Long reports are analyzed chunk by chunk and merged
+        chunks = self._split(content)
+        if len(chunks) > 1:
+            analysis = await self._run_analysis(self._analyze_chunked(chunks, file_type))
+        else:
+            analysis = await self._run_analysis(self._analyze_content(chunks[0] if chunks else content, file_type))
+        
+        analysis["lab_results"] = self._lab_results(content)
+        return analysis
+    
+    async def _run_analysis(self, analysis: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Await an analysis, reporting failures other than upstream unavailability as analysis errors"""
+        try:
+            return await analysis
+        except UpstreamUnavailableError:
+            raise
+        except asyncio.TimeoutError:
+            raise Exception("AI analysis failed: model call timed out")
+        except Exception as e:
+            raise Exception(f"AI analysis failed: {str(e)}")
+    
+    def _compact(self, content: str) -> str:
+        """Drop page numbers, repeated headers and footers, and boilerplate before any prompt is built"""
+        if not self.settings.prompt_compaction_enabled:
+            return content
         try:
-            # Create comprehensive prompt for medical analysis
-            prompt = self._create_analysis_prompt(content, file_type)
+            compacted = compact_report(content)
+        except Exception as e:
+            print(f"Report compaction failed: {str(e)}")
+            return content
+        TOKENS_SAVED.observe(estimate_tokens(content) - estimate_tokens(compacted), stage="compaction")
+        return compacted
+    
+    def _split(self, content: str) -> List[str]:
+        """Split the report into chunks that each fit the per-call token budget"""
+        return split_report(content, self.settings.prompt_token_budget, size=estimate_tokens)
+    
+    async def _analyze_content(self, content: str, file_type: str) -> Dict[str, Any]:
+        """
+        Analyze a single piece of report content and explain its complex terms
+        
+        Args:
+            content: Report content that fits in one prompt
+            file_type: Type of file (image/pdf)
+            
+        Returns:
+            Dictionary containing analysis results
+        """
+        if self.settings.analysis_mode == "merged":
+            return await self._analyze_merged(content, file_type)
+
+        # Create comprehensive prompt for medical analysis
+        labs = self._parse_labs(content)
+        prompt = self._create_analysis_prompt(content, file_type, labs)
+        
+        # The terms prompt only depends on the content, so run both calls concurrently
+        analysis_task = asyncio.create_task(
+            asyncio.wait_for(self._generate_analysis(prompt), timeout=self.settings.analysis_timeout_seconds)
+        )
+        terms_task = asyncio.create_task(
+            self._extract_terms_with_timeout(content)
+        )
+        
+        try:
+            response = await analysis_task
+        except BaseException:
+            # No point explaining terms without an analysis
+            terms_task.cancel()
+            raise
+        
+        # Parse the response
+        analysis = self._apply_lab_findings(self._parse_analysis_response(response), labs)
+        
+        # The summary still comes back if the terms call fails or times out
+        try:
+            analysis["complex_terms"] = await terms_task
+        except asyncio.TimeoutError:
+            print("Term extraction timed out")
+            analysis["complex_terms"] = {}
+        
+        return analysis
+    
+    async def _analyze_chunked(self, chunks: List[str], file_type: str) -> Dict[str, Any]:
+        """
+        Analyze report chunks concurrently with bounded fan-out and merge the results
+        
+        Args:
+            chunks: Report chunks in document order
+            file_type: Type of file (image/pdf)
             
-            # Generate analysis using Gemini
-            response = await self._generate_analysis(prompt)
+        Returns:
+            Dictionary containing the merged analysis results
+        """
+        semaphore = asyncio.Semaphore(max(1, self.settings.chunk_parallelism))
+        
+        async def analyze_chunk(index: int, chunk: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._analyze_content(chunk, f"{file_type}, part {index + 1} of {len(chunks)}")
+        
+        results = await asyncio.gather(
+            *(analyze_chunk(index, chunk) for index, chunk in enumerate(chunks)),
+            return_exceptions=True
+        )
+        
+        analyses = [result for result in results if not isinstance(result, BaseException)]
+        if not analyses:
+            raise results[0]
+        if len(analyses) < len(results):
+            print(f"{len(results) - len(analyses)} of {len(results)} report chunks failed analysis")
+        
+        return self._merge_chunk_analyses(analyses)
+    
+    def _merge_chunk_analyses(self, analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Merge per-chunk analyses into one, de-duplicating list items and terms"""
+        
+        def merge_lists(field: str) -> List[str]:
+            merged, seen = [], set()
+            for analysis in analyses:
+                items = analysis.get(field) or []
+                for item in items if isinstance(items, list) else [items]:
+                    marker = str(item).strip().lower()
+                    if marker and marker not in seen:
+                        seen.add(marker)
+                        merged.append(item)
+            return merged
+        
+        complex_terms: Dict[str, str] = {}
+        for analysis in analyses:
+            terms = analysis.get("complex_terms")
+            if isinstance(terms, dict):
+                for term, explanation in terms.items():
+                    complex_terms.setdefault(term, explanation)
+        
+        scores = []
+        for analysis in analyses:
+            try:
+                scores.append(float(analysis.get("confidence_score")))
+            except (TypeError, ValueError):
+                pass
+        
+        return {
+            "summary": " ".join(str(a["summary"]).strip() for a in analyses if a.get("summary")),
+            "key_findings": merge_lists("key_findings"),
+            "lifestyle_recommendations": merge_lists("lifestyle_recommendations"),
+            "precautions": merge_lists("precautions"),
+            "confidence_score": round(sum(scores) / len(scores), 2) if scores else self._get_default_value("confidence_score"),
+            "complex_terms": complex_terms
+        }
+    
+    async def stream_medical_report(self, content: str, file_type: str) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Analyze medical report content, yielding results stage by stage
+        
+        Events are (name, data) pairs: "summary_token" for each piece of the
+        summary as the model streams it, then "key_findings", then
+        "complex_terms", and finally "analysis" with the complete result.
+        
+        Args:
+            content: The processed content from the medical report
+            file_type: Type of file (image/pdf)
             
-            # Parse the response
-            analysis = self._parse_analysis_response(response)
+        Yields:
+            (event name, event data) tuples
+        """
+        content = self._compact(content)
+        chunks = self._split(content)
+        if len(chunks) > 1:
+            # Chunked reports are merged at the end, so there is nothing to stream early
+            analysis = await self._run_analysis(self._analyze_chunked(chunks, file_type))
+            yield "summary_token", analysis["summary"]
+            yield "key_findings", self._findings_event(analysis)
+            yield "complex_terms", analysis["complex_terms"]
+            analysis["lab_results"] = self._lab_results(content)
+            yield "analysis", analysis
+            return
+        
+        content = chunks[0] if chunks else content
+        merged = self.settings.analysis_mode == "merged"
+        
+        terms_task = None
+        if not merged:
+            terms_task = asyncio.create_task(
+                self._extract_terms_with_timeout(content)
+            )
+        
+        try:
+            labs = self._parse_labs(content)
+            if merged:
+                prompt = self._create_merged_prompt(content, file_type, labs)
+            else:
+                prompt = self._create_analysis_prompt(content, file_type, labs)
             
-            # Extract and explain complex medical terms
-            complex_terms = await self._extract_and_explain_terms(content)
-            analysis["complex_terms"] = complex_terms
+            extractor = _SummaryStreamExtractor()
+            async for token in self._stream_analysis(prompt):
+                summary_text = extractor.feed(token)
+                if summary_text:
+                    yield "summary_token", summary_text
             
-            return analysis
+            analysis = self._apply_lab_findings(
+                self._parse_analysis_response(extractor.buffer, extractor.parser.result()), labs
+            )
+            if not extractor.emitted:
+                yield "summary_token", analysis["summary"]
+            yield "key_findings", self._findings_event(analysis)
+            
+            if merged:
+                complex_terms = analysis.get("complex_terms")
+                analysis["complex_terms"] = complex_terms if isinstance(complex_terms, dict) else {}
+            else:
+                try:
+                    analysis["complex_terms"] = await terms_task
+                except asyncio.TimeoutError:
+                    print("Term extraction timed out")
+                    analysis["complex_terms"] = {}
+            yield "complex_terms", analysis["complex_terms"]
             
+            analysis["lab_results"] = self._lab_results(content)
+            yield "analysis", analysis
+        
+        finally:
+            if terms_task is not None and not terms_task.done():
+                terms_task.cancel()
+    
+    async def _extract_terms_with_timeout(self, content: str) -> Dict[str, str]:
+        """Explain complex terms within TERMS_TIMEOUT_SECONDS (the coroutine is only created once the task runs)"""
+        return await asyncio.wait_for(self._extract_and_explain_terms(content), timeout=self.settings.terms_timeout_seconds)
+    
+    def _findings_event(self, analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """Fields of the analysis that are sent together once the main call finishes"""
+        return {
+            "key_findings": analysis["key_findings"],
+            "lifestyle_recommendations": analysis["lifestyle_recommendations"],
+            "precautions": analysis["precautions"],
+            "confidence_score": analysis["confidence_score"]
+        }
+    
+    @property
+    def prompt_version(self) -> str:
+        """Prompt version including the analysis mode, used in cache keys"""
+        return f"{PROMPT_VERSION}-{self.settings.analysis_mode}"
+    
+    async def _analyze_merged(self, content: str, file_type: str) -> Dict[str, Any]:
+        """Run the analysis and term explanation as a single model call"""
+        labs = self._parse_labs(content)
+        prompt = self._create_merged_prompt(content, file_type, labs)
+        response = await asyncio.wait_for(
+            self._generate_analysis(prompt), timeout=self.settings.analysis_timeout_seconds
+        )
+        analysis = self._apply_lab_findings(self._parse_analysis_response(response), labs)
+        
+        complex_terms = analysis.get("complex_terms")
+        analysis["complex_terms"] = complex_terms if isinstance(complex_terms, dict) else {}
+        return analysis
+    
+    def _parse_labs(self, content: str) -> Optional[LabTable]:
+        """Lab rows parsed from the report, or None when there are too few to replace the raw text"""
+        if not self.settings.lab_parser_enabled:
+            return None
+        try:
+            labs = parse_lab_values(content)
         except Exception as e:
-            raise Exception(f"AI analysis failed: {str(e)}")
+            print(f"Lab value parsing failed: {str(e)}")
+            return None
+        
+        if len(labs) < max(1, self.settings.lab_min_rows):
+            LAB_REPORTS.inc(result="unstructured")
+            return None
+        LAB_REPORTS.inc(result="all_normal" if self._is_all_normal(labs) else "structured")
+        return labs
+    
+    def _lab_results(self, content: str) -> List[Dict[str, Any]]:
+        """Every lab value in the report, for the response and the patient history"""
+        if not self.settings.lab_parser_enabled:
+            return []
+        try:
+            return parse_lab_values(content).records()
+        except Exception as e:
+            print(f"Lab value parsing failed: {str(e)}")
+            return []
     
-    def _create_analysis_prompt(self, content: str, file_type: str) -> str:
+    def _is_all_normal(self, labs: Optional[LabTable]) -> bool:
+        """Every result is in range and there is little other text, so findings are listed locally"""
+        return (
+            labs is not None
+            and labs.all_normal()
+            and len(labs.other_text) <= self.settings.lab_normal_max_other_chars
+        )
+    
+    def _apply_lab_findings(self, analysis: Dict[str, Any], labs: Optional[LabTable]) -> Dict[str, Any]:
+        """Fill in the key findings the model was not asked for on all-normal reports"""
+        if self._is_all_normal(labs):
+            analysis["key_findings"] = labs.normal_findings()
+        return analysis
+    
+    def _report_section(self, content: str, file_type: str, labs: Optional[LabTable]) -> str:
+        """Report content for a prompt: the parsed lab table plus the remaining text, or the raw text if shorter"""
+        raw = f"""Report Content (from {file_type}):
+        {content}"""
+        if labs is None:
+            return raw
+        
+        structured = f"""Lab Results (from {file_type}; each value checked against its reference range):
+{labs.to_prompt()}
+
+        Other Report Text:
+        {labs.other_text or "(none)"}"""
+        saved = estimate_tokens(raw) - estimate_tokens(structured)
+        if saved <= 0:
+            return raw
+        TOKENS_SAVED.observe(saved, stage="lab_table")
+        return structured
+    
+    def _create_analysis_prompt(self, content: str, file_type: str, labs: Optional[LabTable] = None) -> str:
         """Create a comprehensive prompt for medical report analysis"""
         
+        if self._is_all_normal(labs):
+            # The findings are already known: every result is within range
+            findings_format = ""
+            findings_guideline = """
+        9. All results are within their reference ranges; leave key findings out, they are listed separately"""
+        else:
+            findings_format = """
+            "key_findings": [
+                "Finding 1",
+                "Finding 2",
+                "Finding 3"
+            ],"""
+            findings_guideline = ""
+        
         prompt = f"""
         You are a medical AI assistant with expertise in analyzing medical reports. 
         Please analyze the following medical report content and provide a comprehensive analysis.
 
-        Report Content (from {file_type}):
-        {content}
+        {self._report_section(content, file_type, labs)}
 
         Please provide your analysis in the following JSON format:
         {{
-            "summary": "A concise 2-3 sentence summary of the main findings",
-            "key_findings": [
-                "Finding 1",
-                "Finding 2",
-                "Finding 3"
-            ],
+            "summary": "A concise 2-3 sentence summary of the main findings",{findings_format}
             "lifestyle_recommendations": [
                 "Recommendation 1",
                 "Recommendation 2",
@@ -91,57 +445,132 @@ class AIService:
         5. Maintain medical accuracy and professionalism
         6. If the content is unclear or incomplete, note this in the summary
         7. Confidence score should reflect the clarity and completeness of the report
-        8. Use simple, clear language that patients can understand
+        8. Use simple, clear language that patients can understand{findings_guideline}
 
         Please respond with only the JSON object, no additional text.
         """
         
         return prompt
     
-    async def _generate_analysis(self, prompt: str) -> str:
-        """Generate analysis using Gemini model"""
-        try:
-            # Use the chat model for better structured responses
-            messages = [HumanMessage(content=prompt)]
-            response = await self.llm.ainvoke(messages)
-            return response.content
-            
-        except Exception as e:
-            # Fallback to direct model call if chat fails
-            response = self.model.generate_content(prompt)
+    def _create_merged_prompt(self, content: str, file_type: str, labs: Optional[LabTable] = None) -> str:
+        """Create a single prompt that asks for the analysis and term explanations together"""
+        
+        prompt = f"""
+        You are a medical AI assistant with expertise in analyzing medical reports. 
+        Please analyze the following medical report content, and explain the complex
+        medical terms it contains in simple language.
+
+        {self._report_section(content, file_type, labs)}
+
+        Please provide your analysis in the following JSON format:
+        {{
+            "summary": "A concise 2-3 sentence summary of the main findings",
+            "key_findings": ["Finding 1", "Finding 2", "Finding 3"],
+            "lifestyle_recommendations": ["Recommendation 1", "Recommendation 2", "Recommendation 3"],
+            "precautions": ["Precaution 1", "Precaution 2", "Precaution 3"],
+            "confidence_score": 0.85,
+            "complex_terms": {{
+                "term1": "Simple explanation in layman's terms",
+                "term2": "Simple explanation in layman's terms"
+            }}
+        }}
+
+        Guidelines for analysis:
+        1. Focus on clinically relevant information
+        2. Identify abnormal values and their significance
+        3. Provide practical lifestyle recommendations
+        4. Highlight important precautions and warnings
+        5. If the content is unclear or incomplete, note this in the summary
+        6. Confidence score should reflect the clarity and completeness of the report
+        7. Use simple, clear language that patients can understand
+        8. In complex_terms, explain the 5-10 most important terms and abbreviations,
+           or return an empty object {{}} if there are none
+
+        Please respond with only the JSON object, no additional text.
+        """
+        
+        return prompt
+    
+    async def _generate_analysis(self, prompt: str, stage: str = "generate_analysis") -> str:
+        """
+        Generate analysis with the model client
+        
+        Calls go through the model guard (shared rate limits, retries with
+        backoff, circuit breaker).
+        """
+        client = self.client
+        with STAGE_SECONDS.time(stage=stage):
+            response = await get_model_guard().call(lambda: client.generate(prompt), _estimate_tokens(prompt))
+            self._record_token_usage(response)
             return response.text
     
-    def _parse_analysis_response(self, response: str) -> Dict[str, Any]:
-        """Parse the AI response into structured format"""
-        try:
-            # Clean the response and extract JSON
-            response = response.strip()
+    def _record_token_usage(self, response: ModelResponse) -> None:
+        """Count the prompt and output tokens reported by the model client"""
+        MODEL_TOKENS.inc(response.input_tokens, direction="input")
+        MODEL_TOKENS.inc(response.output_tokens, direction="output")
+    
+    async def _stream_analysis(self, prompt: str) -> AsyncIterator[str]:
+        """Stream the analysis from the model client, falling back to a single call if streaming fails early"""
+        guard = get_model_guard()
+        with STAGE_SECONDS.time(stage="stream_analysis"):
+            streamed = False
+            try:
+                # A stream cannot be replayed once it has yielded, so it gets a single attempt
+                async with guard.attempt(_estimate_tokens(prompt)):
+                    async for chunk in self.client.stream(prompt):
+                        self._record_token_usage(chunk)
+                        if chunk.text:
+                            streamed = True
+                            yield chunk.text
+                return
+            except UpstreamUnavailableError:
+                raise
+            except Exception as e:
+                # Tokens already sent cannot be taken back
+                if streamed:
+                    raise
+                if is_retryable(e):
+                    await asyncio.sleep(guard.backoff(0))
+        
+        yield await self._generate_analysis(prompt)
+    
+    def _parse_analysis_response(self, response: str, parsed: Optional[ParseResult] = None) -> Dict[str, Any]:
+        """
+        Parse the AI response into structured format
+        
+        The JSON object is found even with prose, code fences or stray braces
+        around it; fields that fail validation are replaced by defaults, and a
+        truncated answer keeps every field that arrived.
+        
+        Args:
+            response: Model output
+            parsed: Result of parsing the output while it streamed, if available
+        """
+        with STAGE_SECONDS.time(stage="parse_response"):
+            result = parsed if parsed is not None else parse_json_object(response, ANALYSIS_FIELD_VALIDATORS)
+            analysis = result.value
             
-            # Try to find JSON in the response
-            start_idx = response.find('{')
-            end_idx = response.rfind('}') + 1
+            required_fields = ["summary", "key_findings", "lifestyle_recommendations", "precautions", "confidence_score"]
+            if not analysis or not any(field in analysis for field in required_fields):
+                MODEL_OUTPUT_PARSES.inc(kind="analysis", result="failed")
+                return self._create_fallback_response(response.strip())
             
-            if start_idx != -1 and end_idx != 0:
-                json_str = response[start_idx:end_idx]
-                analysis = json.loads(json_str)
+            if result.complete and not result.errors:
+                MODEL_OUTPUT_PARSES.inc(kind="analysis", result="complete")
             else:
-                # If no JSON found, create a fallback response
-                analysis = self._create_fallback_response(response)
+                MODEL_OUTPUT_PARSES.inc(kind="analysis", result="repaired")
+                print(f"Repaired model response (complete={result.complete}, errors={result.errors})")
             
             # Validate and ensure all required fields are present
-            required_fields = ["summary", "key_findings", "lifestyle_recommendations", "precautions", "confidence_score"]
             for field in required_fields:
                 if field not in analysis:
                     analysis[field] = self._get_default_value(field)
             
             return analysis
-            
-        except json.JSONDecodeError:
-            # If JSON parsing fails, create a fallback response
-            return self._create_fallback_response(response)
     
     def _create_fallback_response(self, response: str) -> Dict[str, Any]:
         """Create a fallback response when JSON parsing fails"""
+        FALLBACKS.inc(kind="unparseable_response")
         return {
             "summary": f"Analysis completed. Raw response: {response[:200]}...",
             "key_findings": ["Analysis completed but response format was unexpected"],
@@ -165,14 +594,90 @@ class AIService:
         """
         Extract complex medical terms from the content and provide simple explanations
         
+        Terms already in the glossary are explained locally; only terms it has
+        never seen are sent to the model, and the model's answers are added to it.
+        
         Args:
             content: The medical report content
             
         Returns:
             Dictionary mapping complex terms to their simple explanations
         """
+        if self.glossary is None:
+            return await self._explain_terms_with_model(content) or {}
+        
+        try:
+            # Reads terms learned by other workers and rebuilds the matcher, off the event loop
+            await asyncio.to_thread(self.glossary.refresh)
+            known, unknown = self.glossary.find(content)
+        except Exception as e:
+            print(f"Glossary lookup failed: {str(e)}")
+            return await self._explain_terms_with_model(content) or {}
+        
+        terms = dict(list(known.items())[:MAX_COMPLEX_TERMS])
+        unknown = unknown[:MAX_UNKNOWN_TERMS]
+        if len(terms) >= MAX_COMPLEX_TERMS or not unknown:
+            # The whole terms prompt, report included, is skipped
+            TOKENS_SAVED.observe(estimate_tokens(content), stage="glossary")
+            return terms
+        
+        # Only the unknown words are sent, not the report
+        TOKENS_SAVED.observe(max(0, estimate_tokens(content) - estimate_tokens(json.dumps(unknown))), stage="glossary")
+        
+        explained = await self._explain_terms_with_model(content, unknown)
+        if explained is None:
+            # Do not remember candidates as "not medical" because the call failed
+            return terms
         try:
-            prompt = f"""
+            learned = await asyncio.to_thread(self.glossary.learn, unknown, explained)
+        except Exception as e:
+            print(f"Error saving glossary terms: {str(e)}")
+            learned = {}
+        
+        for term, explanation in learned.items():
+            if len(terms) >= MAX_COMPLEX_TERMS:
+                break
+            terms[term] = explanation
+        return terms
+    
+    async def _explain_terms_with_model(self, content: str,
+                                        candidates: Optional[List[str]] = None) -> Optional[Dict[str, str]]:
+        """
+        Ask the model to explain complex terms
+        
+        Args:
+            content: The medical report content
+            candidates: Terms to explain; when given, the report itself is not sent
+            
+        Returns:
+            Dictionary mapping terms to simple explanations, or None if the call failed
+        """
+        try:
+            if candidates:
+                prompt = f"""
+            You are a medical expert. The following words appear in a patient's medical report.
+            For each one that is a medical term, abbreviation or technical jargon a patient
+            might not understand, provide a simple, easy-to-understand explanation.
+
+            Words:
+            {json.dumps(candidates)}
+
+            Please provide your response in the following JSON format, using the words exactly as given:
+            {{
+                "word1": "Simple explanation in layman's terms",
+                "word2": "Simple explanation in layman's terms"
+            }}
+
+            Guidelines:
+            1. Leave out words that are not medical terms (names, places, units, headings)
+            2. Include abbreviations and their full meanings
+            3. Explain in simple, non-technical language
+            4. If none of the words are medical terms, return an empty object {{}}
+
+            Please respond with only the JSON object, no additional text.
+            """
+            else:
+                prompt = f"""
             You are a medical expert. Please identify complex medical terms, abbreviations, 
             and technical jargon from the following medical report content and provide 
             simple, easy-to-understand explanations for each term.
@@ -197,24 +702,19 @@ class AIService:
             Please respond with only the JSON object, no additional text.
             """
             
-            response = await self._generate_analysis(prompt)
+            response = await self._generate_analysis(prompt, stage="extract_terms")
             
-            # Parse the response
-            try:
-                start_idx = response.find('{')
-                end_idx = response.rfind('}') + 1
-                
-                if start_idx != -1 and end_idx != 0:
-                    json_str = response[start_idx:end_idx]
-                    terms = json.loads(json_str)
-                else:
-                    terms = {}
-                    
-            except json.JSONDecodeError:
-                terms = {}
-            
-            return terms
+            # Parse the response, keeping only explanations that arrived in full
+            result = parse_json_object(response)
+            if result.value is None:
+                MODEL_OUTPUT_PARSES.inc(kind="terms", result="failed")
+                return None
+            MODEL_OUTPUT_PARSES.inc(kind="terms", result="complete" if result.complete else "repaired")
+            return {
+                str(term): explanation for term, explanation in result.value.items()
+                if isinstance(explanation, str) and term != result.repaired_key
+            }
             
         except Exception as e:
             print(f"Error extracting terms: {str(e)}")
-            return {} 
\ No newline at end of file
+            return None 
\ No newline at end of file
@@ -0,0 +1,514 @@
+import asyncio
+import io
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import zipfile
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.rate_limit import AsyncTokenBucket
+from utils.resilience import UpstreamUnavailableError
+from utils.sqlite import ProcessLocalConnection, is_busy_error
+
+# Analyze callable used by the worker pool: (data, file_type) -> response payload
+AnalyzeFn = Callable[[bytes, str], Awaitable[Dict[str, Any]]]
+
+# Attempts at saving an item's status while other server workers hold the database lock
+STATUS_SAVE_ATTEMPTS = 5
+
+# How often each worker pool deletes finished jobs past their retention period
+RETENTION_SWEEP_SECONDS = 3600.0
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff')
+ZIP_CONTENT_TYPES = ('application/zip', 'application/x-zip-compressed')
+
+class BatchTooLargeError(Exception):
+    """A batch upload, or a file in one of its zip archives, is over a size or file-count limit"""
+
+def detect_file_type(filename: Optional[str], content_type: Optional[str] = None) -> Optional[str]:
+    """
+    Work out whether a file is a PDF or an image report
+
+    Args:
+        filename: Original file name
+        content_type: MIME type sent by the client, if any
+
+    Returns:
+        "pdf", "image", or None for unsupported files
+    """
+    name = (filename or "").lower()
+    if content_type == 'application/pdf' or name.endswith('.pdf'):
+        return "pdf"
+    if (content_type or "").startswith('image/') or name.endswith(IMAGE_EXTENSIONS):
+        return "image"
+    return None
+
+def is_zip_archive(filename: Optional[str], content_type: Optional[str] = None) -> bool:
+    """Check whether an upload is a zip archive of reports"""
+    return content_type in ZIP_CONTENT_TYPES or (filename or "").lower().endswith('.zip')
+
+def expand_zip_archive(data: bytes, max_file_bytes: int, max_total_bytes: int,
+                       max_files: int) -> List[Tuple[str, str, bytes]]:
+    """
+    Extract supported report files from a zip archive
+
+    Members are read with a bounded read, so an archive that decompresses far
+    beyond its own size (or lies about member sizes in its headers) is
+    rejected after at most max_file_bytes + 1 bytes of any member.
+
+    Args:
+        data: Zip archive bytes
+        max_file_bytes: Largest decompressed size of a single file
+        max_total_bytes: Largest decompressed size of all extracted files together
+        max_files: Most files extracted
+
+    Returns:
+        (filename, file_type, data) for each PDF or image in the archive
+
+    Raises:
+        BatchTooLargeError: A file, the total size or the file count is over its limit
+    """
+    files = []
+    total_bytes = 0
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('.'):
+                continue
+            file_type = detect_file_type(name)
+            if file_type is None:
+                continue
+            if len(files) >= max_files:
+                raise BatchTooLargeError(f"Batch exceeds {max_files} files")
+            if info.file_size > max_file_bytes:
+                raise BatchTooLargeError(f"{name} is larger than {max_file_bytes} bytes")
+            with archive.open(info) as member:
+                content = member.read(max_file_bytes + 1)
+            if len(content) > max_file_bytes:
+                raise BatchTooLargeError(f"{name} is larger than {max_file_bytes} bytes")
+            total_bytes += len(content)
+            if total_bytes > max_total_bytes:
+                raise BatchTooLargeError(f"Extracted files exceed {max_total_bytes} bytes")
+            files.append((name, file_type, content))
+    return files
+
+class BatchJobStore:
+    """
+    SQLite-backed queue of batch analysis jobs
+
+    Each job holds one item per file. Items keep their bytes until they are
+    processed, so queued work survives a restart. Claimed items are leased to
+    one worker process for lease_seconds, so several server workers can drain
+    the same queue. A worker can only record the outcome of an item it still
+    holds the lease on; once the lease has expired and another worker has
+    claimed the item, the late result is dropped.
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 900.0):
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._connection = ProcessLocalConnection(db_path, setup=self._create_schema, isolation_level=None)
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        return self._connection.get()
+
+    @staticmethod
+    def _create_schema(db: sqlite3.Connection) -> None:
+        db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS batch_jobs (
+                job_id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                total INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS batch_items (
+                item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                filename TEXT NOT NULL,
+                file_type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                data BLOB,
+                result TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                owner TEXT,
+                lease_expires_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_batch_items_status ON batch_items (status, item_id);
+            CREATE INDEX IF NOT EXISTS idx_batch_items_job ON batch_items (job_id, position);
+            """
+        )
+        # Databases created before items were leased to a worker
+        columns = {row[1] for row in db.execute("PRAGMA table_info(batch_items)")}
+        if "owner" not in columns:
+            db.execute("ALTER TABLE batch_items ADD COLUMN owner TEXT")
+        if "lease_expires_at" not in columns:
+            db.execute("ALTER TABLE batch_items ADD COLUMN lease_expires_at REAL")
+
+    def create_job(self, files: List[Tuple[str, str, bytes]]) -> str:
+        """
+        Queue a new job
+
+        Args:
+            files: (filename, file_type, data) for each file in the batch
+
+        Returns:
+            The new job id
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT INTO batch_jobs (job_id, created_at, total) VALUES (?, ?, ?)",
+                    (job_id, now, len(files)),
+                )
+                self._db.executemany(
+                    "INSERT INTO batch_items (job_id, position, filename, file_type, status, data, updated_at) "
+                    "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                    [(job_id, position, name, file_type, data, now)
+                     for position, (name, file_type, data) in enumerate(files)],
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim_next_item(self, owner: str) -> Optional[Dict[str, Any]]:
+        """
+        Atomically lease the oldest queued item to a worker and return it
+
+        Items whose lease has expired (their worker died mid-analysis) are
+        claimable again, so a crashed server worker never strands work.
+
+        Args:
+            owner: Id of the claiming worker process
+
+        Returns:
+            The claimed item, or None if nothing is waiting
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT item_id, job_id, filename, file_type, data FROM batch_items "
+                    "WHERE status = 'queued' "
+                    "OR (status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)) "
+                    "ORDER BY item_id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE batch_items SET status = 'running', owner = ?, lease_expires_at = ?, updated_at = ? "
+                        "WHERE item_id = ?",
+                        (owner, now + self.lease_seconds, now, row[0]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"item_id": row[0], "job_id": row[1], "filename": row[2], "file_type": row[3], "data": row[4]}
+
+    def complete_item(self, item_id: int, owner: str, result: Dict[str, Any]) -> bool:
+        """
+        Store an item's result and drop its file bytes
+
+        Returns:
+            False if the item is no longer leased to owner (lost lease), True otherwise
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE batch_items SET status = 'done', result = ?, data = NULL, updated_at = ? "
+                "WHERE item_id = ? AND owner = ? AND status = 'running'",
+                (json.dumps(result), time.time(), item_id, owner),
+            )
+        return cursor.rowcount > 0
+
+    def fail_item(self, item_id: int, owner: str, error: str) -> bool:
+        """
+        Record an item failure and drop its file bytes
+
+        Returns:
+            False if the item is no longer leased to owner (lost lease), True otherwise
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE batch_items SET status = 'failed', error = ?, data = NULL, updated_at = ? "
+                "WHERE item_id = ? AND owner = ? AND status = 'running'",
+                (error, time.time(), item_id, owner),
+            )
+        return cursor.rowcount > 0
+
+    def requeue_item(self, item_id: int, owner: str) -> bool:
+        """
+        Put a claimed item back in the queue without counting it as failed
+
+        Returns:
+            False if the item is no longer leased to owner (lost lease), True otherwise
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE batch_items SET status = 'queued', owner = NULL, lease_expires_at = NULL, updated_at = ? "
+                "WHERE item_id = ? AND owner = ? AND status = 'running'",
+                (time.time(), item_id, owner),
+            )
+        return cursor.rowcount > 0
+
+    def requeue_running(self, owner: Optional[str] = None) -> int:
+        """
+        Put running items back in the queue
+
+        Other server workers may be running items at the same time, so only
+        items whose lease has expired are requeued, unless an owner is given;
+        a stopping worker releases all of its own items that way.
+
+        Args:
+            owner: Release every item leased to this worker
+
+        Returns:
+            Number of items requeued
+        """
+        now = time.time()
+        with self._lock:
+            if owner is not None:
+                cursor = self._db.execute(
+                    "UPDATE batch_items SET status = 'queued', owner = NULL, lease_expires_at = NULL, updated_at = ? "
+                    "WHERE status = 'running' AND owner = ?",
+                    (now, owner),
+                )
+            else:
+                cursor = self._db.execute(
+                    "UPDATE batch_items SET status = 'queued', owner = NULL, lease_expires_at = NULL, updated_at = ? "
+                    "WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+                    (now, now),
+                )
+        return cursor.rowcount
+
+    def purge_finished(self, older_than_seconds: float) -> int:
+        """
+        Delete finished jobs, with their items and results
+
+        Args:
+            older_than_seconds: Only jobs whose items all finished at least this long ago
+
+        Returns:
+            Number of jobs deleted
+        """
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                expired = self._db.execute(
+                    "SELECT job_id FROM batch_jobs WHERE created_at < ? AND NOT EXISTS ("
+                    "SELECT 1 FROM batch_items WHERE batch_items.job_id = batch_jobs.job_id "
+                    "AND (status IN ('queued', 'running') OR updated_at >= ?))",
+                    (cutoff, cutoff),
+                ).fetchall()
+                self._db.executemany("DELETE FROM batch_items WHERE job_id = ?", expired)
+                self._db.executemany("DELETE FROM batch_jobs WHERE job_id = ?", expired)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return len(expired)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a job's progress and the results of finished items
+
+        Args:
+            job_id: Job id returned by create_job
+
+        Returns:
+            Job status dictionary, or None if the job does not exist
+        """
+        with self._lock:
+            job = self._db.execute(
+                "SELECT created_at, total FROM batch_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            rows = self._db.execute(
+                "SELECT position, filename, file_type, status, result, error FROM batch_items "
+                "WHERE job_id = ? ORDER BY position",
+                (job_id,),
+            ).fetchall()
+
+        counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        items = []
+        for position, filename, file_type, status, result, error in rows:
+            counts[status] += 1
+            items.append({
+                "position": position,
+                "filename": filename,
+                "file_type": file_type,
+                "status": status,
+                "result": json.loads(result) if result else None,
+                "error": error,
+            })
+
+        if counts["done"] + counts["failed"] == job[1]:
+            status = "completed"
+        elif counts["queued"] == job[1]:
+            status = "queued"
+        else:
+            status = "running"
+
+        return {
+            "job_id": job_id,
+            "status": status,
+            "created_at": job[0],
+            "total": job[1],
+            "completed": counts["done"],
+            "failed": counts["failed"],
+            "items": items,
+        }
+
+class BatchWorkerPool:
+    """
+    Pool of asyncio workers that drain the batch queue
+
+    The analyze callable is injected, so the pool can be driven by a stubbed
+    model in tests and benchmarks. With retention_seconds set, finished jobs
+    older than that are deleted every RETENTION_SWEEP_SECONDS.
+    """
+
+    def __init__(self, store: BatchJobStore, analyze: AnalyzeFn, concurrency: int = 4,
+                 rate_limiter: Optional[AsyncTokenBucket] = None, poll_interval: float = 1.0,
+                 retention_seconds: float = 0.0):
+        self.store = store
+        self.analyze = analyze
+        self.concurrency = max(1, concurrency)
+        self.rate_limiter = rate_limiter
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self.owner = ""
+        self._workers: List[asyncio.Task] = []
+        self._sweeper: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    async def start(self) -> None:
+        """Recover items abandoned by dead workers and start the workers"""
+        # Identifies this process's leases; set here so each forked server worker gets its own
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        requeued = await asyncio.to_thread(self.store.requeue_running)
+        if requeued:
+            print(f"Requeued {requeued} interrupted batch items")
+        self._stopping = False
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        if self.retention_seconds > 0:
+            self._sweeper = asyncio.create_task(self._sweep_finished())
+
+    def notify(self) -> None:
+        """Wake idle workers after new items were queued"""
+        self._wakeup.set()
+
+    async def stop(self, drain_timeout: float = 0.0) -> None:
+        """
+        Stop the workers, letting items already being analyzed finish first
+
+        Args:
+            drain_timeout: Seconds to wait for in-progress items; anything still
+                running afterwards is cancelled and put back in the queue
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        if self._workers and drain_timeout > 0:
+            await asyncio.wait(self._workers, timeout=drain_timeout)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        released = await asyncio.to_thread(self.store.requeue_running, self.owner)
+        if released:
+            print(f"Requeued {released} unfinished batch items")
+
+    async def _worker(self) -> None:
+        while not self._stopping:
+            try:
+                await self._process_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # A store error (e.g. the database is locked) must not end the worker; an item whose
+                # status could not be saved is picked up again when its lease expires
+                if is_busy_error(e):
+                    print(f"Batch queue busy, retrying in {self.poll_interval}s: {str(e)}")
+                else:
+                    print(f"Batch worker error: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _sweep_finished(self) -> None:
+        while True:
+            try:
+                purged = await asyncio.to_thread(self.store.purge_finished, self.retention_seconds)
+                if purged:
+                    print(f"Deleted {purged} finished batch jobs past retention")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Another worker holding the lock just delays the sweep to the next round
+                print(f"Batch retention sweep failed: {str(e)}")
+            await asyncio.sleep(RETENTION_SWEEP_SECONDS)
+
+    async def _process_next(self) -> None:
+        """Claim, analyze and record the next queued item, or wait for one"""
+        item = await asyncio.to_thread(self.store.claim_next_item, self.owner)
+        if item is None:
+            # Wait for new work instead of polling the database in a tight loop
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            return
+
+        try:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            result = await self.analyze(item["data"], item["file_type"])
+        except asyncio.CancelledError:
+            raise
+        except UpstreamUnavailableError as e:
+            # The model API is down or throttling; retry the item later instead of failing it
+            await self._save_status(item, self.store.requeue_item, item["item_id"], self.owner)
+            await asyncio.sleep(e.retry_after)
+        except Exception as e:
+            print(f"Batch item {item['item_id']} ({item['filename']}) failed: {str(e)}")
+            await self._save_status(item, self.store.fail_item, item["item_id"], self.owner, str(e))
+        else:
+            await self._save_status(item, self.store.complete_item, item["item_id"], self.owner, result)
+
+    async def _save_status(self, item: Dict[str, Any], update: Callable[..., bool], *args: Any) -> None:
+        """
+        Save an item's new status, retrying while other workers hold the database lock,
+        so a finished analysis is not lost to a busy queue and run again after its lease
+        """
+        for attempt in range(STATUS_SAVE_ATTEMPTS):
+            try:
+                saved = await asyncio.to_thread(update, *args)
+                if not saved:
+                    # The lease expired and another worker claimed the item; its outcome wins
+                    print(f"Batch item {item['item_id']} ({item['filename']}) lost its lease; result dropped")
+                return
+            except Exception as e:
+                if not is_busy_error(e) or attempt + 1 >= STATUS_SAVE_ATTEMPTS:
+                    raise
+                await asyncio.sleep(self.poll_interval * 2 ** attempt)
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from utils.metrics import CACHE_LOOKUPS
+from utils.sqlite import ProcessLocalConnection
+
+class AnalysisCache:
+    """
+    Content-addressed cache of analysis results.
+
+    Entries live in a bounded in-process LRU tier with a TTL. When a database
+    path is configured, entries are also written to a SQLite tier that survives
+    restarts; disk hits are promoted back into memory.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: int = 86400, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        # The SQLite tier is shared by every server worker using the same file
+        self._connection = ProcessLocalConnection(db_path, setup=self._create_schema) if db_path else None
+        self._db_lock = threading.Lock()
+
+    @property
+    def _db(self) -> Optional[sqlite3.Connection]:
+        return self._connection.get() if self._connection is not None else None
+
+    @staticmethod
+    def _create_schema(db: sqlite3.Connection) -> None:
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS analysis_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        db.commit()
+
+    @staticmethod
+    def make_key(content_hash: str, file_type: str, model_name: str, prompt_version: str) -> str:
+        """Build a cache key from the upload hash and everything that affects the analysis"""
+        return f"{file_type}:{model_name}:{prompt_version}:{content_hash}"
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached analysis
+
+        Args:
+            key: Cache key from make_key
+
+        Returns:
+            The stored response payload, or None on a miss
+        """
+        now = time.time()
+
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                CACHE_LOOKUPS.inc(result="memory_hit")
+                return value
+            del self._memory[key]
+
+        if self._connection is not None:
+            row = await asyncio.to_thread(self._db_get, key, now)
+            if row is not None:
+                expires_at, value = row
+                self._remember(key, value, expires_at)
+                self._stats["disk_hits"] += 1
+                CACHE_LOOKUPS.inc(result="disk_hit")
+                return value
+
+        self._stats["misses"] += 1
+        CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        """
+        Store an analysis result in every configured tier
+
+        Args:
+            key: Cache key from make_key
+            value: JSON-serialisable response payload
+        """
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, value, expires_at)
+        self._stats["stores"] += 1
+
+        if self._connection is not None:
+            await asyncio.to_thread(self._db_set, key, value, expires_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and tier sizes"""
+        lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+        hits = lookups - self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "disk_enabled": self._connection is not None,
+        }
+
+    def _remember(self, key: str, value: Dict[str, Any], expires_at: float) -> None:
+        """Insert into the LRU tier, evicting the least recently used entries"""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _db_get(self, key: str, now: float) -> Optional[tuple]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT expires_at, value FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] <= now:
+                self._db.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+        return row[0], json.loads(row[1])
+
+    def _db_set(self, key: str, value: Dict[str, Any], expires_at: float) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at),
+            )
+            self._db.commit()
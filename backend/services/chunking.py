@@ -0,0 +1,85 @@
+from typing import Callable, List
+
+# Separator placed between PDF pages by FileProcessor
+PAGE_BREAK = "\f"
+
+# Boundaries tried, in order, when a single page is larger than a chunk
+_SECTION_SEPARATORS = ["\n\n", "\n", ". ", " "]
+
+def split_report(text: str, max_size: int, size: Callable[[str], int] = len) -> List[str]:
+    """
+    Split report text into chunks of at most max_size
+
+    Whole pages are packed together while they fit; pages that are too large
+    on their own are split on section, line, sentence and finally word
+    boundaries.
+
+    Args:
+        text: Cleaned report text, pages separated by PAGE_BREAK
+        max_size: Maximum chunk size, measured by size
+        size: Size of a piece of text, e.g. len (characters) or a token estimate
+
+    Returns:
+        List of chunks in document order
+    """
+    max_size = max(1, max_size)
+    pieces: List[str] = []
+    for page in text.split(PAGE_BREAK):
+        page = page.strip()
+        if page:
+            pieces.extend(_split_oversized(page, max_size, size, 0))
+
+    chunks: List[str] = []
+    current, current_size = "", 0
+    for piece in pieces:
+        piece_size = size(piece)
+        if current and current_size + size("\n\n") + piece_size > max_size:
+            chunks.append(current)
+            current, current_size = piece, piece_size
+        elif current:
+            current, current_size = f"{current}\n\n{piece}", current_size + size("\n\n") + piece_size
+        else:
+            current, current_size = piece, piece_size
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+def _split_oversized(text: str, max_size: int, size: Callable[[str], int], level: int) -> List[str]:
+    """Recursively split text that does not fit in one chunk"""
+    text_size = size(text)
+    if text_size <= max_size:
+        return [text]
+
+    if level >= len(_SECTION_SEPARATORS):
+        # No boundary left, cut hard into pieces of about max_size
+        step = max(1, len(text) * max_size // text_size)
+        return [text[i:i + step] for i in range(0, len(text), step)]
+
+    separator = _SECTION_SEPARATORS[level]
+    parts = text.split(separator)
+    if len(parts) == 1:
+        return _split_oversized(text, max_size, size, level + 1)
+
+    # Sizes are summed part by part (separators are cheap), instead of re-measuring the growing text
+    separator_size = size(separator)
+    pieces: List[str] = []
+    current, current_size = "", 0
+    for part in parts:
+        part_size = size(part)
+        candidate_size = current_size + separator_size + part_size if current else part_size
+        if candidate_size <= max_size:
+            current = f"{current}{separator}{part}" if current else part
+            current_size = candidate_size
+            continue
+        if current:
+            pieces.append(current)
+        if part_size > max_size:
+            pieces.extend(_split_oversized(part, max_size, size, level + 1))
+            current, current_size = "", 0
+        else:
+            current, current_size = part, part_size
+    if current:
+        pieces.append(current)
+
+    return pieces
@@ -0,0 +1,77 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from utils.metrics import COALESCED_REQUESTS
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    Share one running task between concurrent callers with the same key
+
+    The first caller for a key starts the work as its own asyncio task; callers
+    arriving while it runs await the same task instead of starting their own.
+    Each caller waits through asyncio.shield, so a caller that is cancelled
+    (for example because its client disconnected) stops waiting without
+    cancelling the shared work for everyone else. The key is forgotten as soon
+    as the task finishes, so results are not held here; caching is separate.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._tasks
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def get(self, key: str) -> Optional[asyncio.Task]:
+        """The task currently running for key, if any"""
+        return self._tasks.get(key)
+
+    def start(self, key: str, factory: Callable[[], Awaitable[T]]) -> Tuple["asyncio.Task[T]", bool]:
+        """
+        Start factory() for key unless it is already running, without waiting for it
+
+        For callers that consume the work some other way than its result, e.g. a
+        stream of progress events; they must await the task (through
+        asyncio.shield) or leave it to finish on its own.
+
+        Args:
+            key: Identity of the work, e.g. a content hash
+            factory: Starts the work; only called when nothing is running for key
+
+        Returns:
+            (the task running for key, whether this call started it)
+        """
+        task = self._tasks.get(key)
+        if task is not None:
+            COALESCED_REQUESTS.inc(role="follower")
+            return task, False
+        task = asyncio.ensure_future(factory())
+        self._tasks[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        COALESCED_REQUESTS.inc(role="leader")
+        return task, True
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run factory() once per key at a time and return its result to every caller
+
+        Args:
+            key: Identity of the work, e.g. a content hash
+            factory: Starts the work; only called when nothing is running for key
+
+        Returns:
+            The shared result (exceptions are raised to every caller)
+        """
+        task, _ = self.start(key, factory)
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Mark the exception as retrieved when every waiter has gone away
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,105 @@
+import re
+from collections import Counter
+from typing import List
+
+from services.chunking import PAGE_BREAK
+from utils.metrics import STAGE_SECONDS
+
+# Word pieces, single digits, symbols, line breaks and runs of padding, roughly how
+# SentencePiece tokenizers split lab reports: words cost about one token per 5 letters,
+# every digit and line break is a token, column padding about one per 4 spaces
+_TOKEN_PIECES = re.compile(r"[^\W\d_]+|\d|\n|[ \t]{2,}|[^\w\s]")
+
+# "Page 2", "Page 2 of 5", "2 of 5" or "- 2 -" alone on a line; a bare number is kept,
+# since OCR can put a table cell (a lab value) on a line of its own
+_PAGE_NUMBER_LINE = re.compile(
+    r"^(?:page\s*(?:no\.?\s*)?:?\s*\d{1,3}(?:\s*(?:of|/)\s*\d{1,3})?|\d{1,3}\s+of\s+\d{1,3}|[-–]\s*\d{1,3}\s*[-–])$",
+    re.IGNORECASE
+)
+_PAGE_NUMBER_PHRASE = re.compile(r"\bpage\s*(?:no\.?\s*)?:?\s*\d{1,3}(?:\s*(?:of|/)\s*\d{1,3})?\b", re.IGNORECASE)
+
+# Lines that are legal or printing boilerplate rather than findings
+_BOILERPLATE = re.compile(
+    r"computer[- ]generated|electronically (?:generated|signed|verified)|does not require (?:a )?signature|"
+    r"not (?:valid|to be used) for medico[- ]?legal|\*+\s*end of (?:the )?report\s*\*+|^end of (?:the )?report$|"
+    r"intended (?:only )?for the (?:use of the )?(?:ordering|referring) (?:physician|doctor)|"
+    r"printed (?:on|by)\b|report generated on\b|this is an? (?:electronic|auto-?generated) report|"
+    r"terms and conditions apply|for any queries,? (?:please )?contact",
+    re.IGNORECASE
+)
+
+# Lines at the top and bottom of each page that are checked for repeated headers and footers
+_EDGE_LINES = 4
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the model tokens in text without calling the tokenizer API
+
+    Args:
+        text: Prompt or report text
+
+    Returns:
+        Estimated token count
+    """
+    tokens = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        if piece.isalpha():
+            tokens += (len(piece) + 4) // 5
+        elif piece[0] in " \t":
+            tokens += (len(piece) + 3) // 4
+        else:
+            tokens += 1
+    return tokens
+
+def compact_report(text: str) -> str:
+    """
+    Remove text that costs tokens without carrying findings
+
+    Rows stay on their own lines (runs of spaces inside a line become one
+    space) so lab tables keep their layout. Page numbers, boilerplate
+    disclaimers, and headers and footers repeated at the edges of several
+    pages are dropped; a repeated header is kept on its first page. Page
+    breaks are kept for chunking.
+
+    Args:
+        text: Extracted report text, pages separated by PAGE_BREAK
+
+    Returns:
+        Compacted text
+    """
+    with STAGE_SECONDS.time(stage="compaction"):
+        pages: List[List[str]] = []
+        for page in text.split(PAGE_BREAK):
+            lines = []
+            for line in page.splitlines():
+                line = " ".join(_PAGE_NUMBER_PHRASE.sub(" ", line).split())
+                if not line or _PAGE_NUMBER_LINE.match(line) or _BOILERPLATE.search(line):
+                    continue
+                lines.append(line)
+            pages.append(lines)
+
+        repeated = _repeated_edge_lines(pages)
+        seen = set()
+        compacted = []
+        for lines in pages:
+            kept = []
+            for index, line in enumerate(lines):
+                at_edge = index < _EDGE_LINES or index >= len(lines) - _EDGE_LINES
+                if at_edge and line in repeated:
+                    if line in seen:
+                        continue
+                    seen.add(line)
+                kept.append(line)
+            if kept:
+                compacted.append("\n".join(kept))
+        return PAGE_BREAK.join(compacted)
+
+def _repeated_edge_lines(pages: List[List[str]]) -> set:
+    """Lines found at the top or bottom of at least half the pages (and at least two)"""
+    if len(pages) < 2:
+        return set()
+    counts: Counter = Counter()
+    for lines in pages:
+        counts.update(set(lines[:_EDGE_LINES] + lines[-_EDGE_LINES:]))
+    threshold = max(2, (len(pages) + 1) // 2)
+    return {line for line, count in counts.items() if count >= threshold}
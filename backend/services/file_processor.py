@@ -1,19 +1,95 @@
+import asyncio
+import importlib.util
 import io
-import base64
-from PIL import Image
-import PyPDF2
+import time
+from dataclasses import dataclass
 from fastapi import UploadFile
-import google.generativeai as genai
-from typing import Optional
+from typing import AsyncIterator, List, Optional, Union
+from services.chunking import PAGE_BREAK
+from services.image_preprocessing import preprocess_image, split_pages
+from services.ocr import GeminiVisionEngine, OCRPipeline, TesseractEngine
+from utils.concurrency import get_process_pool
 from utils.config import get_settings
+from utils.metrics import PDF_PAGE_SECONDS, PDF_PAGES
+from utils.resilience import UpstreamUnavailableError
+
+def _count_pdf_pages(pdf_data: bytes) -> int:
+    """Count the pages of a PDF (runs in the process pool)"""
+    import PyPDF2
+    return len(PyPDF2.PdfReader(io.BytesIO(pdf_data)).pages)
+
+@dataclass
+class PdfPage:
+    """Text layer of one PDF page, and an image of the page when the text layer is missing"""
+    text: str
+    image: Optional[bytes]
+    seconds: float
+
+def _render_pdf_page(pdf_data: bytes, page, page_num: int, dpi: int) -> Optional[bytes]:
+    """Rasterize a PDF page to PNG with pypdfium2, or take its largest embedded image without it"""
+    if importlib.util.find_spec("pypdfium2") is not None:
+        import pypdfium2
+        document = pypdfium2.PdfDocument(pdf_data)
+        try:
+            image = document[page_num].render(scale=dpi / 72, grayscale=True).to_pil()
+        finally:
+            document.close()
+        output = io.BytesIO()
+        image.save(output, format="PNG")
+        return output.getvalue()
+    
+    # A scanned page is usually a single full-page image
+    try:
+        images = page.images
+    except Exception:
+        return None
+    return max(images, key=lambda image: len(image.data)).data if images else None
+
+def _extract_pdf_page_range(pdf_data: bytes, start: int, end: int, min_chars: int = 0, dpi: int = 200) -> List[PdfPage]:
+    """
+    Extract the text of pages [start, end) of a PDF (runs in the process pool)
+    
+    Pages whose text layer has fewer than min_chars characters are treated as
+    scanned and an image of the page is returned for OCR; min_chars=0 never
+    renders.
+    """
+    import PyPDF2
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_data))
+    pages = []
+    for page_num in range(start, end):
+        started = time.perf_counter()
+        page = pdf_reader.pages[page_num]
+        text = page.extract_text() or ""
+        image = None
+        if len(text.strip()) < min_chars:
+            image = _render_pdf_page(pdf_data, page, page_num, dpi)
+        pages.append(PdfPage(text=text, image=image, seconds=time.perf_counter() - started))
+    return pages
 
 class FileProcessor:
     """Service for processing medical report files (images and PDFs)"""
     
     def __init__(self):
         settings = get_settings()
-        genai.configure(api_key=settings.google_api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        self.pdf_pages_per_task = max(1, settings.pdf_pages_per_task)
+        self.settings = settings
+        self.ocr = self._create_ocr_pipeline(settings)
+    
+    def _create_ocr_pipeline(self, settings) -> OCRPipeline:
+        """Build the OCR pipeline for images from settings"""
+        vision = GeminiVisionEngine()
+        
+        if settings.ocr_engine == "tesseract":
+            if TesseractEngine.available():
+                return OCRPipeline(
+                    TesseractEngine(),
+                    fallback=vision,
+                    confidence_threshold=settings.ocr_confidence_threshold,
+                    min_chars=settings.ocr_min_chars
+                )
+            print("OCR_ENGINE=tesseract but pytesseract is not installed; using Gemini Vision")
+        
+        return OCRPipeline(vision)
     
     async def process_image(self, file: UploadFile) -> str:
         """
@@ -25,21 +101,85 @@ class FileProcessor:
         Returns:
             Extracted text content from the image
         """
+        # Read the image file
+        image_data = await file.read()
+        
+        return await self.process_image_bytes(image_data)
+    
+    async def process_image_bytes(self, image_data: bytes) -> str:
+        """
+        Extract text content from raw image bytes
+        
+        Args:
+            image_data: Image file bytes (a multi-page TIFF is read page by page)
+            
+        Returns:
+            Extracted text content from the image
+        """
+        return await self.process_images_bytes([image_data])
+    
+    async def process_images_bytes(self, images: List[bytes]) -> str:
+        """
+        Extract text from the images of one report, in page order
+        
+        Multi-page TIFFs are split into pages, and every page is pre-processed
+        and sent to OCR concurrently (at most IMAGE_PAGE_CONCURRENCY at a time
+        per report), so a report takes about as long as its slowest page.
+        
+        Args:
+            images: Image file bytes, one per uploaded file, in page order
+            
+        Returns:
+            Extracted text of all pages, separated by PAGE_BREAK
+        """
         try:
-            # Read the image file
-            image_data = await file.read()
+            pages = await self._split_image_pages(images)
+            semaphore = asyncio.Semaphore(max(1, self.settings.image_page_concurrency))
             
-            # Convert to PIL Image for processing
-            image = Image.open(io.BytesIO(image_data))
+            async def extract_page(image_data: bytes) -> str:
+                async with semaphore:
+                    # Decode, orient, shrink and re-encode the image off the event loop
+                    image_data, mime_type = await self._preprocess_image(image_data)
+                    
+                    # Use the OCR pipeline to extract text from image
+                    if len(pages) == 1:
+                        return await self._extract_text_from_image(image_data, mime_type)
+                    # A blank page (the back of a fax sheet) is not an error in a multi-page report
+                    return (await self.ocr.extract(image_data, mime_type)).text
             
-            # Use Gemini Vision to extract text from image
-            text_content = await self._extract_text_from_image(image, image_data)
+            results = await asyncio.gather(*(extract_page(page) for page in pages), return_exceptions=True)
             
-            return text_content
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if errors:
+                # A missing page could hide findings, so the report fails as a whole
+                raise next((e for e in errors if isinstance(e, UpstreamUnavailableError)), errors[0])
+            if not any(text.strip() for text in results):
+                raise Exception("No text could be extracted from the image")
+            
+            return PAGE_BREAK.join(text for text in results if text.strip())
             
+        except UpstreamUnavailableError:
+            raise
         except Exception as e:
             raise Exception(f"Image processing failed: {str(e)}")
     
+    async def _split_image_pages(self, images: List[bytes]) -> List[bytes]:
+        """Split multi-page images into single pages in the process pool, keeping page order"""
+        max_pages = self.settings.image_max_pages
+        if len(images) > max_pages:
+            raise ValueError(f"{len(images)} images uploaded; at most {max_pages} pages are accepted")
+        
+        loop = asyncio.get_running_loop()
+        pool = get_process_pool()
+        split = await asyncio.gather(
+            *(loop.run_in_executor(pool, split_pages, image_data, max_pages) for image_data in images)
+        )
+        
+        pages = [page for file_pages in split for page in file_pages]
+        if len(pages) > max_pages:
+            raise ValueError(f"Report has {len(pages)} pages; at most {max_pages} are accepted")
+        return pages
+    
     async def process_pdf(self, file: UploadFile) -> str:
         """
         Process a PDF file and extract text content
@@ -50,56 +190,168 @@ class FileProcessor:
         Returns:
             Extracted text content from the PDF
         """
-        try:
-            # Read the PDF file
-            pdf_data = await file.read()
+        # Read the PDF file
+        pdf_data = await file.read()
+        
+        return await self.process_pdf_bytes(pdf_data)
+    
+    async def process_pdf_bytes(self, pdf_data: bytes) -> str:
+        """
+        Extract text content from raw PDF bytes
+        
+        Args:
+            pdf_data: PDF file bytes
             
+        Returns:
+            Extracted text content from the PDF
+        """
+        try:
             # Extract text from PDF
-            text_content = self._extract_text_from_pdf(pdf_data)
+            text_content = await self._extract_text_from_pdf(pdf_data)
             
             return text_content
             
+        except UpstreamUnavailableError:
+            raise
         except Exception as e:
             raise Exception(f"PDF processing failed: {str(e)}")
     
-    async def _extract_text_from_image(self, image: Image.Image, image_data: bytes) -> str:
+    async def _preprocess_image(self, image_data: bytes) -> tuple:
         """
-        Extract text from image using Gemini Vision
+        Prepare an uploaded image for OCR in the process pool and log the savings
         
         Args:
-            image: PIL Image object
-            image_data: Raw image bytes
+            image_data: Image bytes as uploaded
             
         Returns:
-            Extracted text content
+            (image bytes, MIME type) to send to OCR
         """
-        try:
-            # Use the original image data for Gemini
-            # Create prompt for text extraction
-            prompt = """
-            Please extract all the text content from this medical report image. 
-            Focus on:
-            1. Patient information
-            2. Test results and values
-            3. Medical terminology and diagnoses
-            4. Dates and timestamps
-            5. Doctor/hospital information
-            
-            Return the extracted text in a clear, readable format.
-            """
+        if not self.settings.image_preprocess_enabled:
+            from PIL import Image
+            image = Image.open(io.BytesIO(image_data))
+            return image_data, Image.MIME.get(image.format or "", "image/png")
+        
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        processed, mime_type = await loop.run_in_executor(
+            get_process_pool(), preprocess_image, image_data,
+            self.settings.image_max_dimension, self.settings.image_grayscale, self.settings.image_jpeg_quality
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        
+        saved = len(image_data) - len(processed)
+        print(
+            f"Image pre-processing: {len(image_data)} -> {len(processed)} bytes "
+            f"({saved / len(image_data):.0%} smaller, {mime_type}) in {elapsed_ms:.0f} ms"
+        )
+        
+        return processed, mime_type
+    
+    async def _extract_text_from_image(self, image_data: bytes, mime_type: str) -> str:
+        """
+        Extract text from image using the OCR pipeline (local OCR and/or Gemini Vision)
+        
+        Args:
+            image_data: Encoded image bytes
+            mime_type: MIME type of image_data
             
-            # Use Gemini Vision to extract text
-            response = self.model.generate_content([prompt, {"mime_type": "image/png", "data": image_data}])
+        Returns:
+            Extracted text content
             
-            return response.text
+        Raises:
+            UpstreamUnavailableError: The vision model is throttled or down
+            Exception: OCR failed or found no text
+        """
+        result = await self.ocr.extract(image_data, mime_type)
+        if not result.text.strip():
+            raise Exception("No text could be extracted from the image")
+        
+        return result.text
+    
+    async def iter_pdf_pages(self, pdf_data: bytes) -> AsyncIterator[str]:
+        """
+        Extract PDF page text in parallel, yielding pages in order as they become ready
+        
+        Pages are split into ranges of PDF_PAGES_PER_TASK and parsed in the shared
+        process pool, so later stages can start before the last page is parsed.
+        Pages with a text layer are read locally; scanned pages (no text layer)
+        are rendered and sent to OCR as soon as their range is parsed, at most
+        IMAGE_PAGE_CONCURRENCY at a time per report.
+        
+        Args:
+            pdf_data: PDF file bytes
             
-        except Exception as e:
-            # Fallback: return basic image info
-            return f"Image processing completed but text extraction failed: {str(e)}"
+        Yields:
+            Text content of each page, in page order
+        """
+        loop = asyncio.get_running_loop()
+        pool = get_process_pool()
+        min_chars = self.settings.pdf_text_min_chars if self.settings.pdf_ocr_enabled else 0
+        
+        started = time.perf_counter()
+        page_count = await loop.run_in_executor(pool, _count_pdf_pages, pdf_data)
+        
+        futures = [
+            loop.run_in_executor(
+                pool, _extract_pdf_page_range, pdf_data, start,
+                min(start + self.pdf_pages_per_task, page_count), min_chars, self.settings.pdf_render_dpi
+            )
+            for start in range(0, page_count, self.pdf_pages_per_task)
+        ]
+        
+        semaphore = asyncio.Semaphore(max(1, self.settings.image_page_concurrency))
+        ocr_tasks: List[asyncio.Task] = []
+        routes = {"text": 0, "ocr": 0, "empty": 0}
+        
+        async def route_range(future: "asyncio.Future[List[PdfPage]]") -> List[Union[str, asyncio.Task]]:
+            """Page texts of a range, with an OCR task in place of each scanned page"""
+            routed = []
+            for page in await future:
+                if page.image is None:
+                    route = "text" if page.text.strip() else "empty"
+                    routes[route] += 1
+                    PDF_PAGES.inc(route=route)
+                    PDF_PAGE_SECONDS.observe(page.seconds, route=route)
+                    routed.append(page.text)
+                else:
+                    task = asyncio.create_task(self._ocr_pdf_page(page, semaphore, routes))
+                    ocr_tasks.append(task)
+                    routed.append(task)
+            return routed
+        
+        range_tasks = [asyncio.create_task(route_range(future)) for future in futures]
+        
+        try:
+            for range_task in range_tasks:
+                for page in await range_task:
+                    yield page if isinstance(page, str) else await page
+        finally:
+            # Drop queued ranges and OCR calls if the consumer stops early or fails
+            for pending in futures + range_tasks + ocr_tasks:
+                pending.cancel()
+            if routes["ocr"]:
+                print(
+                    f"PDF routing: {routes['text']} text, {routes['ocr']} OCR, {routes['empty']} empty pages "
+                    f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+                )
+    
+    async def _ocr_pdf_page(self, page: PdfPage, semaphore: asyncio.Semaphore, routes: dict) -> str:
+        """OCR a rendered scanned PDF page, falling back to its text layer when OCR finds nothing"""
+        async with semaphore:
+            started = time.perf_counter()
+            image_data, mime_type = await self._preprocess_image(page.image)
+            result = await self.ocr.extract(image_data, mime_type)
+        
+        text = result.text if result.text.strip() else page.text
+        route = "ocr" if text.strip() else "empty"
+        routes[route] += 1
+        PDF_PAGES.inc(route=route)
+        PDF_PAGE_SECONDS.observe(page.seconds + time.perf_counter() - started, route=route)
+        return text
     
-    def _extract_text_from_pdf(self, pdf_data: bytes) -> str:
+    async def _extract_text_from_pdf(self, pdf_data: bytes) -> str:
         """
-        Extract text from PDF using PyPDF2
+        Extract text from PDF using PyPDF2, and OCR for scanned pages
         
         Args:
             pdf_data: PDF file bytes
@@ -108,20 +360,17 @@ class FileProcessor:
             Extracted text content
         """
         try:
-            # Create PDF reader object
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_data))
-            
-            # Extract text from all pages
-            text_content = ""
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text_content += page.extract_text() + "\n"
+            # Extract text from all pages off the event loop
+            pages = [page_text async for page_text in self.iter_pdf_pages(pdf_data)]
+            text_content = PAGE_BREAK.join(pages)
             
             # Clean up the extracted text
             text_content = self._clean_extracted_text(text_content)
             
             return text_content
             
+        except UpstreamUnavailableError:
+            raise
         except Exception as e:
             raise Exception(f"PDF text extraction failed: {str(e)}")
     
@@ -135,18 +384,16 @@ class FileProcessor:
         Returns:
             Cleaned text content
         """
-        # Remove excessive whitespace
-        text = ' '.join(text.split())
-        
         # Remove common PDF artifacts
         text = text.replace('\x00', '')  # Remove null bytes
-        text = text.replace('\n\n\n', '\n\n')  # Reduce multiple newlines
         
-        # Ensure text is not too long for AI processing
-        if len(text) > 8000:
-            text = text[:8000] + "... [Content truncated for processing]"
+        # Remove excessive whitespace, keeping one row per line (lab tables) and page boundaries for chunking
+        pages = []
+        for page in text.split(PAGE_BREAK):
+            lines = (' '.join(line.split()) for line in page.splitlines())
+            pages.append('\n'.join(line for line in lines if line))
         
-        return text
+        return PAGE_BREAK.join(page for page in pages if page)
     
     def validate_file_size(self, file: UploadFile, max_size_mb: int = 10) -> bool:
         """
@@ -159,15 +406,15 @@ class FileProcessor:
         Returns:
             True if file size is acceptable
         """
-        # Read file size (this will be done in processing anyway)
+        # Seek to the end of the spooled upload instead of reading it
         file_size = 0
         try:
-            content = file.file.read()
-            file_size = len(content)
+            file.file.seek(0, io.SEEK_END)
+            file_size = file.file.tell()
             # Reset file pointer
             file.file.seek(0)
-        except:
+        except Exception:
             pass
         
         max_size_bytes = max_size_mb * 1024 * 1024
-        return file_size <= max_size_bytes 
\ No newline at end of file
+        return file_size <= max_size_bytes
@@ -0,0 +1,339 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.metrics import GLOSSARY_TERMS, STAGE_SECONDS
+from utils.sqlite import ProcessLocalConnection
+
+# Candidate terms the index does not know yet: acronyms with two or more capitals
+# (LDL, HbA1c, eGFR) and words with common clinical suffixes (hepatomegaly, anemia)
+_ACRONYM = re.compile(r"\b[A-Za-z]*[A-Z][A-Za-z0-9]*[A-Z0-9][A-Za-z0-9]*\b")
+_CLINICAL_WORD = re.compile(
+    r"\b[A-Za-z]+(?:itis|emia|aemia|osis|opathy|ectomy|ostomy|otomy|algia|uria|penia|cytosis|"
+    r"plasia|megaly|oma|trophy|lysis|sclerosis|stenosis)\b",
+    re.IGNORECASE
+)
+# Candidates that are names or identifiers rather than jargon: words ending in a capitalised
+# name part (McDonald, DeSouza, JSmith), and codes with four or more digits or several digit
+# runs (SR24A991, MRN00123); HbA1c, CA125 and CYP2D6 still pass
+_NAME_LIKE = re.compile(r"^[A-Za-z]*[A-Z][a-z]{2,}$")
+_DIGIT_RUN = re.compile(r"\d+")
+
+# Report boilerplate that looks like jargon but is not worth explaining
+_NOT_TERMS = {
+    "ID", "MD", "DR", "AM", "PM", "DOB", "MRN", "UHID", "NA", "ND", "NR", "OK", "USA", "UK", "PDF",
+    "REF", "NO", "MR", "MRS", "MS", "SR", "JR", "ST", "TEL", "FAX", "DATE", "PAGE", "NAME", "AGE",
+    "SEX", "MALE", "FEMALE", "TEST", "RESULT", "RESULTS", "UNIT", "UNITS", "VALUE", "LAB", "REPORT",
+}
+
+class _AhoCorasick:
+    """Multi-pattern matcher: finds every occurrence of every pattern in one pass over the text"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[str]] = [[]]
+
+        for pattern in patterns:
+            node = 0
+            for char in pattern:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                node = next_node
+            self._output[node].append(pattern)
+
+        # Breadth-first pass to point each node's failure link at its longest proper
+        # suffix in the trie; first-level nodes fail back to the root
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        """(end index, pattern) for every match in text"""
+        matches = []
+        node = 0
+        goto, fail, output = self._goto, self._fail, self._output
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                for pattern in output[node]:
+                    matches.append((index + 1, pattern))
+        return matches
+
+class Glossary:
+    """
+    Local index of medical terms and their plain-language explanations
+
+    Terms come from a JSON seed file and from explanations the model wrote
+    for terms the index did not know yet. Learned terms are persisted to
+    SQLite (shared by every server worker) and picked up by other workers
+    within refresh_seconds. Report text is matched against all terms and
+    aliases at once with an Aho-Corasick automaton, on word boundaries;
+    short all-caps abbreviations (LDL, TSH) must also match case.
+
+    Terms the model declines to explain are not persisted; each worker
+    remembers up to declined_max_entries of them for declined_ttl_seconds
+    so they are not sent again straight away.
+    """
+
+    def __init__(self, seed_path: Optional[str] = None, db_path: Optional[str] = None,
+                 refresh_seconds: float = 60.0, declined_ttl_seconds: float = 86400.0,
+                 declined_max_entries: int = 10000):
+        self.refresh_seconds = refresh_seconds
+        self.declined_ttl_seconds = declined_ttl_seconds
+        self.declined_max_entries = declined_max_entries
+        self._lock = threading.Lock()
+        # Canonical term -> explanation
+        self._explanations: Dict[str, Optional[str]] = {}
+        # Lower-cased term the model declined to explain -> expiry time, oldest first
+        self._declined: "OrderedDict[str, float]" = OrderedDict()
+        # Lower-cased term or alias -> canonical term
+        self._patterns: Dict[str, str] = {}
+        self._case_sensitive: Dict[str, str] = {}
+        self._matcher: Optional[_AhoCorasick] = None
+        self._loaded_until = 0.0
+        self._checked_at = 0.0
+        self._stats = {"lookups": 0, "chars_scanned": 0, "match_seconds": 0.0,
+                       "terms_local": 0, "terms_model": 0, "learned": 0}
+
+        if seed_path:
+            self._load_seed(seed_path)
+        # Learned terms are loaded on the first refresh, after any server fork
+        self._connection = ProcessLocalConnection(db_path, setup=self._create_schema) if db_path else None
+
+    @staticmethod
+    def _create_schema(db: sqlite3.Connection) -> None:
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS glossary_terms ("
+            "term TEXT PRIMARY KEY, explanation TEXT, updated_at REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS idx_glossary_updated ON glossary_terms (updated_at)")
+        # Earlier versions stored declined terms with a NULL explanation
+        db.execute("DELETE FROM glossary_terms WHERE explanation IS NULL")
+        db.commit()
+
+    def __len__(self) -> int:
+        return sum(1 for explanation in self._explanations.values() if explanation)
+
+    def find(self, text: str) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Resolve the terms in a report
+
+        Does no I/O; call refresh first (off the event loop) to pick up terms
+        learned by other workers.
+
+        Args:
+            text: Report text
+
+        Returns:
+            (explanations of known terms in order of first appearance,
+             candidate terms the index has never seen)
+        """
+        started = time.perf_counter()
+        with STAGE_SECONDS.time(stage="glossary_match"):
+            known = self._match(text)
+            seen = {term.lower() for term in known}
+            unknown = []
+            now = time.time()
+            for candidate in self._candidates(text):
+                key = candidate.lower()
+                if key in seen or key in self._patterns or self._declined.get(key, 0.0) > now:
+                    continue
+                seen.add(key)
+                unknown.append(candidate)
+
+        self._stats["lookups"] += 1
+        self._stats["chars_scanned"] += len(text)
+        self._stats["match_seconds"] += time.perf_counter() - started
+        explained = {term: self._explanations[term] for term in known if self._explanations.get(term)}
+        self._stats["terms_local"] += len(explained)
+        GLOSSARY_TERMS.inc(len(explained), source="local")
+        return explained, unknown
+
+    def learn(self, requested: List[str], explanations: Dict[str, str]) -> Dict[str, str]:
+        """
+        Store model explanations for terms that were sent to the model
+
+        Requested terms the model did not explain are remembered as not worth
+        explaining for declined_ttl_seconds, in this worker only.
+
+        Args:
+            requested: Candidate terms that were sent to the model
+            explanations: The model's term -> explanation mapping
+
+        Returns:
+            The explanations accepted for requested terms
+        """
+        by_key = {term.lower(): term for term in requested}
+        accepted: Dict[str, str] = {}
+        for term, explanation in explanations.items():
+            if isinstance(explanation, str) and explanation.strip() and term.lower() in by_key:
+                accepted[by_key[term.lower()]] = explanation.strip()
+
+        now = time.time()
+        rows = [(term, explanation, now) for term, explanation in accepted.items()]
+        with self._lock:
+            for term in requested:
+                if term not in accepted:
+                    self._decline(term.lower(), now)
+            if rows:
+                for term, explanation, _ in rows:
+                    self._add(term, explanation)
+                self._matcher = _AhoCorasick(list(self._patterns))
+        if self._connection is not None and rows:
+            db = self._connection.get()
+            with self._lock:
+                db.executemany(
+                    "INSERT OR REPLACE INTO glossary_terms (term, explanation, updated_at) VALUES (?, ?, ?)", rows
+                )
+                db.commit()
+
+        self._stats["terms_model"] += len(accepted)
+        self._stats["learned"] += len(accepted)
+        GLOSSARY_TERMS.inc(len(accepted), source="model")
+        return accepted
+
+    def stats(self) -> Dict[str, Any]:
+        """Index size, match throughput and the share of terms served locally"""
+        seconds = self._stats["match_seconds"]
+        served = self._stats["terms_local"] + self._stats["terms_model"]
+        return {
+            "terms": len(self),
+            "patterns": len(self._patterns),
+            "lookups": self._stats["lookups"],
+            "learned": self._stats["learned"],
+            "terms_local": self._stats["terms_local"],
+            "terms_model": self._stats["terms_model"],
+            "local_share": round(self._stats["terms_local"] / served, 4) if served else 0.0,
+            "avg_lookup_ms": round(seconds / self._stats["lookups"] * 1000, 3) if self._stats["lookups"] else 0.0,
+            "throughput_mb_per_s": round(self._stats["chars_scanned"] / seconds / 1e6, 2) if seconds else 0.0,
+        }
+
+    def _load_seed(self, path: str) -> None:
+        with open(path, encoding="utf-8") as f:
+            seed = json.load(f)
+        for term, entry in seed.items():
+            if isinstance(entry, str):
+                entry = {"explanation": entry}
+            self._add(term, entry.get("explanation"), entry.get("aliases", []))
+
+    def _add(self, term: str, explanation: Optional[str], aliases: Iterable[str] = ()) -> None:
+        self._explanations[term] = explanation
+        for pattern in [term, *aliases]:
+            key = pattern.lower()
+            self._patterns.setdefault(key, term)
+            # Short all-caps abbreviations collide with ordinary words in other cases
+            if pattern.isupper() and len(pattern) <= 4:
+                self._case_sensitive[key] = pattern
+
+    def _decline(self, key: str, now: float) -> None:
+        self._declined.pop(key, None)
+        self._declined[key] = now + self.declined_ttl_seconds
+        while len(self._declined) > self.declined_max_entries:
+            self._declined.popitem(last=False)
+        # Entries are in expiry order, so expired ones are at the front
+        while self._declined and next(iter(self._declined.values())) <= now:
+            self._declined.popitem(last=False)
+
+    def refresh(self, force: bool = False) -> None:
+        """
+        Pick up terms learned by other workers since the last load and build the matcher
+
+        Reads SQLite and may rebuild the automaton, so async callers run it in a thread.
+        """
+        if self._matcher is None:
+            with self._lock:
+                if self._matcher is None:
+                    self._matcher = _AhoCorasick(list(self._patterns))
+        if self._connection is None:
+            return
+        now = time.time()
+        if not force and now - self._checked_at < self.refresh_seconds:
+            return
+        self._checked_at = now
+        rows = self._connection.get().execute(
+            "SELECT term, explanation, updated_at FROM glossary_terms "
+            "WHERE updated_at > ? AND explanation IS NOT NULL",
+            (self._loaded_until,)
+        ).fetchall()
+        if not rows:
+            return
+        with self._lock:
+            for term, explanation, updated_at in rows:
+                self._add(term, explanation)
+                self._loaded_until = max(self._loaded_until, updated_at)
+            self._matcher = _AhoCorasick(list(self._patterns))
+
+    def _match(self, text: str) -> List[str]:
+        """Canonical terms found in text, longest match winning where matches overlap"""
+        matcher = self._matcher
+        if matcher is None:
+            # Only when find is called without refresh
+            with self._lock:
+                matcher = self._matcher = _AhoCorasick(list(self._patterns))
+
+        lowered = text.lower()
+        spans = []
+        for end, pattern in matcher.find_all(lowered):
+            start = end - len(pattern)
+            if start > 0 and lowered[start - 1].isalnum():
+                continue
+            if end < len(lowered) and lowered[end].isalnum():
+                continue
+            exact = self._case_sensitive.get(pattern)
+            if exact is not None and text[start:end] != exact:
+                continue
+            spans.append((start, end, self._patterns[pattern]))
+
+        terms, covered_until = [], -1
+        for start, end, term in sorted(spans, key=lambda span: (span[0], span[0] - span[1])):
+            if start < covered_until:
+                continue
+            covered_until = end
+            if term not in terms:
+                terms.append(term)
+        return terms
+
+    @staticmethod
+    def _candidates(text: str) -> List[str]:
+        """Words that look like jargon worth explaining"""
+        candidates = []
+        for match in _ACRONYM.finditer(text):
+            word = match.group()
+            if not 2 <= len(word) <= 10 or word.upper() in _NOT_TERMS or word.isdigit():
+                continue
+            # Long all-caps words are headings in upper case, not abbreviations
+            if word.isalpha() and word.isupper() and len(word) > 4:
+                continue
+            if _is_name_or_id(word):
+                continue
+            candidates.append(word)
+        candidates.extend(match.group() for match in _CLINICAL_WORD.finditer(text))
+        return candidates
+
+def _is_name_or_id(word: str) -> bool:
+    """Whether a candidate looks like a person's name or a record identifier"""
+    if _NAME_LIKE.match(word):
+        return True
+    digit_runs = _DIGIT_RUN.findall(word)
+    digits = sum(len(run) for run in digit_runs)
+    return digits >= 4 or (len(digit_runs) > 1 and digits >= 3)
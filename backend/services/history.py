@@ -0,0 +1,290 @@
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.metrics import HISTORY_WRITES, STAGE_SECONDS
+from utils.sqlite import ProcessLocalConnection
+
+# Maximum number of reports returned by a history listing
+MAX_REPORTS = 500
+
+@dataclass
+class ReportRef:
+    """Where an analysis is filed in the history"""
+    patient_id: str
+    # Defaults to the upload's content hash, so re-uploading a report replaces its entry
+    report_id: Optional[str]
+    # ISO 8601, UTC
+    reported_at: str
+
+    @classmethod
+    def parse(cls, patient_id: str, report_id: Optional[str] = None, report_date: Optional[str] = None) -> "ReportRef":
+        """
+        Build a reference from request fields
+
+        Raises:
+            ValueError: Empty patient id, or a report date that is not ISO 8601
+        """
+        patient_id = patient_id.strip()
+        if not patient_id:
+            raise ValueError("patient_id must not be empty")
+        if report_date:
+            reported = datetime.fromisoformat(report_date.strip())
+            if reported.tzinfo is not None:
+                reported = reported.astimezone(timezone.utc).replace(tzinfo=None)
+        else:
+            reported = datetime.now(timezone.utc).replace(tzinfo=None)
+        return cls(patient_id, (report_id or "").strip() or None, reported.isoformat(timespec="seconds"))
+
+def test_key(test: str) -> str:
+    """Key grouping the same test across reports ("Hb A1c", "HbA1c:" -> "hba1c")"""
+    return re.sub(r"[^a-z0-9%]+", "", test.lower())
+
+class AnalysisHistory:
+    """
+    SQLite store of past analyses and their lab values, per patient
+
+    Recorded analyses are buffered in memory and written in one transaction
+    per batch (every flush_seconds, or as soon as batch_size are pending), so
+    request handlers never wait on a database write. Lab values are stored
+    clustered by (patient, test, date), so a patient's trend for a test is a
+    single index range scan however large the table grows. Reads flush this
+    worker's buffer first, so they see every analysis it has recorded; other
+    workers' analyses appear within flush_seconds.
+    """
+
+    def __init__(self, db_path: str, batch_size: int = 500, flush_seconds: float = 1.0):
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self._connection = ProcessLocalConnection(db_path, setup=self._create_schema, isolation_level=None)
+        self._db_lock = threading.Lock()
+        # Pending writes by (patient_id, report_id); a later analysis of the same report replaces an earlier one
+        self._pending: Dict[Tuple[str, str], tuple] = {}
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        return self._connection.get()
+
+    @staticmethod
+    def _create_schema(db: sqlite3.Connection) -> None:
+        db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS history_reports (
+                report_pk INTEGER PRIMARY KEY,
+                patient_id TEXT NOT NULL,
+                report_id TEXT NOT NULL,
+                reported_at TEXT NOT NULL,
+                file_type TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                analysis TEXT NOT NULL,
+                UNIQUE (patient_id, report_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_history_reports_date ON history_reports (patient_id, reported_at);
+            CREATE TABLE IF NOT EXISTS history_lab_results (
+                patient_id TEXT NOT NULL,
+                test_key TEXT NOT NULL,
+                reported_at TEXT NOT NULL,
+                report_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                test TEXT NOT NULL,
+                value REAL NOT NULL,
+                unit TEXT NOT NULL,
+                low REAL,
+                high REAL,
+                status TEXT NOT NULL,
+                PRIMARY KEY (patient_id, test_key, reported_at, report_id, position)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_history_lab_results_report ON history_lab_results (patient_id, report_id);
+            """
+        )
+
+    async def start(self) -> None:
+        """Start the background writer"""
+        self._flush_lock = asyncio.Lock()
+        self._wake = asyncio.Event()
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        """Stop the background writer and write whatever is still pending"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    def record(self, patient_id: str, report_id: str, reported_at: str, file_type: str,
+               analysis: Dict[str, Any]) -> None:
+        """
+        Queue an analysis for writing
+
+        Args:
+            patient_id: Patient the report belongs to
+            report_id: Report id, unique per patient; recording it again replaces the earlier analysis
+            reported_at: ISO 8601 date of the report, used to order trends
+            file_type: Type of file (image/pdf)
+            analysis: Response payload, including lab_results
+        """
+        self._pending[(patient_id, report_id)] = (reported_at, file_type, analysis, time.time())
+        if len(self._pending) >= self.batch_size and self._wake is not None:
+            self._wake.set()
+
+    async def flush(self) -> None:
+        """Write all pending analyses in one transaction"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        # Batches are written one at a time so a newer analysis of a report is never overwritten by an older one
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            with STAGE_SECONDS.time(stage="history_flush"):
+                try:
+                    await asyncio.to_thread(self._write, pending)
+                except Exception as e:
+                    print(f"History write of {len(pending)} reports failed: {str(e)}")
+                    # Keep them for the next flush, behind anything recorded since, unless the store keeps failing
+                    if len(pending) + len(self._pending) <= self.batch_size * 10:
+                        self._pending = {**pending, **self._pending}
+
+    async def reports(self, patient_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        A patient's stored analyses, newest report first
+
+        Args:
+            patient_id: Patient id
+            limit: Maximum number of reports
+
+        Returns:
+            report_id, reported_at, file_type and the stored analysis of each report
+        """
+        await self.flush()
+        return await asyncio.to_thread(self._read_reports, patient_id, max(1, min(limit, MAX_REPORTS)))
+
+    async def trends(self, patient_id: str, tests: Optional[List[str]] = None,
+                     points: int = 20) -> List[Dict[str, Any]]:
+        """
+        Per-test trends from a patient's stored lab values, without calling the model
+
+        Args:
+            patient_id: Patient id
+            tests: Only these tests (matched by test_key); all tests when empty
+            points: Most recent values returned per test
+
+        Returns:
+            One entry per test: name, unit, the values in report order and the
+            change between the last two values
+        """
+        await self.flush()
+        with STAGE_SECONDS.time(stage="history_trends"):
+            rows = await asyncio.to_thread(self._read_lab_results, patient_id, tests)
+
+        series: Dict[str, List[Dict[str, Any]]] = {}
+        for key, test, value, unit, low, high, status, reported_at, report_id in rows:
+            series.setdefault(key, []).append({
+                "test": test, "value": value, "unit": unit, "low": low, "high": high,
+                "status": status, "reported_at": reported_at, "report_id": report_id,
+            })
+        return [_trend(values[-max(1, points):]) for values in series.values()]
+
+    def _write(self, pending: Dict[Tuple[str, str], tuple]) -> None:
+        reports, keys, lab_rows = [], [], []
+        for (patient_id, report_id), (reported_at, file_type, analysis, created_at) in pending.items():
+            keys.append((patient_id, report_id))
+            reports.append((patient_id, report_id, reported_at, file_type, created_at, json.dumps(analysis)))
+            for position, lab in enumerate(analysis.get("lab_results") or []):
+                lab_rows.append((
+                    patient_id, test_key(lab["test"]), reported_at, report_id, position, lab["test"],
+                    lab["value"], lab.get("unit") or "", lab.get("low"), lab.get("high"), lab.get("status") or "normal",
+                ))
+
+        with self._db_lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany(
+                    "INSERT INTO history_reports (patient_id, report_id, reported_at, file_type, created_at, analysis) "
+                    "VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (patient_id, report_id) DO UPDATE SET reported_at = excluded.reported_at, "
+                    "file_type = excluded.file_type, created_at = excluded.created_at, analysis = excluded.analysis",
+                    reports,
+                )
+                self._db.executemany(
+                    "DELETE FROM history_lab_results WHERE patient_id = ? AND report_id = ?", keys
+                )
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO history_lab_results (patient_id, test_key, reported_at, report_id, position, "
+                    "test, value, unit, low, high, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    lab_rows,
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        HISTORY_WRITES.inc(len(reports), table="reports")
+        HISTORY_WRITES.inc(len(lab_rows), table="lab_results")
+
+    def _read_reports(self, patient_id: str, limit: int) -> List[Dict[str, Any]]:
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT report_id, reported_at, file_type, analysis FROM history_reports "
+                "WHERE patient_id = ? ORDER BY reported_at DESC LIMIT ?",
+                (patient_id, limit),
+            ).fetchall()
+        return [
+            {"report_id": report_id, "reported_at": reported_at, "file_type": file_type, "analysis": json.loads(analysis)}
+            for report_id, reported_at, file_type, analysis in rows
+        ]
+
+    def _read_lab_results(self, patient_id: str, tests: Optional[List[str]]) -> List[tuple]:
+        query = (
+            "SELECT test_key, test, value, unit, low, high, status, reported_at, report_id "
+            "FROM history_lab_results WHERE patient_id = ?"
+        )
+        params: List[Any] = [patient_id]
+        keys = sorted({test_key(test) for test in tests or []} - {""})
+        if keys:
+            query += f" AND test_key IN ({', '.join('?' * len(keys))})"
+            params.extend(keys)
+        # Primary key order: no sort step, rows come straight off the index
+        query += " ORDER BY test_key, reported_at, report_id, position"
+        with self._db_lock:
+            return self._db.execute(query, params).fetchall()
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+def _trend(values: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Trend entry for one test's values, oldest first"""
+    latest = values[-1]
+    trend: Dict[str, Any] = {
+        "test": latest["test"],
+        "unit": latest["unit"],
+        "values": values,
+        "change": None,
+        "change_percent": None,
+        "direction": None,
+    }
+    if len(values) > 1:
+        previous = values[-2]
+        # Values in different units (mg/dL vs mmol/L) are not compared
+        if previous["unit"] == latest["unit"]:
+            change = latest["value"] - previous["value"]
+            trend["change"] = round(change, 4)
+            if previous["value"]:
+                trend["change_percent"] = round(change / abs(previous["value"]) * 100, 1)
+            trend["direction"] = "up" if change > 0 else "down" if change < 0 else "stable"
+    return trend
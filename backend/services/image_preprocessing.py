@@ -0,0 +1,90 @@
+import io
+from typing import List, Tuple
+
+# Formats whose frames are pages; GIF (animation) and MPO (stereo photo) frames are not
+MULTI_PAGE_FORMATS = ("TIFF",)
+
+def preprocess_image(image_data: bytes, max_dimension: int = 2048, grayscale: bool = True,
+                     jpeg_quality: int = 85) -> Tuple[bytes, str]:
+    """
+    Shrink an uploaded report image to what OCR actually needs
+
+    The image is auto-oriented from its EXIF data, downscaled so its longest
+    side is at most max_dimension, optionally converted to grayscale and
+    re-encoded as JPEG. If that does not make the file smaller and nothing
+    about the image changed, the original bytes are kept.
+
+    Args:
+        image_data: Encoded image bytes as uploaded
+        max_dimension: Maximum width/height in pixels
+        grayscale: Convert to single-channel grayscale
+        jpeg_quality: JPEG quality used for re-encoding
+
+    Returns:
+        (image bytes, MIME type) to send to OCR
+    """
+    from PIL import Image, ImageOps
+
+    image = Image.open(io.BytesIO(image_data))
+    original_mime = Image.MIME.get(image.format or "", "image/png")
+
+    # Multi-frame images reaching here (GIF, or a single TIFF page) are reduced to their first frame
+    image.seek(0)
+
+    # EXIF orientation tag; anything other than 1 means the pixels need rotating
+    changed = image.getexif().get(0x0112, 1) != 1
+    image = ImageOps.exif_transpose(image)
+
+    if max(image.size) > max_dimension:
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+        changed = True
+
+    target_mode = "L" if grayscale else "RGB"
+    if image.mode != target_mode:
+        image = image.convert(target_mode)
+        changed = True
+
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=jpeg_quality, optimize=True)
+    processed = output.getvalue()
+
+    if not changed and len(processed) >= len(image_data):
+        return image_data, original_mime
+
+    return processed, "image/jpeg"
+
+def split_pages(image_data: bytes, max_pages: int = 30) -> List[bytes]:
+    """
+    Split a multi-page image (a scanned TIFF fax) into one image per page
+
+    Single-frame images and formats whose frames are not pages are returned
+    unchanged. Each page of a multi-page file is re-encoded losslessly as
+    PNG; pre-processing shrinks it afterwards.
+
+    Args:
+        image_data: Encoded image bytes as uploaded
+        max_pages: Maximum number of pages accepted
+
+    Returns:
+        Encoded image bytes of each page, in page order
+
+    Raises:
+        ValueError: The image has more than max_pages pages
+    """
+    from PIL import Image, ImageSequence
+
+    image = Image.open(io.BytesIO(image_data))
+    frame_count = getattr(image, "n_frames", 1)
+    if frame_count <= 1 or image.format not in MULTI_PAGE_FORMATS:
+        return [image_data]
+    if frame_count > max_pages:
+        raise ValueError(f"Image has {frame_count} pages; at most {max_pages} are accepted")
+
+    pages = []
+    for frame in ImageSequence.Iterator(image):
+        if frame.mode not in ("1", "L", "RGB", "RGBA"):
+            frame = frame.convert("RGB")
+        output = io.BytesIO()
+        frame.save(output, format="PNG")
+        pages.append(output.getvalue())
+    return pages
@@ -0,0 +1,415 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+_WHITESPACE = " \t\r\n"
+# Characters that can end or escape inside a string; everything else is skipped in one step
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+# Validates one top-level member, returning the (possibly coerced) value or raising ValueError
+FieldValidator = Callable[[Any], Any]
+
+@dataclass
+class ParseResult:
+    """Outcome of parsing a model answer"""
+
+    # Parsed object, None when nothing usable was found
+    value: Optional[Dict[str, Any]] = None
+    # The top-level object was closed (otherwise it was repaired from a truncated answer)
+    complete: bool = False
+    # Members dropped because they were malformed or failed validation
+    errors: List[str] = field(default_factory=list)
+    # Member that was cut off and recovered from the text that arrived
+    repaired_key: Optional[str] = None
+
+class _Level:
+    """One open container while scanning"""
+
+    __slots__ = ("kind", "expect_key")
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.expect_key = kind == "{"
+
+class IncrementalJSONParser:
+    """
+    Error-tolerant parser for a JSON object embedded in streamed model output
+
+    Text can be fed in pieces as it streams. Prose, markdown fences and stray
+    braces before the object are skipped: a candidate object that turns out
+    not to be JSON (for example "{see below}") is abandoned and scanning
+    resumes at the next "{". Text after the object closes is ignored, as are
+    trailing commas.
+
+    Top-level members are decoded, validated and stored in ``members`` as
+    soon as each one is complete, so callers do not wait for the end of the
+    answer. If the answer is cut off, ``result()`` recovers what arrived:
+    completed members plus the unfinished member, with open strings, arrays
+    and objects closed after their last complete element.
+    """
+
+    def __init__(self, validators: Optional[Dict[str, FieldValidator]] = None):
+        self.validators = validators or {}
+        self.buffer = ""
+        self.members: Dict[str, Any] = {}
+        self.errors: List[str] = []
+        self.complete = False
+        self._pos = 0
+        self._reset(None)
+
+    def _reset(self, start: Optional[int]) -> None:
+        """Start scanning a candidate object at start (None = look for one)"""
+        self._start = start
+        self._stack: List[_Level] = [_Level("{")] if start is not None else []
+        self._in_string = False
+        self._escape = False
+        self._string_is_key = False
+        self._string_start = 0
+        # Trailing commas to leave out when decoding
+        self._drop: List[int] = []
+        self._last_significant = start
+        # Top-level member being scanned
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+        # Last point inside the current value where closing every open container gives valid JSON
+        self._checkpoint: Optional[Tuple[int, int]] = None
+        self._candidate_members: Dict[str, Any] = {}
+        self._candidate_errors: List[str] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Add streamed text
+
+        Args:
+            chunk: Next piece of model output
+
+        Returns:
+            (key, value) pairs for the top-level members completed by this chunk
+        """
+        self.buffer += chunk
+        completed: List[Tuple[str, Any]] = []
+        buffer = self.buffer
+        while self._pos < len(buffer) and not self.complete:
+            index = self._pos
+            if self._start is None:
+                index = buffer.find("{", index)
+                if index == -1:
+                    self._pos = len(buffer)
+                    break
+                self._pos = index + 1
+                self._reset(index)
+                continue
+            if self._in_string and not self._escape:
+                match = _STRING_SPECIAL.search(buffer, index)
+                if match is None:
+                    self._pos = len(buffer)
+                    break
+                index = match.start()
+            self._pos = index + 1
+            if not self._scan(buffer, index, completed):
+                # Not a JSON object after all; look for the next "{"
+                restart = self._start + 1
+                self._reset(None)
+                self._pos = restart
+                completed = []
+        self.members = self._candidate_members
+        self.errors = self._candidate_errors
+        return completed
+
+    def partial_string(self, key: str) -> Optional[str]:
+        """
+        Text of a top-level string member received so far (the whole string once complete)
+
+        Args:
+            key: Member name, e.g. "summary"
+
+        Returns:
+            Decoded text, or None if the member has not started
+        """
+        value = self.members.get(key)
+        if isinstance(value, str):
+            return value
+        if self._key != key or self._value_start is None or len(self._stack) != 1 or not self._in_string:
+            return None
+        return _decode_partial_string(self.buffer[self._value_start + 1:self._pos])
+
+    def result(self) -> ParseResult:
+        """Parse everything fed so far, repairing a truncated object"""
+        if self._start is None:
+            return ParseResult(errors=list(self.errors))
+        value, errors, repaired_key = dict(self.members), list(self.errors), None
+        if not self.complete and self._key is not None and self._value_start is not None:
+            partial = self._repair_value()
+            if partial is not _MISSING and self._store(self._key, partial, value, errors):
+                repaired_key = self._key
+        return ParseResult(value=value, complete=self.complete, errors=errors, repaired_key=repaired_key)
+
+    def _scan(self, buffer: str, index: int, completed: List[Tuple[str, Any]]) -> bool:
+        """Advance the scanner over one character; False when the candidate is not JSON"""
+        char = buffer[index]
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                self._last_significant = index
+                self._end_string(buffer, index, completed)
+            return True
+
+        if char in _WHITESPACE:
+            return True
+
+        depth = len(self._stack)
+        level = self._stack[-1]
+
+        if depth == 1:
+            # Top-level object: only keys, colons, commas and the start of values are expected
+            if self._key is None:
+                if char == '"' and level.expect_key:
+                    self._in_string, self._string_is_key, self._string_start = True, True, index
+                elif char == "}":
+                    self.complete = True
+                elif char == "," and not level.expect_key:
+                    level.expect_key = True
+                else:
+                    return False
+                self._last_significant = index
+                return True
+            if self._value_start is None:
+                if char != ":" and buffer[self._last_significant] != ":":
+                    return False
+                if char == ":":
+                    self._last_significant = index
+                    return True
+                self._value_start = index
+                self._checkpoint = None
+
+        if char == '"':
+            self._in_string = True
+            self._string_is_key = level.kind == "{" and level.expect_key and depth > 1
+            self._string_start = index
+        elif char in "{[":
+            self._stack.append(_Level(char))
+            self._checkpoint = (index + 1, len(self._stack))
+        elif char in "}]":
+            if depth == 1 or _CLOSERS[level.kind] != char:
+                # A top-level value ended by the object closing, e.g. {"a": 1}
+                if depth == 1 and char == "}":
+                    self._end_value(buffer, index, completed)
+                    self.complete = True
+                    self._last_significant = index
+                    return True
+                return False
+            if buffer[self._last_significant] == ",":
+                self._drop.append(self._last_significant)
+            self._stack.pop()
+            if len(self._stack) == 1:
+                self._last_significant = index
+                self._end_value(buffer, index + 1, completed)
+                return True
+            self._checkpoint = (index + 1, len(self._stack))
+        elif char == ",":
+            if depth == 1:
+                self._end_value(buffer, index, completed)
+                level.expect_key = True
+            else:
+                self._checkpoint = (self._last_significant + 1, depth)
+                if level.kind == "{":
+                    level.expect_key = True
+        elif char == ":" and depth > 1:
+            level.expect_key = False
+        self._last_significant = index
+        return True
+
+    def _end_string(self, buffer: str, index: int, completed: List[Tuple[str, Any]]) -> None:
+        depth = len(self._stack)
+        if self._string_is_key:
+            if depth == 1:
+                try:
+                    self._key = json.loads(buffer[self._string_start:index + 1], strict=False)
+                except json.JSONDecodeError:
+                    self._key = buffer[self._string_start + 1:index]
+                self._value_start = None
+                self._stack[0].expect_key = False
+            else:
+                self._stack[-1].expect_key = False
+            return
+        if depth == 1:
+            self._end_value(buffer, index + 1, completed)
+        else:
+            self._checkpoint = (index + 1, depth)
+
+    def _end_value(self, buffer: str, end: int, completed: List[Tuple[str, Any]]) -> None:
+        """A top-level member's value ended just before end"""
+        if self._key is None or self._value_start is None:
+            return
+        key, text = self._key, self._slice(self._value_start, end).strip()
+        self._key, self._value_start, self._checkpoint = None, None, None
+        try:
+            value = json.loads(text, strict=False)
+        except json.JSONDecodeError as e:
+            self._candidate_errors.append(f"{key}: {e.msg}")
+            return
+        if self._store(key, value, self._candidate_members, self._candidate_errors):
+            completed.append((key, self._candidate_members[key]))
+
+    def _store(self, key: str, value: Any, members: Dict[str, Any], errors: List[str]) -> bool:
+        validator = self.validators.get(key)
+        if validator is not None:
+            try:
+                value = validator(value)
+            except ValueError as e:
+                errors.append(f"{key}: {e}")
+                return False
+        members[key] = value
+        return True
+
+    def _slice(self, start: int, end: int) -> str:
+        """buffer[start:end] without the trailing commas found while scanning"""
+        drops = [position for position in self._drop if start <= position < end]
+        if not drops:
+            return self.buffer[start:end]
+        pieces, cursor = [], start
+        for position in drops:
+            pieces.append(self.buffer[cursor:position])
+            cursor = position + 1
+        pieces.append(self.buffer[cursor:end])
+        return "".join(pieces)
+
+    def _repair_value(self) -> Any:
+        """Best-effort value for the unfinished top-level member"""
+        start, end = self._value_start, self._pos
+        depth = len(self._stack)
+
+        if depth == 1:
+            if self._in_string:
+                # A top-level string (such as the summary) keeps the text that arrived
+                return _decode_partial_string(self.buffer[start + 1:end])
+
+            # A number or literal that was still arriving
+            return _loads_closed(self._slice(start, end).strip(), [])
+
+        # Inside arrays and objects, an unfinished element is dropped rather than cut short
+        if self._checkpoint is not None:
+            position, checkpoint_depth = self._checkpoint
+            text = self._slice(start, position).rstrip().rstrip(",")
+            return _loads_closed(text, self._stack[1:checkpoint_depth])
+        return _MISSING
+
+_MISSING = object()
+_DECODER = json.JSONDecoder(strict=False)
+
+def _loads_closed(text: str, open_levels: Iterable[_Level]) -> Any:
+    closers = "".join(_CLOSERS[level.kind] for level in reversed(list(open_levels)))
+    try:
+        return json.loads(text + closers, strict=False)
+    except json.JSONDecodeError:
+        return _MISSING
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+def _decode_partial_string(raw: str) -> str:
+    """Decode the body of a JSON string that may end in the middle of an escape sequence"""
+    decoded = []
+    i = 0
+    while i < len(raw):
+        char = raw[i]
+        if char == '"':
+            break
+        if char != "\\":
+            decoded.append(char)
+            i += 1
+            continue
+        if i + 1 >= len(raw):
+            break
+        if raw[i + 1] == "u":
+            if i + 6 > len(raw):
+                break
+            try:
+                decoded.append(chr(int(raw[i + 2:i + 6], 16)))
+            except ValueError:
+                pass
+            i += 6
+        else:
+            decoded.append(_ESCAPES.get(raw[i + 1], raw[i + 1]))
+            i += 2
+    return "".join(decoded)
+
+def parse_json_object(text: str, validators: Optional[Dict[str, FieldValidator]] = None) -> ParseResult:
+    """
+    Parse a complete model answer that should contain a JSON object
+
+    Args:
+        text: Model output
+        validators: Per-member validators, e.g. from model_field_validators()
+
+    Returns:
+        ParseResult; value is None when no object was found
+    """
+    # Well-formed answers (the common case) are decoded in one call
+    start = text.find("{")
+    if start != -1:
+        try:
+            value, _ = _DECODER.raw_decode(text, start)
+        except json.JSONDecodeError:
+            value = None
+        if isinstance(value, dict):
+            members: Dict[str, Any] = {}
+            errors: List[str] = []
+            parser = IncrementalJSONParser(validators)
+            for key, member in value.items():
+                parser._store(key, member, members, errors)
+            return ParseResult(value=members, complete=True, errors=errors)
+
+    parser = IncrementalJSONParser(validators)
+    parser.feed(text)
+    return parser.result()
+
+def model_field_validators(model: Any, exclude: Iterable[str] = ()) -> Dict[str, FieldValidator]:
+    """
+    Build member validators from a pydantic model's field types
+
+    Values are validated in pydantic's lax mode. A single string where a
+    list of strings is expected becomes a one-item list, and list items that
+    are numbers are turned into strings, since models often answer that way.
+
+    Args:
+        model: pydantic BaseModel class
+        exclude: Fields the model output does not contain
+
+    Returns:
+        Field name -> validator
+    """
+    from pydantic import TypeAdapter, ValidationError
+
+    def make_validator(annotation: Any) -> FieldValidator:
+        adapter = TypeAdapter(annotation)
+
+        def validate(value: Any) -> Any:
+            try:
+                return adapter.validate_python(value)
+            except ValidationError as first_error:
+                if isinstance(value, str):
+                    coerced: Any = [value]
+                elif isinstance(value, list):
+                    coerced = [str(item) if isinstance(item, (int, float)) else item for item in value if item is not None]
+                elif isinstance(value, dict):
+                    coerced = {str(k): str(v) if isinstance(v, (int, float)) else v for k, v in value.items()}
+                else:
+                    raise ValueError(str(first_error.errors()[0]["msg"]))
+                try:
+                    return adapter.validate_python(coerced)
+                except ValidationError:
+                    raise ValueError(str(first_error.errors()[0]["msg"]))
+
+        return validate
+
+    return {
+        name: make_validator(info.annotation)
+        for name, info in model.model_fields.items()
+        if name not in exclude
+    }
@@ -0,0 +1,206 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from utils.metrics import STAGE_SECONDS
+
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+_FLAG = r"\b(?:H|L|HIGH|LOW|High|Low)\b|\*"
+
+# One lab row: test name, value, optional flag and unit, reference range, optional flag.
+# Matched per line, or across a whole page when extraction has flattened the line breaks.
+_ROW = re.compile(
+    rf"""
+    (?P<name>[A-Za-z][\w().,/%+\-]*(?:[ \t]+[A-Za-z][\w().,/%+\-]*){{0,4}}?)
+    [ \t]*[:\-]?[ \t]+
+    (?P<value>{_NUMBER})
+    (?:[ \t]*(?P<flag>{_FLAG}))?
+    (?:[ \t]*(?P<unit>[A-Za-z%µμ/][A-Za-z0-9%µμ/.^*]*|10\^\d+/[A-Za-zµμ]+))?
+    (?:[ \t]*(?P<flag_after_unit>{_FLAG}))?
+    [ \t]*[(\[]?[ \t]*
+    (?:
+        (?P<low>{_NUMBER})[ \t]*(?:-|–|to)[ \t]*(?P<high>{_NUMBER})
+      | (?:<=?|≤|[Uu]p[ \t]*to)[ \t]*(?P<upper>{_NUMBER})
+      | (?:>=?|≥)[ \t]*(?P<lower>{_NUMBER})
+    )?
+    [ \t]*[)\]]?
+    (?:[ \t]*(?P<flag_after_range>{_FLAG}))?
+    """,
+    re.VERBOSE
+)
+
+# Header and demographic words that end up in front of the first test name on a line
+_NAME_PREFIXES = {
+    "test", "tests", "name", "result", "results", "value", "values", "unit", "units", "observed",
+    "reference", "range", "interval", "biological", "normal", "flag", "status", "investigation",
+    "years", "yrs", "year", "male", "female", "age", "sex", "gender", "parameter", "parameters",
+}
+
+@dataclass
+class LabTable:
+    """
+    Lab rows parsed from a report, stored column by column
+
+    Numeric columns are NumPy arrays (NaN where the report gave no bound) so
+    the abnormal-value checks run over every row at once.
+    """
+
+    tests: List[str] = field(default_factory=list)
+    values: np.ndarray = field(default_factory=lambda: np.empty(0))
+    units: List[str] = field(default_factory=list)
+    low: np.ndarray = field(default_factory=lambda: np.empty(0))
+    high: np.ndarray = field(default_factory=lambda: np.empty(0))
+    # Flag printed on the report: -1 low, 1 high, 0 none
+    reported: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int8))
+    # Report text that is not part of a lab row
+    other_text: str = ""
+
+    def __len__(self) -> int:
+        return len(self.tests)
+
+    @property
+    def status(self) -> np.ndarray:
+        """-1 below range, 1 above range, 0 normal; the printed flag is used for rows without a range"""
+        below = self.values < self.low
+        above = self.values > self.high
+        has_range = ~(np.isnan(self.low) & np.isnan(self.high))
+        computed = above.astype(np.int8) - below.astype(np.int8)
+        return np.where(has_range, computed, self.reported).astype(np.int8)
+
+    @property
+    def abnormal(self) -> np.ndarray:
+        return self.status != 0
+
+    def all_normal(self) -> bool:
+        """True when there are rows and every one is within its reference range"""
+        return len(self) > 0 and not self.abnormal.any()
+
+    def to_prompt(self) -> str:
+        """
+        Compact text for the model: out-of-range rows with their reference range,
+        then the in-range rows as "test value unit" only
+        """
+        status = self.status
+        lines = []
+        abnormal = np.flatnonzero(status != 0)
+        if len(abnormal):
+            lines.append("Out of range (value, reference range):")
+            for index in abnormal.tolist():
+                direction = "HIGH" if status[index] > 0 else "LOW"
+                lines.append(f"- {self._value_text(index)} ({self._range_text(index)}) {direction}")
+        normal = np.flatnonzero(status == 0)
+        if len(normal):
+            lines.append("Within range: " + "; ".join(self._value_text(index) for index in normal.tolist()))
+        return "\n".join(lines)
+
+    def records(self) -> List[Dict[str, Any]]:
+        """Rows as dicts (test, value, unit, low, high, status "low"/"normal"/"high"), None for missing bounds"""
+        status = self.status.tolist()
+        return [
+            {
+                "test": self.tests[index],
+                "value": float(self.values[index]),
+                "unit": self.units[index],
+                "low": _optional(self.low[index]),
+                "high": _optional(self.high[index]),
+                "status": _STATUS_NAMES[status[index]],
+            }
+            for index in range(len(self))
+        ]
+
+    def normal_findings(self) -> List[str]:
+        """Key findings for a report whose results are all within range"""
+        names = ", ".join(self.tests[:8]) + (", ..." if len(self) > 8 else "")
+        return [f"All {len(self)} test results are within their reference ranges ({names})"]
+
+    def _value_text(self, index: int) -> str:
+        return f"{self.tests[index]} {_format_number(self.values[index])} {self.units[index]}".rstrip()
+
+    def _range_text(self, index: int) -> str:
+        low, high = self.low[index], self.high[index]
+        if np.isnan(low) and np.isnan(high):
+            return "no range"
+        if np.isnan(low):
+            return f"<= {_format_number(high)}"
+        if np.isnan(high):
+            return f">= {_format_number(low)}"
+        return f"{_format_number(low)}-{_format_number(high)}"
+
+_STATUS_NAMES = {-1: "low", 0: "normal", 1: "high"}
+
+def _optional(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+def _format_number(value: float) -> str:
+    return f"{value:g}" if abs(value) < 1e6 else f"{value:.0f}"
+
+def _to_float(text: str) -> float:
+    return float(text.replace(",", "")) if text else np.nan
+
+def _flag_direction(*flags: str) -> int:
+    for flag in flags:
+        if flag:
+            return 1 if flag.upper() in ("H", "HIGH", "*") else -1
+    return 0
+
+def _split_name(name: str) -> Tuple[str, str]:
+    """(leading header words, test name)"""
+    words = name.split()
+    dropped = 0
+    while len(words) - dropped > 1 and words[dropped].lower().strip(":") in _NAME_PREFIXES:
+        dropped += 1
+    return " ".join(words[:dropped]), " ".join(words[dropped:]).strip(" :-")
+
+def parse_lab_values(text: str) -> LabTable:
+    """
+    Pull lab rows (test, value, unit, reference range, flag) out of report text
+
+    Only rows with a reference range or a high/low flag are kept, so numbers
+    such as ages, dates and IDs are left in the other text.
+
+    Args:
+        text: Cleaned report text from FileProcessor
+
+    Returns:
+        LabTable with the rows in report order and the remaining text
+    """
+    with STAGE_SECONDS.time(stage="lab_parse"):
+        tests, units, values, low, high, reported = [], [], [], [], [], []
+        other: List[str] = []
+
+        for line in text.splitlines():
+            position = search_from = 0
+            while True:
+                match = _ROW.search(line, search_from)
+                if match is None:
+                    break
+                groups = match.groupdict()
+                has_range = groups["low"] or groups["upper"] or groups["lower"]
+                flag = _flag_direction(groups["flag"], groups["flag_after_unit"], groups["flag_after_range"])
+                prefix, name = _split_name(groups["name"])
+                if not (has_range or flag) or not name:
+                    # The "unit" may be the next test's name, so keep looking right after the value
+                    search_from = match.end("value")
+                    continue
+
+                other.append(line[position:match.start()] + " " + prefix)
+                position = search_from = match.end()
+                tests.append(name)
+                units.append(groups["unit"] or "")
+                values.append(_to_float(groups["value"]))
+                low.append(_to_float(groups["low"] or groups["lower"]))
+                high.append(_to_float(groups["high"] or groups["upper"]))
+                reported.append(flag)
+            other.append(line[position:])
+
+        return LabTable(
+            tests=tests,
+            values=np.array(values, dtype=np.float64),
+            units=units,
+            low=np.array(low, dtype=np.float64),
+            high=np.array(high, dtype=np.float64),
+            reported=np.array(reported, dtype=np.int8),
+            other_text=" ".join(" ".join(other).split())
+        )
@@ -0,0 +1,408 @@
+import abc
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from services.compaction import estimate_tokens
+from utils.clients import MODEL_NAME, get_clients
+from utils.config import get_settings
+from utils.metrics import FALLBACKS, MODEL_REPLAYS, MODEL_ROUTES
+from utils.resilience import is_retryable
+
+@dataclass
+class ModelResponse:
+    """Text returned by a model call, with token counts when the backend reports them"""
+    text: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+class ModelClient(abc.ABC):
+    """
+    Interface for the text and vision models behind AIService and OCR
+
+    Every method is async and stateless per call, so one client is shared by
+    all requests of a worker. Callers wrap calls in the model guard; clients
+    only make the call. Backends must implement generate and read_image.
+    """
+
+    # Identifies the model (and routing) in cache keys, so answers of different models are not mixed
+    name = "base"
+
+    @abc.abstractmethod
+    async def generate(self, prompt: str) -> ModelResponse:
+        """
+        Answer a text prompt
+
+        Args:
+            prompt: Complete prompt
+
+        Returns:
+            The full answer
+        """
+
+    async def stream(self, prompt: str) -> AsyncIterator[ModelResponse]:
+        """
+        Answer a text prompt piece by piece (by default, in a single piece)
+
+        Args:
+            prompt: Complete prompt
+
+        Yields:
+            Pieces of the answer; token counts may arrive on any piece
+        """
+        yield await self.generate(prompt)
+
+    @abc.abstractmethod
+    async def read_image(self, prompt: str, image_data: bytes, mime_type: str = "image/png") -> ModelResponse:
+        """
+        Answer a prompt about an image (OCR)
+
+        Args:
+            prompt: Instructions for the model
+            image_data: Encoded image bytes
+            mime_type: MIME type of image_data
+
+        Returns:
+            The full answer
+        """
+
+    def warm_up(self) -> None:
+        """Build SDK clients now instead of on the first call (runs in a thread)"""
+
+def _usage(response: Any) -> Dict[str, int]:
+    """Prompt and output token counts of a LangChain or google-generativeai response"""
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return {}
+    if isinstance(usage, dict):
+        return {"input_tokens": usage.get("input_tokens") or 0, "output_tokens": usage.get("output_tokens") or 0}
+    return {
+        "input_tokens": getattr(usage, "prompt_token_count", 0) or 0,
+        "output_tokens": getattr(usage, "candidates_token_count", 0) or 0,
+    }
+
+def _chat_messages(prompt: str) -> List[Any]:
+    """Wrap a prompt as chat messages (langchain is imported on first use)"""
+    from langchain_core.messages import HumanMessage
+    return [HumanMessage(content=prompt)]
+
+class GeminiClient(ModelClient):
+    """
+    Gemini through the two SDKs the app has always used: the langchain chat
+    model for text (falling back to google.generativeai when the chat client
+    itself fails) and google.generativeai for vision
+
+    SDK objects come from the shared ClientRegistry, so benchmark stubs
+    installed there are picked up here too.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME, temperature: float = 0.1):
+        self.name = model_name
+        self.temperature = temperature
+
+    @property
+    def model(self) -> Any:
+        return get_clients().generative_model(self.name)
+
+    @property
+    def llm(self) -> Any:
+        return get_clients().chat_model(self.name, temperature=self.temperature)
+
+    async def generate(self, prompt: str) -> ModelResponse:
+        try:
+            response = await self.llm.ainvoke(_chat_messages(prompt))
+            return ModelResponse(response.content, **_usage(response))
+        except Exception as e:
+            # A throttling or failing upstream is left to the guard; it is not sent a second request
+            if is_retryable(e):
+                raise
+            FALLBACKS.inc(kind="direct_model_call")
+            response = await self.model.generate_content_async(prompt)
+            return ModelResponse(response.text, **_usage(response))
+
+    async def stream(self, prompt: str) -> AsyncIterator[ModelResponse]:
+        async for chunk in self.llm.astream(_chat_messages(prompt)):
+            yield ModelResponse(chunk.content or "", **_usage(chunk))
+
+    async def read_image(self, prompt: str, image_data: bytes, mime_type: str = "image/png") -> ModelResponse:
+        response = await self.model.generate_content_async([prompt, {"mime_type": mime_type, "data": image_data}])
+        return ModelResponse(response.text, **_usage(response))
+
+    def warm_up(self) -> None:
+        get_clients().generative_model(self.name)
+        get_clients().chat_model(self.name, temperature=self.temperature)
+
+# Lab table rows of the analysis prompt flagged out of range ("- LDL 141 mg/dL (0-100) HIGH")
+_OUT_OF_RANGE = re.compile(r"^\s*- (.+?) \(([^)]*)\) (HIGH|LOW)\s*$", re.MULTILINE)
+
+class MockModelClient(ModelClient):
+    """
+    Deterministic local model for offline runs and performance tests
+
+    Answers are built from the prompt alone, in the JSON shapes the real
+    prompts ask for: the analysis lists the out-of-range rows of the prompt's
+    lab table as key findings, and terms prompts get an empty object. The
+    whole pipeline (parsing, lab findings, caches, history) runs without
+    network access or an API key, and the same prompt always gets the same
+    answer. latency_ms is added to every call.
+    """
+
+    name = "mock"
+
+    VISION_TEXT = (
+        "Offline Mock Laboratory\n"
+        "Lipid Panel\n"
+        "Total Cholesterol 212 mg/dL 125-200 H\n"
+        "LDL Cholesterol 141 mg/dL 0-100 H\n"
+        "HDL Cholesterol 52 mg/dL 40-60\n"
+        "HbA1c 5.4 % 4.0-5.6\n"
+    )
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+
+    async def generate(self, prompt: str) -> ModelResponse:
+        await self._delay()
+        return self._respond(prompt, self._answer(prompt))
+
+    async def stream(self, prompt: str) -> AsyncIterator[ModelResponse]:
+        # Time to first token is a fraction of the full latency, as with the real model
+        await self._delay(0.2)
+        answer = self._answer(prompt)
+        pieces = [answer[i:i + 16] for i in range(0, len(answer), 16)] or [""]
+        for piece in pieces:
+            await self._delay(0.8 / len(pieces))
+            yield ModelResponse(piece)
+        yield ModelResponse("", estimate_tokens(prompt), estimate_tokens(answer))
+
+    async def read_image(self, prompt: str, image_data: bytes, mime_type: str = "image/png") -> ModelResponse:
+        await self._delay()
+        return ModelResponse(self.VISION_TEXT, 258, estimate_tokens(self.VISION_TEXT))
+
+    async def _delay(self, share: float = 1.0) -> None:
+        if self.latency_ms > 0:
+            await asyncio.sleep(self.latency_ms * share / 1000)
+
+    @staticmethod
+    def _respond(prompt: str, answer: str) -> ModelResponse:
+        return ModelResponse(answer, estimate_tokens(prompt), estimate_tokens(answer))
+
+    @staticmethod
+    def _answer(prompt: str) -> str:
+        if prompt.lstrip().startswith("You are a medical expert."):
+            # Terms prompts: no explanations, so nothing made up is added to the glossary
+            return json.dumps({})
+
+        out_of_range = _OUT_OF_RANGE.findall(prompt)
+        findings = [
+            f"{value} is {'above' if direction == 'HIGH' else 'below'} its reference range ({reference})"
+            for value, reference, direction in out_of_range
+        ]
+        if findings:
+            summary = f"{len(findings)} result(s) are outside their reference ranges."
+        else:
+            summary = "No results outside their reference ranges were found."
+        analysis: Dict[str, Any] = {
+            "summary": summary,
+            "key_findings": findings or ["No abnormal values were identified"],
+            "lifestyle_recommendations": ["Discuss these results with your doctor"],
+            "precautions": ["This analysis was produced offline by a mock model"],
+            "confidence_score": 0.5,
+        }
+        if '"complex_terms"' in prompt:
+            analysis["complex_terms"] = {}
+        return json.dumps(analysis)
+
+class ReplayMissError(Exception):
+    """Replay-only mode got a prompt that was never recorded"""
+
+class RecordReplayClient(ModelClient):
+    """
+    Serves model answers captured on disk, recording the ones it does not have
+
+    Recordings are JSON Lines keyed by a hash of the call kind, the prompt and
+    the image bytes (images themselves are not stored). With an inner client,
+    calls without a recording are passed on and their answers appended to the
+    file; without one (replay only), they raise ReplayMissError. Streams are
+    recorded piece by piece and replayed with the same pieces.
+    """
+
+    def __init__(self, path: str, inner: Optional[ModelClient] = None):
+        self.path = path
+        self.inner = inner
+        self.name = inner.name if inner is not None else f"replay:{os.path.basename(path)}"
+        self._lock = threading.Lock()
+        self._recordings: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    async def generate(self, prompt: str) -> ModelResponse:
+        key = self._key("text", prompt)
+        recording = self._lookup(key)
+        if recording is not None:
+            return ModelResponse("".join(recording["pieces"]), recording["input_tokens"], recording["output_tokens"])
+        response = await self._require_inner().generate(prompt)
+        await self._record(key, "text", [response.text], response)
+        return response
+
+    async def stream(self, prompt: str) -> AsyncIterator[ModelResponse]:
+        key = self._key("text", prompt)
+        recording = self._lookup(key)
+        if recording is not None:
+            for piece in recording["pieces"]:
+                yield ModelResponse(piece)
+            yield ModelResponse("", recording["input_tokens"], recording["output_tokens"])
+            return
+
+        pieces: List[str] = []
+        usage = ModelResponse("")
+        async for chunk in self._require_inner().stream(prompt):
+            pieces.append(chunk.text)
+            usage.input_tokens += chunk.input_tokens
+            usage.output_tokens += chunk.output_tokens
+            yield chunk
+        # Only complete streams are recorded
+        await self._record(key, "text", pieces, usage)
+
+    async def read_image(self, prompt: str, image_data: bytes, mime_type: str = "image/png") -> ModelResponse:
+        key = self._key("image", prompt, image_data)
+        recording = self._lookup(key)
+        if recording is not None:
+            return ModelResponse("".join(recording["pieces"]), recording["input_tokens"], recording["output_tokens"])
+        response = await self._require_inner().read_image(prompt, image_data, mime_type)
+        await self._record(key, "image", [response.text], response)
+        return response
+
+    def warm_up(self) -> None:
+        if self.inner is not None:
+            self.inner.warm_up()
+
+    def stats(self) -> Dict[str, Any]:
+        """Number of recordings held"""
+        return {"path": self.path, "recordings": len(self._recordings), "recording": self.inner is not None}
+
+    @staticmethod
+    def _key(kind: str, prompt: str, image_data: bytes = b"") -> str:
+        digest = hashlib.sha256(kind.encode())
+        digest.update(b"\0" + prompt.encode())
+        digest.update(b"\0" + hashlib.sha256(image_data).digest())
+        return digest.hexdigest()
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        recording = self._recordings.get(key)
+        MODEL_REPLAYS.inc(result="hit" if recording is not None else "miss")
+        return recording
+
+    def _require_inner(self) -> ModelClient:
+        if self.inner is None:
+            raise ReplayMissError(f"No recorded model response for this prompt in {self.path}")
+        return self.inner
+
+    async def _record(self, key: str, kind: str, pieces: List[str], usage: ModelResponse) -> None:
+        recording = {
+            "key": key, "kind": kind, "model": self.name, "pieces": pieces,
+            "input_tokens": usage.input_tokens, "output_tokens": usage.output_tokens,
+        }
+        self._recordings[key] = recording
+        try:
+            await asyncio.to_thread(self._append, recording)
+        except Exception as e:
+            print(f"Error saving model recording: {str(e)}")
+
+    def _append(self, recording: Dict[str, Any]) -> None:
+        # One write per line, so lines appended by several workers do not interleave
+        line = json.dumps(recording) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    recording = json.loads(line)
+                    self._recordings[recording["key"]] = recording
+                except (ValueError, KeyError):
+                    # A line cut short by a crash while recording
+                    print(f"Skipping unreadable model recording on line {number} of {self.path}")
+
+class RoutedModelClient(ModelClient):
+    """
+    Sends text prompts of at least threshold_tokens (estimated) to a second,
+    larger model and everything else, images included, to the default model
+    """
+
+    def __init__(self, default: ModelClient, large: ModelClient, threshold_tokens: int):
+        self.default = default
+        self.large = large
+        self.threshold_tokens = threshold_tokens
+        self.name = f"{default.name}|{large.name}>={threshold_tokens}"
+
+    def route(self, prompt: str) -> ModelClient:
+        """Client that answers a text prompt"""
+        client = self.large if estimate_tokens(prompt) >= self.threshold_tokens else self.default
+        MODEL_ROUTES.inc(model=client.name)
+        return client
+
+    async def generate(self, prompt: str) -> ModelResponse:
+        return await self.route(prompt).generate(prompt)
+
+    async def stream(self, prompt: str) -> AsyncIterator[ModelResponse]:
+        async for chunk in self.route(prompt).stream(prompt):
+            yield chunk
+
+    async def read_image(self, prompt: str, image_data: bytes, mime_type: str = "image/png") -> ModelResponse:
+        return await self.default.read_image(prompt, image_data, mime_type)
+
+    def warm_up(self) -> None:
+        self.default.warm_up()
+        self.large.warm_up()
+
+BACKENDS = ("gemini", "mock", "record", "replay")
+
+def build_model_client() -> ModelClient:
+    """
+    Build the client selected by MODEL_BACKEND
+
+    Raises:
+        ValueError: Unknown backend, or record/replay without MODEL_REPLAY_PATH
+    """
+    settings = get_settings()
+    backend = settings.model_backend.lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"MODEL_BACKEND must be one of {', '.join(BACKENDS)}, not {settings.model_backend!r}")
+
+    if backend == "mock":
+        return MockModelClient(settings.model_mock_latency_ms)
+    if backend == "replay":
+        if not settings.model_replay_path:
+            raise ValueError("MODEL_BACKEND=replay needs MODEL_REPLAY_PATH")
+        return RecordReplayClient(settings.model_replay_path)
+
+    client: ModelClient = GeminiClient(settings.model_name or MODEL_NAME)
+    if settings.model_large_name:
+        client = RoutedModelClient(client, GeminiClient(settings.model_large_name), settings.model_route_tokens)
+    if backend == "record":
+        if not settings.model_replay_path:
+            raise ValueError("MODEL_BACKEND=record needs MODEL_REPLAY_PATH")
+        client = RecordReplayClient(settings.model_replay_path, inner=client)
+    return client
+
+_client: Optional[ModelClient] = None
+_client_lock = threading.Lock()
+
+def get_model_client() -> ModelClient:
+    """Get the process-wide model client, built from settings on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = build_model_client()
+    return _client
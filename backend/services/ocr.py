@@ -0,0 +1,186 @@
+import abc
+import asyncio
+import importlib.util
+import io
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from services.model_client import ModelClient, get_model_client
+from utils.concurrency import get_process_pool
+from utils.metrics import OCR_ESCALATIONS, OCR_SECONDS
+from utils.resilience import get_model_guard
+
+VISION_PROMPT = """
+            Please extract all the text content from this medical report image.
+            Focus on:
+            1. Patient information
+            2. Test results and values
+            3. Medical terminology and diagnoses
+            4. Dates and timestamps
+            5. Doctor/hospital information
+
+            Return the extracted text in a clear, readable format.
+            """
+
+# Tokens reserved per vision call against the tokens/minute limit (image plus transcribed text)
+VISION_ESTIMATED_TOKENS = 1500
+
+@dataclass
+class OCRResult:
+    """Text extracted from an image and how confident the engine is in it"""
+    text: str
+    confidence: float
+    engine: str
+
+class OCREngine(abc.ABC):
+    """Interface for engines that turn report images into text"""
+
+    name = "base"
+
+    @abc.abstractmethod
+    async def extract(self, image_data: bytes, mime_type: str = "image/png") -> OCRResult:
+        """
+        Extract text from an image
+
+        Args:
+            image_data: Encoded image bytes
+            mime_type: MIME type of image_data
+
+        Returns:
+            Extracted text with a 0-1 confidence score
+        """
+        raise NotImplementedError
+
+def _tesseract_ocr(image_data: bytes) -> tuple:
+    """Run Tesseract on an image and return (text, mean word confidence 0-1) (runs in the process pool)"""
+    import pytesseract
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_data))
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+
+    lines: Dict[tuple, list] = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        confidence = float(data["conf"][i])
+        if not word.strip() or confidence < 0:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+        confidences.append(confidence)
+
+    text = "\n".join(" ".join(words) for words in lines.values())
+    mean_confidence = sum(confidences) / len(confidences) / 100 if confidences else 0.0
+    return text, mean_confidence
+
+class TesseractEngine(OCREngine):
+    """Local CPU OCR using Tesseract, run in the shared process pool"""
+
+    name = "tesseract"
+
+    @staticmethod
+    def available() -> bool:
+        """Whether pytesseract is installed (local OCR is optional)"""
+        return importlib.util.find_spec("pytesseract") is not None
+
+    async def extract(self, image_data: bytes, mime_type: str = "image/png") -> OCRResult:
+        loop = asyncio.get_running_loop()
+        text, confidence = await loop.run_in_executor(get_process_pool(), _tesseract_ocr, image_data)
+        return OCRResult(text=text, confidence=confidence, engine=self.name)
+
+class GeminiVisionEngine(OCREngine):
+    """OCR through the vision model of the model client (Gemini Vision unless MODEL_BACKEND says otherwise)"""
+
+    name = "gemini"
+
+    def __init__(self, client: Optional[ModelClient] = None):
+        self._client = client
+
+    @property
+    def client(self) -> ModelClient:
+        return self._client or get_model_client()
+
+    async def extract(self, image_data: bytes, mime_type: str = "image/png") -> OCRResult:
+        client = self.client
+        response = await get_model_guard().call(
+            lambda: client.read_image(VISION_PROMPT, image_data, mime_type),
+            estimated_tokens=VISION_ESTIMATED_TOKENS
+        )
+        return OCRResult(text=response.text, confidence=1.0, engine=self.name)
+
+class OCRPipeline:
+    """
+    Runs a primary OCR engine and escalates to a fallback engine when the
+    primary fails, returns too little text, or is not confident enough.
+    """
+
+    def __init__(self, primary: OCREngine, fallback: Optional[OCREngine] = None,
+                 confidence_threshold: float = 0.8, min_chars: int = 20):
+        self.primary = primary
+        self.fallback = fallback
+        self.confidence_threshold = confidence_threshold
+        self.min_chars = min_chars
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._requests = 0
+        self._escalations = 0
+
+    async def extract(self, image_data: bytes, mime_type: str = "image/png") -> OCRResult:
+        """
+        Extract text from an image, escalating to the fallback engine if needed
+
+        Args:
+            image_data: Encoded image bytes
+            mime_type: MIME type of image_data
+
+        Returns:
+            The accepted OCR result
+        """
+        self._requests += 1
+        try:
+            result = await self._run(self.primary, image_data, mime_type)
+            if self.fallback is None or self._acceptable(result):
+                return result
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            print(f"{self.primary.name} OCR failed, escalating: {str(e)}")
+
+        self._escalations += 1
+        OCR_ESCALATIONS.inc(engine=self.primary.name)
+        return await self._run(self.fallback, image_data, mime_type)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-engine call counts and latency, and the escalation rate"""
+        engines = {}
+        for name, stats in self._stats.items():
+            engines[name] = {
+                "calls": int(stats["calls"]),
+                "errors": int(stats["errors"]),
+                "avg_latency_ms": round(stats["total_seconds"] / stats["calls"] * 1000, 2) if stats["calls"] else 0.0,
+            }
+        return {
+            "primary": self.primary.name,
+            "fallback": self.fallback.name if self.fallback else None,
+            "requests": self._requests,
+            "escalations": self._escalations,
+            "escalation_rate": round(self._escalations / self._requests, 4) if self._requests else 0.0,
+            "engines": engines,
+        }
+
+    def _acceptable(self, result: OCRResult) -> bool:
+        return result.confidence >= self.confidence_threshold and len(result.text.strip()) >= self.min_chars
+
+    async def _run(self, engine: OCREngine, image_data: bytes, mime_type: str) -> OCRResult:
+        stats = self._stats.setdefault(engine.name, {"calls": 0, "errors": 0, "total_seconds": 0.0})
+        started = time.perf_counter()
+        try:
+            return await engine.extract(image_data, mime_type)
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stats["calls"] += 1
+            stats["total_seconds"] += elapsed
+            OCR_SECONDS.observe(elapsed, engine=engine.name)
@@ -0,0 +1,221 @@
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from services.chunking import PAGE_BREAK
+from services.compaction import compact_report
+from services.lab_values import parse_lab_values
+from utils.metrics import CACHE_LOOKUPS, STAGE_SECONDS
+
+# MinHash permutations h(x) = (a * x + b) mod p over 32-bit shingle hashes; p is the Mersenne prime 2^31 - 1,
+# so a * x + b stays below 2^63 and fits in uint64
+_PRIME = (1 << 31) - 1
+
+# Text that changes between exports of the same report without changing its findings
+_DATE = re.compile(
+    r"\b\d{1,4}[-/.]\d{1,2}[-/.]\d{2,4}\b"
+    r"|\b\d{1,2}(?:st|nd|rd|th)?[ -](?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?[ ,-]*\d{2,4}\b"
+    r"|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.? \d{1,2},? \d{2,4}\b",
+    re.IGNORECASE
+)
+_TIME = re.compile(r"\b\d{1,2}:\d{2}(?::\d{2})?(?:\s*[ap]\.?m\.?)?\b", re.IGNORECASE)
+# Sample, barcode and phone numbers: long digit runs and letter-digit codes
+_IDENTIFIER = re.compile(r"\b(?=[A-Za-z]*\d)(?=\d*[A-Za-z])[A-Za-z0-9]{4,}\b|\b\d[\d -]{5,}\d\b")
+_NUMBER = re.compile(r"\d+(?:,\d{3})*(?:\.\d+)?")
+_WORD = re.compile(r"[a-z]+")
+# Reference ranges depend on age and sex, so they must match wherever they appear
+_AGE = re.compile(r"\bage\b\W*(\d{1,3})", re.IGNORECASE)
+_SEX = re.compile(r"\b(?:male|female)\b", re.IGNORECASE)
+# Lines at the top and bottom of each page where letterheads and footers differ between exports
+_EDGE_LINES = 4
+# A decimal, or a number with a unit: a result, not an address or a floor number
+_MEASUREMENT = re.compile(
+    r"\d\.\d|\d\s*(?:%|(?:mg|g|kg|ml|dl|l|cm|mm|mmhg|iu|u|miu|uiu|ng|pg|mmol|umol|meq|cells|lakh|fl|bpm)\b|[a-zµμ]+/[a-zµμ]+)",
+    re.IGNORECASE
+)
+
+_STAT_NAMES = {"hit": "hits", "miss": "misses", "guard_rejected": "guard_rejections", "skipped": "skipped"}
+
+def _normalize(text: str) -> str:
+    """Compacted report text without dates, times and identifiers"""
+    return _IDENTIFIER.sub(" ", _TIME.sub(" ", _DATE.sub(" ", compact_report(text))))
+
+@dataclass
+class ClinicalValues:
+    """
+    The numbers of a report (lab values, ranges, measurements), line by line,
+    with dates, times and identifiers left out
+    """
+    # Age and sex, wherever they appear
+    demographics: Tuple[str, ...]
+    # Line text with its numbers masked -> the numbers of each such line
+    lines: Dict[str, List[Tuple[str, ...]]] = field(default_factory=dict)
+    # Lines in the header/footer zone of a page that do not look like results
+    edge: Set[str] = field(default_factory=set)
+
+    @classmethod
+    def parse(cls, normalized: str) -> "ClinicalValues":
+        demographics = tuple(_AGE.findall(normalized)) + tuple(sex.lower() for sex in _SEX.findall(normalized))
+        values = cls(demographics)
+        for page in normalized.split(PAGE_BREAK):
+            lines = [line for line in page.splitlines() if line.strip()]
+            for index, line in enumerate(lines):
+                numbers = tuple(f"{float(number.replace(',', '')):g}" for number in _NUMBER.findall(line))
+                if not numbers:
+                    continue
+                template = " ".join(_NUMBER.sub("#", line.lower()).split())
+                values.lines.setdefault(template, []).append(numbers)
+                at_edge = index < _EDGE_LINES or index >= len(lines) - _EDGE_LINES
+                if at_edge and not _MEASUREMENT.search(line) and not len(parse_lab_values(line)):
+                    values.edge.add(template)
+        return values
+
+    def matches(self, other: "ClinicalValues") -> bool:
+        """
+        Same age and sex, the same numbers on every line both reports have,
+        and lines with numbers that only one report has are all letterhead
+        or footer lines
+        """
+        if self.demographics != other.demographics:
+            return False
+        for template in self.lines.keys() | other.lines.keys():
+            if template in self.lines and template in other.lines:
+                if self.lines[template] != other.lines[template]:
+                    return False
+            elif template not in self.edge and template not in other.edge:
+                # A result line only one report has (an added or reworded test)
+                return False
+        return True
+
+def clinical_values(text: str) -> ClinicalValues:
+    """Clinical values of report text, for comparing two exports of a report"""
+    return ClinicalValues.parse(_normalize(text))
+
+class SemanticCache:
+    """
+    Near-duplicate cache of analyses, keyed by the extracted report text
+
+    Catches what the content-hash cache misses: the same report re-exported
+    with a new print date, a different header or other layout changes. Each
+    report is sketched as a MinHash signature of its word shingles (numbers,
+    dates and identifiers left out); lookups compare the signature against
+    every cached one in a single NumPy pass. A candidate above the similarity
+    threshold is only returned when its clinical values match (see
+    ClinicalValues.matches), so a report with a changed or added result is
+    always analyzed again.
+
+    Entries are kept in memory, per worker, and the oldest is replaced once
+    max_entries is reached.
+    """
+
+    def __init__(self, threshold: float = 0.85, max_entries: int = 5000, num_perm: int = 128,
+                 shingle_size: int = 3, min_words: int = 30):
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+
+        rng = np.random.default_rng(1)
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+
+        self._signatures = np.zeros((self.max_entries, num_perm), dtype=np.uint32)
+        self._namespaces = np.full(self.max_entries, -1, dtype=np.int32)
+        self._values: List[Optional[Tuple[ClinicalValues, Dict[str, Any]]]] = [None] * self.max_entries
+        self._namespace_ids: Dict[str, int] = {}
+        self._next = 0
+        self._stats = {"hits": 0, "misses": 0, "guard_rejections": 0, "stores": 0, "skipped": 0}
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of the report's word shingles, or None when the text is too short to compare"""
+        return self._signature(_normalize(text))
+
+    def _signature(self, normalized: str) -> Optional[np.ndarray]:
+        words = _WORD.findall(normalized.lower())
+        if len(words) < self.min_words:
+            return None
+        size = self.shingle_size
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        hashes = np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % np.uint64(_PRIME)
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def lookup(self, text: str, namespace: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the analysis of a near-identical report
+
+        Args:
+            text: Report text extracted by FileProcessor
+            namespace: Everything else that affects the analysis (file type, model, prompt version)
+
+        Returns:
+            The stored response payload, or None
+        """
+        with STAGE_SECONDS.time(stage="semantic_cache"):
+            result, value = self._lookup(_normalize(text), namespace)
+        CACHE_LOOKUPS.inc(result=f"semantic_{result}")
+        self._stats[_STAT_NAMES[result]] += 1
+        return value
+
+    def add(self, text: str, namespace: str, value: Dict[str, Any]) -> None:
+        """
+        Store an analysis under the report text
+
+        Args:
+            text: Report text extracted by FileProcessor
+            namespace: Same namespace as used for lookups
+            value: JSON-serialisable response payload
+        """
+        normalized = _normalize(text)
+        signature = self._signature(normalized)
+        if signature is None:
+            return
+        slot = self._next % self.max_entries
+        self._next += 1
+        self._signatures[slot] = signature
+        self._namespaces[slot] = self._namespace_id(namespace)
+        self._values[slot] = (ClinicalValues.parse(normalized), value)
+        self._stats["stores"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit, miss and guard counters"""
+        compared = self._stats["hits"] + self._stats["misses"] + self._stats["guard_rejections"]
+        return {
+            **self._stats,
+            "hit_rate": round(self._stats["hits"] / compared, 4) if compared else 0.0,
+            "entries": min(self._next, self.max_entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+        }
+
+    def _lookup(self, normalized: str, namespace: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        signature = self._signature(normalized)
+        if signature is None:
+            return "skipped", None
+        namespace_id = self._namespace_ids.get(namespace)
+        if namespace_id is None:
+            return "miss", None
+
+        # Share of equal signature positions estimates the Jaccard similarity of the shingle sets
+        count = min(self._next, self.max_entries)
+        agreeing = (self._signatures[:count] == signature).sum(axis=1, dtype=np.int32)
+        agreeing[self._namespaces[:count] != namespace_id] = 0
+        candidates = np.flatnonzero(agreeing >= self.threshold * len(signature))
+        if not len(candidates):
+            return "miss", None
+
+        values = ClinicalValues.parse(normalized)
+        for slot in candidates[np.argsort(-agreeing[candidates])].tolist():
+            stored_values, value = self._values[slot]
+            if stored_values.matches(values):
+                return "hit", value
+        # Same layout, different results
+        return "guard_rejected", None
+
+    def _namespace_id(self, namespace: str) -> int:
+        if namespace not in self._namespace_ids:
+            self._namespace_ids[namespace] = len(self._namespace_ids)
+        return self._namespace_ids[namespace]
@@ -0,0 +1,13 @@
+import os
+import sys
+
+# Settings are read when utils.config is imported: keep every store in memory and the model offline
+os.environ.setdefault("MODEL_BACKEND", "mock")
+os.environ.setdefault("BATCH_DB_PATH", ":memory:")
+os.environ.setdefault("GLOSSARY_DB_PATH", "")
+os.environ.setdefault("HISTORY_ENABLED", "false")
+os.environ.setdefault("ANALYSIS_CACHE_ENABLED", "false")
+os.environ.setdefault("MODEL_REQUESTS_PER_MINUTE", "0")
+os.environ.setdefault("MODEL_TOKENS_PER_MINUTE", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,49 @@
+import io
+import zipfile
+
+import pytest
+
+from services.batch import BatchTooLargeError, expand_zip_archive
+
+def make_zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+def test_expands_supported_files():
+    data = make_zip([("a.pdf", b"%PDF-1"), ("notes.txt", b"x"), ("__MACOSX/a.pdf", b"x"), ("scan.png", b"png")])
+
+    files = expand_zip_archive(data, max_file_bytes=100, max_total_bytes=1000, max_files=10)
+
+    assert files == [("a.pdf", "pdf", b"%PDF-1"), ("scan.png", "image", b"png")]
+
+def test_rejects_member_over_file_limit():
+    # 10 MB of zeros compresses to a few KB
+    data = make_zip([("bomb.pdf", bytes(10 * 1024 * 1024))])
+    assert len(data) < 100 * 1024
+
+    with pytest.raises(BatchTooLargeError):
+        expand_zip_archive(data, max_file_bytes=1024 * 1024, max_total_bytes=100 * 1024 * 1024, max_files=10)
+
+def test_rejects_forged_member_size():
+    data = bytearray(make_zip([("bomb.pdf", bytes(1024 * 1024))]))
+    # Claim a 10-byte member in the central directory; the bounded read still stops at the limit
+    offset = data.rfind(b"PK\x01\x02")
+    data[offset + 24:offset + 28] = (10).to_bytes(4, "little")
+
+    with pytest.raises((BatchTooLargeError, zipfile.BadZipFile)):
+        expand_zip_archive(bytes(data), max_file_bytes=1024, max_total_bytes=1024 * 1024, max_files=10)
+
+def test_rejects_total_over_limit():
+    data = make_zip([(f"report-{i}.pdf", bytes(600)) for i in range(3)])
+
+    with pytest.raises(BatchTooLargeError):
+        expand_zip_archive(data, max_file_bytes=1000, max_total_bytes=1500, max_files=10)
+
+def test_rejects_too_many_files():
+    data = make_zip([(f"report-{i}.pdf", b"%PDF") for i in range(4)])
+
+    with pytest.raises(BatchTooLargeError):
+        expand_zip_archive(data, max_file_bytes=100, max_total_bytes=1000, max_files=3)
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from services import cache
+from services.cache import AnalysisCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache.time, "time", fake.time)
+    return fake
+
+def test_least_recently_used_entry_is_evicted():
+    store = AnalysisCache(max_entries=2)
+
+    async def scenario():
+        await store.set("a", {"summary": "a"})
+        await store.set("b", {"summary": "b"})
+        # Reading "a" makes "b" the least recently used
+        await store.get("a")
+        await store.set("c", {"summary": "c"})
+        return [await store.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(scenario()) == [{"summary": "a"}, None, {"summary": "c"}]
+    assert store.stats()["evictions"] == 1
+
+def test_entries_expire_after_ttl(clock):
+    store = AnalysisCache(ttl_seconds=60)
+
+    async def lookup_at(offset):
+        clock.now += offset
+        return await store.get("report")
+
+    asyncio.run(store.set("report", {"summary": "ok"}))
+
+    assert asyncio.run(lookup_at(59)) == {"summary": "ok"}
+    assert asyncio.run(lookup_at(2)) is None
+    assert store.stats()["memory_entries"] == 0
+
+def test_disk_tier_serves_entries_evicted_from_memory(tmp_path):
+    store = AnalysisCache(max_entries=1, db_path=str(tmp_path / "cache.db"))
+
+    async def scenario():
+        await store.set("a", {"summary": "a"})
+        await store.set("b", {"summary": "b"})
+        return await store.get("a")
+
+    assert asyncio.run(scenario()) == {"summary": "a"}
+    stats = store.stats()
+    assert stats["evictions"] >= 1
+    assert stats["disk_hits"] == 1
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    asyncio.run(AnalysisCache(db_path=path).set("report", {"summary": "ok"}))
+
+    restarted = AnalysisCache(db_path=path)
+
+    assert asyncio.run(restarted.get("report")) == {"summary": "ok"}
+    # Promoted back into memory
+    assert asyncio.run(restarted.get("report")) == {"summary": "ok"}
+    assert restarted.stats()["memory_hits"] == 1
+
+def test_expired_disk_entries_are_not_served(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    asyncio.run(AnalysisCache(ttl_seconds=60, db_path=path).set("report", {"summary": "ok"}))
+    clock.now += 61
+
+    assert asyncio.run(AnalysisCache(ttl_seconds=60, db_path=path).get("report")) is None
@@ -0,0 +1,65 @@
+from services.ai_service import AIService
+from services.chunking import PAGE_BREAK, split_report
+from services.compaction import compact_report, estimate_tokens
+from utils.config import get_settings
+
+def lab_page(number: int, rows: int = 40) -> str:
+    lines = [f"Test {number}-{row} {row + 0.5} mg/dL 1.0-{row + 10}.0" for row in range(rows)]
+    return "\n".join(lines)
+
+def test_whole_pages_are_packed_together():
+    pages = ["Page one findings.", "Page two findings.", "Page three findings."]
+
+    chunks = split_report(PAGE_BREAK.join(pages), max_size=40)
+
+    assert chunks == ["Page one findings.\n\nPage two findings.", "Page three findings."]
+
+def test_oversized_page_splits_on_paragraphs_before_lines():
+    first = "Haematology\nHemoglobin 13.5 g/dL"
+    second = "Biochemistry\nGlucose 90 mg/dL"
+
+    chunks = split_report(f"{first}\n\n{second}", max_size=len(first) + 5)
+
+    assert chunks == [first, second]
+
+def test_oversized_paragraph_splits_on_lines():
+    lines = [f"Row {index} value {index}.0 mg/dL" for index in range(6)]
+    paragraph = "\n".join(lines)
+
+    chunks = split_report(paragraph, max_size=len(lines[0]) * 2 + 1)
+
+    assert all(chunk.count("\n") <= 1 for chunk in chunks)
+    assert "\n".join(chunks) == paragraph
+
+def test_every_chunk_fits_the_prompt_token_budget():
+    budget = get_settings().prompt_token_budget
+    long_line = " ".join(f"word{index}" for index in range(3000))
+    report = PAGE_BREAK.join([lab_page(number) for number in range(12)] + [long_line])
+
+    chunks = AIService()._split(report)
+
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= budget for chunk in chunks)
+
+def test_repeated_headers_and_footers_are_removed():
+    header = "City Diagnostics Laboratory, 12 Main Road"
+    footer = "This is a computer generated report"
+    pages = [
+        f"{header}\nPatient: A. Example\nHemoglobin {13 + number}.0 g/dL 12.0-16.0\nPage {number + 1} of 3\n{footer}"
+        for number in range(3)
+    ]
+
+    compacted = compact_report(PAGE_BREAK.join(pages))
+    compacted_pages = compacted.split(PAGE_BREAK)
+
+    assert compacted.count(header) == 1
+    assert compacted.count("Patient: A. Example") == 1
+    assert footer not in compacted
+    assert "Page 2 of 3" not in compacted
+    assert len(compacted_pages) == 3
+    assert all(f"Hemoglobin {13 + number}.0 g/dL" in page for number, page in enumerate(compacted_pages))
+
+def test_single_page_keeps_its_header():
+    page = "City Diagnostics Laboratory\nHemoglobin 13.0 g/dL 12.0-16.0"
+
+    assert compact_report(page) == page
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from services.coalescing import SingleFlight
+
+def test_followers_share_the_leader_result():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append("run")
+        await asyncio.sleep(0.02)
+        return {"summary": "shared"}
+
+    async def scenario():
+        return await asyncio.gather(*(flight.run("report", work) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+
+    assert calls == ["run"]
+    assert all(result is results[0] for result in results)
+    assert len(flight) == 0
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    calls = []
+
+    async def work(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    async def scenario():
+        return await asyncio.gather(flight.run("a", lambda: work("a")), flight.run("b", lambda: work("b")))
+
+    assert asyncio.run(scenario()) == ["a", "b"]
+    assert sorted(calls) == ["a", "b"]
+
+def test_cancelled_leader_does_not_cancel_shared_work():
+    flight = SingleFlight()
+    finished = []
+
+    async def work():
+        await asyncio.sleep(0.05)
+        finished.append(True)
+        return "done"
+
+    async def scenario():
+        leader = asyncio.create_task(flight.run("report", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.run("report", work))
+        await asyncio.sleep(0.01)
+        # The leader's client disconnects
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == "done"
+    assert finished == [True]
+    assert len(flight) == 0
+
+def test_leader_exception_reaches_followers():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("extraction failed")
+
+    async def scenario():
+        return await asyncio.gather(*(flight.run("report", work) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len({id(result) for result in results}) == 1
+    assert len(flight) == 0
+
+def test_key_is_forgotten_after_failure():
+    flight = SingleFlight()
+    attempts = []
+
+    async def work():
+        attempts.append(True)
+        if len(attempts) == 1:
+            raise ValueError("first attempt fails")
+        return "ok"
+
+    async def scenario():
+        with pytest.raises(ValueError):
+            await flight.run("report", work)
+        return await flight.run("report", work)
+
+    assert asyncio.run(scenario()) == "ok"
+    assert len(attempts) == 2
@@ -0,0 +1,110 @@
+import json
+import os
+
+import pytest
+
+from models import AnalysisResponse
+from services.json_stream import IncrementalJSONParser, model_field_validators, parse_json_object
+
+# The model answers used by benchmarks/parse_benchmark.py
+CORPUS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "benchmarks", "data", "model_responses.jsonl"
+)
+VALIDATORS = model_field_validators(AnalysisResponse, exclude=("success", "error_message", "lab_results"))
+ANALYSIS_FIELDS = ["summary", "key_findings", "lifestyle_recommendations", "precautions", "confidence_score"]
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        return {entry["name"]: entry for entry in map(json.loads, filter(str.strip, f))}
+
+CORPUS = load_corpus()
+
+def parse(name):
+    entry = CORPUS[name]
+    return parse_json_object(entry["text"], VALIDATORS if entry["kind"] == "analysis" else None)
+
+@pytest.mark.parametrize("name", [
+    "analysis_fenced",
+    "analysis_prose_before",
+    "analysis_prose_after",
+    "analysis_stray_brace_before",
+    "analysis_trailing_commas",
+    "analysis_string_score",
+])
+def test_wrapped_or_sloppy_answers_parse_like_the_plain_answer(name):
+    result = parse(name)
+
+    assert result.complete
+    assert result.errors == []
+    assert result.value == parse("analysis_plain").value
+
+def test_raw_newline_inside_a_string_is_kept():
+    result = parse("analysis_raw_newline_in_string")
+
+    assert result.complete
+    assert "elevated\nand HbA1c" in result.value["summary"]
+
+def test_single_string_becomes_a_list():
+    value = parse("analysis_single_string_list").value
+
+    assert isinstance(value["precautions"], list) and len(value["precautions"]) == 1
+
+def test_string_score_is_coerced_to_a_number():
+    assert parse("analysis_string_score").value["confidence_score"] == pytest.approx(0.86)
+
+@pytest.mark.parametrize("name, repaired_key, recovered", [
+    ("analysis_truncated_summary", "summary", ["summary"]),
+    ("analysis_truncated_findings", "key_findings", ["summary", "key_findings"]),
+    ("analysis_truncated_precautions", "precautions",
+     ["summary", "key_findings", "lifestyle_recommendations", "precautions"]),
+])
+def test_truncated_answers_keep_what_arrived(name, repaired_key, recovered):
+    result = parse(name)
+
+    assert not result.complete
+    assert result.repaired_key == repaired_key
+    assert list(result.value) == recovered
+
+def test_answer_without_json_gives_no_value():
+    result = parse("analysis_not_json")
+
+    assert result.value is None
+    assert not result.complete
+
+@pytest.mark.parametrize("name", ["terms_plain", "terms_fenced", "terms_prose_after"])
+def test_terms_answers(name):
+    value = parse(name).value
+
+    assert list(value) == ["LDL", "HbA1c", "eGFR"]
+    assert all(isinstance(explanation, str) and explanation for explanation in value.values())
+
+def test_truncated_terms_mark_the_cut_off_term():
+    result = parse("terms_truncated")
+
+    assert result.repaired_key == "eGFR"
+    assert result.value["LDL"] == parse("terms_plain").value["LDL"]
+
+def test_every_truncation_of_an_answer_parses():
+    text = CORPUS["analysis_plain"]["text"]
+    recovered_before = 0
+
+    for cut in range(len(text) + 1):
+        value = parse_json_object(text[:cut], VALIDATORS).value or {}
+        for name, member in value.items():
+            assert VALIDATORS[name](member) == member
+        # Members already recovered are not lost as more of the answer arrives
+        recovered = sum(name in value for name in ANALYSIS_FIELDS)
+        assert recovered >= recovered_before - 1
+        recovered_before = max(recovered_before, recovered)
+
+    assert recovered_before == len(ANALYSIS_FIELDS)
+
+def test_streamed_pieces_parse_like_the_whole_answer():
+    text = CORPUS["analysis_prose_before"]["text"]
+    parser = IncrementalJSONParser(VALIDATORS)
+
+    for start in range(0, len(text), 7):
+        parser.feed(text[start:start + 7])
+
+    assert parser.result().value == parse("analysis_prose_before").value
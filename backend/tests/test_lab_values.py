@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from services.ai_service import AIService
+from services.lab_values import parse_lab_values
+
+# (report line, expected (test, value, unit, low, high, status) rows)
+CORPUS = [
+    ("Hemoglobin 13.5 g/dL 12.0-16.0", [("Hemoglobin", 13.5, "g/dL", 12.0, 16.0, "normal")]),
+    ("Hemoglobin: 13.5 g/dL (12.0 - 16.0)", [("Hemoglobin", 13.5, "g/dL", 12.0, 16.0, "normal")]),
+    ("WBC 7.1 10^3/uL [4.0-11.0]", [("WBC", 7.1, "10^3/uL", 4.0, 11.0, "normal")]),
+    ("Glucose 180 mg/dL 70 to 99", [("Glucose", 180.0, "mg/dL", 70.0, 99.0, "high")]),
+    ("Platelet Count 250,000 /uL 150,000-450,000",
+     [("Platelet Count", 250000.0, "/uL", 150000.0, 450000.0, "normal")]),
+    ("LDL Cholesterol 141 mg/dL <100", [("LDL Cholesterol", 141.0, "mg/dL", None, 100.0, "high")]),
+    ("HDL 38 mg/dL >40", [("HDL", 38.0, "mg/dL", 40.0, None, "low")]),
+    ("Triglycerides 120 mg/dL Up to 150", [("Triglycerides", 120.0, "mg/dL", None, 150.0, "normal")]),
+    # Flags before the unit, after the range, or instead of a range
+    ("Vitamin D 18 L ng/mL 30-100", [("Vitamin D", 18.0, "ng/mL", 30.0, 100.0, "low")]),
+    ("TSH 6.2 uIU/mL 0.4-4.0 H", [("TSH", 6.2, "uIU/mL", 0.4, 4.0, "high")]),
+    ("Creatinine 1.4 H mg/dL", [("Creatinine", 1.4, "mg/dL", None, None, "high")]),
+    ("Ferritin 9 ng/mL LOW", [("Ferritin", 9.0, "ng/mL", None, None, "low")]),
+    # The computed status wins over a printed flag that disagrees with the range
+    ("Calcium 9.5 mg/dL 8.5-10.5 H", [("Calcium", 9.5, "mg/dL", 8.5, 10.5, "normal")]),
+    # A table whose line breaks were lost in extraction
+    ("Sodium 140 mmol/L 135-145 Potassium 5.9 mmol/L 3.5-5.1 Chloride 101 mmol/L 98-107", [
+        ("Sodium", 140.0, "mmol/L", 135.0, 145.0, "normal"),
+        ("Potassium", 5.9, "mmol/L", 3.5, 5.1, "high"),
+        ("Chloride", 101.0, "mmol/L", 98.0, 107.0, "normal"),
+    ]),
+    ("Test Result Unit Reference Range Hemoglobin 13.5 g/dL 12.0-16.0",
+     [("Hemoglobin", 13.5, "g/dL", 12.0, 16.0, "normal")]),
+    # Numbers without a range or flag are not lab rows
+    ("Patient Age 45 years Male", []),
+    ("Report Date 12 March 2024", []),
+]
+
+ALL_NORMAL_REPORT = """
+Complete Blood Count
+Hemoglobin 14.1 g/dL 13.0-17.0
+WBC 6.4 10^3/uL 4.0-11.0
+Platelet Count 250,000 /uL 150,000-450,000
+"""
+
+@pytest.mark.parametrize("line, expected", CORPUS)
+def test_lab_row_formats(line, expected):
+    rows = [
+        (row["test"], row["value"], row["unit"], row["low"], row["high"], row["status"])
+        for row in parse_lab_values(line).records()
+    ]
+
+    assert rows == expected
+
+def test_non_row_text_is_kept_as_other_text():
+    table = parse_lab_values("Test Result Unit Reference Range Hemoglobin 13.5 g/dL 12.0-16.0")
+
+    assert table.other_text == "Test Result Unit Reference Range"
+
+def test_prompt_lists_out_of_range_rows_with_their_range():
+    table = parse_lab_values("Sodium 140 mmol/L 135-145\nPotassium 5.9 mmol/L 3.5-5.1")
+
+    assert table.to_prompt() == (
+        "Out of range (value, reference range):\n"
+        "- Potassium 5.9 mmol/L (3.5-5.1) HIGH\n"
+        "Within range: Sodium 140 mmol/L"
+    )
+
+def test_all_normal_table():
+    table = parse_lab_values(ALL_NORMAL_REPORT)
+
+    assert len(table) == 3
+    assert table.all_normal()
+    assert not parse_lab_values("Glucose 180 mg/dL 70-99").all_normal()
+    assert not parse_lab_values("No lab rows here").all_normal()
+
+def test_all_normal_report_skips_model_findings():
+    service = AIService()
+    labs = service._parse_labs(ALL_NORMAL_REPORT)
+
+    assert service._is_all_normal(labs)
+    assert '"key_findings"' not in service._create_analysis_prompt(ALL_NORMAL_REPORT, "pdf", labs)
+
+    analysis = asyncio.run(service.analyze_medical_report(ALL_NORMAL_REPORT, "pdf"))
+
+    assert analysis["key_findings"] == labs.normal_findings()
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from services import model_client
+from services.ai_service import AIService
+from services.model_client import MockModelClient, ModelClient, ModelResponse
+
+NON_JSON_ANSWER = "Sorry, I cannot help with that."
+
+class NonJSONModelClient(MockModelClient):
+    """Mock model that answers every prompt with prose instead of JSON"""
+
+    @staticmethod
+    def _answer(prompt: str) -> str:
+        return NON_JSON_ANSWER
+
+@pytest.fixture
+def non_json_client(monkeypatch):
+    client = NonJSONModelClient()
+    monkeypatch.setattr(model_client, "_client", client)
+    return client
+
+def test_unparseable_answer_gets_fallback_response():
+    analysis = AIService()._parse_analysis_response(NON_JSON_ANSWER)
+
+    assert NON_JSON_ANSWER in analysis["summary"]
+    assert analysis["key_findings"] == ["Analysis completed but response format was unexpected"]
+
+def test_non_json_answer_through_mock_backend(non_json_client):
+    analysis = asyncio.run(AIService().analyze_medical_report("Hemoglobin 10.1 g/dL 13-17 L", "pdf"))
+
+    assert NON_JSON_ANSWER in analysis["summary"]
+    assert analysis["confidence_score"] == 0.5
+
+def test_non_json_answer_through_mock_stream(non_json_client):
+    async def collect():
+        return [event async for event in AIService().stream_medical_report("Hemoglobin 10.1 g/dL 13-17 L", "pdf")]
+
+    events = dict(asyncio.run(collect()))
+
+    assert NON_JSON_ANSWER in events["analysis"]["summary"]
+
+def test_mock_answers_are_deterministic():
+    client = MockModelClient()
+    prompt = "Out of range (value, reference range):\n- LDL 141 mg/dL (0-100) HIGH\n"
+
+    first, second = asyncio.run(client.generate(prompt)), asyncio.run(client.generate(prompt))
+
+    assert first == second
+    assert "LDL 141 mg/dL is above its reference range (0-100)" in first.text
+
+def test_incomplete_backend_cannot_be_built():
+    class TextOnlyClient(ModelClient):
+        async def generate(self, prompt: str) -> ModelResponse:
+            return ModelResponse("")
+
+    with pytest.raises(TypeError):
+        TextOnlyClient()
@@ -0,0 +1,16 @@
+import asyncio
+
+from utils.rate_limit import AsyncTokenBucket, SharedTokenBucket
+
+def test_acquire_returns_tokens_left(tmp_path):
+    shared = SharedTokenBucket(str(tmp_path / "limits.db"), "model_requests", rate_per_minute=60, capacity=10)
+    local = AsyncTokenBucket(rate_per_minute=60, capacity=10)
+
+    for bucket in (shared, local):
+        left = asyncio.run(bucket.acquire(4))
+        assert 5.9 < left <= 6.1
+
+def test_disabled_bucket_has_unlimited_tokens(tmp_path):
+    bucket = SharedTokenBucket(str(tmp_path / "limits.db"), "model_tokens", rate_per_minute=0)
+
+    assert asyncio.run(bucket.acquire(1000)) == float("inf")
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from services import model_client
+from services.model_client import MockModelClient
+from utils import resilience
+from utils.resilience import CircuitBreaker, ModelCallGuard, UpstreamUnavailableError
+
+class UpstreamError(Exception):
+    """Error carrying an HTTP status, like the google.api_core exceptions"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"upstream answered {status_code}")
+        self.status_code = status_code
+
+class FailingCalls:
+    """Model call that fails with the given errors before succeeding"""
+
+    def __init__(self, *errors: BaseException):
+        self.errors = list(errors)
+        self.attempts = 0
+
+    async def __call__(self) -> str:
+        self.attempts += 1
+        if self.errors:
+            error = self.errors.pop(0)
+            if isinstance(error, asyncio.TimeoutError):
+                # Outlive the attempt timeout instead of raising directly
+                await asyncio.sleep(1)
+            raise error
+        return "ok"
+
+def make_guard(failure_threshold: int = 5, recovery_seconds: float = 30.0, max_attempts: int = 3) -> ModelCallGuard:
+    return ModelCallGuard(
+        CircuitBreaker("test", failure_threshold=failure_threshold, recovery_seconds=recovery_seconds),
+        max_attempts=max_attempts,
+        backoff_base_seconds=0.001,
+        backoff_max_seconds=0.002,
+        attempt_timeout_seconds=0.05
+    )
+
+def test_backoff_stays_within_jitter_bounds():
+    guard = ModelCallGuard(CircuitBreaker("test"), backoff_base_seconds=0.5, backoff_max_seconds=8.0)
+
+    for attempt in range(8):
+        delays = [guard.backoff(attempt) for _ in range(200)]
+        assert all(0 <= delay <= min(8.0, 0.5 * 2 ** attempt) for delay in delays)
+
+@pytest.mark.parametrize("error", [UpstreamError(429), UpstreamError(503), asyncio.TimeoutError()])
+def test_transient_failures_are_retried(error):
+    guard = make_guard()
+    operation = FailingCalls(error, error)
+
+    assert asyncio.run(guard.call(operation)) == "ok"
+    assert operation.attempts == 3
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+def test_retries_stop_at_max_attempts():
+    guard = make_guard(max_attempts=3)
+    operation = FailingCalls(*[UpstreamError(500) for _ in range(5)])
+
+    with pytest.raises(UpstreamUnavailableError) as raised:
+        asyncio.run(guard.call(operation))
+
+    assert operation.attempts == 3
+    assert raised.value.retry_after >= 1.0
+
+def test_client_errors_are_not_retried():
+    guard = make_guard()
+    operation = FailingCalls(UpstreamError(400))
+
+    with pytest.raises(UpstreamError):
+        asyncio.run(guard.call(operation))
+
+    assert operation.attempts == 1
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+def test_breaker_counts_a_retried_call_once():
+    guard = make_guard(failure_threshold=2, max_attempts=3)
+
+    with pytest.raises(UpstreamUnavailableError):
+        asyncio.run(guard.call(FailingCalls(*[UpstreamError(503) for _ in range(3)])))
+    # Three failed attempts, but only one failed call
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+    with pytest.raises(UpstreamUnavailableError):
+        asyncio.run(guard.call(FailingCalls(*[UpstreamError(503) for _ in range(3)])))
+    assert guard.breaker.state == CircuitBreaker.OPEN
+
+def test_open_circuit_rejects_without_calling_upstream():
+    guard = make_guard(failure_threshold=1, recovery_seconds=30.0, max_attempts=1)
+    with pytest.raises(UpstreamUnavailableError):
+        asyncio.run(guard.call(FailingCalls(UpstreamError(429))))
+
+    operation = FailingCalls()
+    with pytest.raises(UpstreamUnavailableError) as raised:
+        asyncio.run(guard.call(operation))
+
+    assert operation.attempts == 0
+    assert 0 < raised.value.retry_after <= 30.0
+
+def test_half_open_probe_success_closes_the_circuit():
+    guard = make_guard(failure_threshold=1, recovery_seconds=0.0, max_attempts=1)
+    with pytest.raises(UpstreamUnavailableError):
+        asyncio.run(guard.call(FailingCalls(UpstreamError(503))))
+    assert guard.breaker.state == CircuitBreaker.OPEN
+
+    # The recovery period is over: the next call is the half-open probe
+    guard.breaker.before_call()
+    assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(UpstreamUnavailableError):
+        # Only one probe at a time
+        guard.breaker.before_call()
+    guard.breaker.record_success()
+
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+    assert asyncio.run(guard.call(FailingCalls())) == "ok"
+
+def test_half_open_probe_failure_reopens_the_circuit():
+    guard = make_guard(failure_threshold=1, recovery_seconds=0.0, max_attempts=1)
+    with pytest.raises(UpstreamUnavailableError):
+        asyncio.run(guard.call(FailingCalls(UpstreamError(503))))
+
+    with pytest.raises(UpstreamUnavailableError):
+        asyncio.run(guard.call(FailingCalls(asyncio.TimeoutError())))
+
+    assert guard.breaker.state == CircuitBreaker.OPEN
+
+class ThrottledModelClient(MockModelClient):
+    """Mock model that answers every prompt with 429 Too Many Requests"""
+
+    async def generate(self, prompt):
+        raise UpstreamError(429)
+
+    async def stream(self, prompt):
+        raise UpstreamError(429)
+        yield
+
+def test_throttled_upstream_answers_503_with_retry_after(monkeypatch):
+    monkeypatch.setattr(model_client, "_client", ThrottledModelClient())
+    monkeypatch.setattr(resilience, "_guard", make_guard(failure_threshold=1, recovery_seconds=30.0, max_attempts=2))
+
+    async def extract(data, file_type):
+        return "Hemoglobin 10.1 g/dL 13-17 L\nWBC 7.1 10^3/uL 4.0-11.0\nGlucose 180 mg/dL 70-99 H"
+
+    monkeypatch.setattr(main, "_extract_content", extract)
+
+    response = TestClient(main.app).post(
+        "/analyze/pdf", files={"file": ("report.pdf", b"%PDF-1.4 throttled", "application/pdf")}
+    )
+
+    assert response.status_code == 503
+    assert 1 <= int(response.headers["Retry-After"]) <= 30
@@ -0,0 +1,37 @@
+import asyncio
+
+import main
+
+REPORT_TEXT = (
+    "Hemoglobin 13.5 g/dL 12.0-16.0\n"
+    "WBC 7.1 10^3/uL 4.0-11.0\n"
+    "Glucose 180 mg/dL 70-99 H\n"
+)
+
+def test_request_during_stream_shares_the_stream_result(monkeypatch):
+    extractions = []
+
+    async def slow_extract(data, file_type):
+        extractions.append(file_type)
+        await asyncio.sleep(0.05)
+        return REPORT_TEXT
+
+    monkeypatch.setattr(main, "_extract_content", slow_extract)
+
+    async def scenario():
+        progress = asyncio.Queue()
+        task, leader = main.in_flight_analyses.start(
+            "stream-key", lambda: main._run_streamed_analysis([b"report"], "pdf", None, progress.put_nowait)
+        )
+        follower = asyncio.create_task(main._run_coalesced("stream-key", [b"report"], "pdf"))
+        events = [event async for event in main._stream_progress(task, progress, "pdf")]
+        return leader, events, await follower
+
+    leader, events, shared = asyncio.run(scenario())
+
+    assert leader
+    assert events[0].startswith("event: extracted")
+    assert events[-1].startswith("event: complete")
+    assert shared.summary
+    assert extractions == ["pdf"]
+    assert len(main.in_flight_analyses) == 0
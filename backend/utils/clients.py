@@ -0,0 +1,119 @@
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from utils.config import get_settings
+from utils.metrics import STAGE_SECONDS
+
+# Model used for analysis and vision OCR; part of the analysis cache key
+MODEL_NAME = "gemini-2.0-flash-exp"
+
+class ClientRegistry:
+    """
+    Process-wide Gemini clients, built on first use and shared by every service
+
+    ``genai.configure`` resets the SDK's cached gRPC clients, so it is called
+    exactly once here; every ``GenerativeModel`` then shares the same channel.
+    Chat models are cached per (model, temperature) so their HTTP/gRPC clients
+    are reused across requests too. google.generativeai and langchain are only
+    imported when the first client is requested, which keeps app import fast.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configured = False
+        self._models: Dict[str, Any] = {}
+        self._chat_models: Dict[Tuple[str, float], Any] = {}
+
+    def generative_model(self, name: str = MODEL_NAME) -> Any:
+        """
+        Get the shared google.generativeai GenerativeModel for a model name
+
+        Args:
+            name: Gemini model name
+
+        Returns:
+            GenerativeModel instance
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            if name not in self._models:
+                with STAGE_SECONDS.time(stage="client_init"):
+                    import google.generativeai as genai
+                    self._configure(genai)
+                    self._models[name] = genai.GenerativeModel(name)
+            return self._models[name]
+
+    def chat_model(self, name: str = MODEL_NAME, temperature: float = 0.1) -> Any:
+        """
+        Get the shared langchain ChatGoogleGenerativeAI for a model and temperature
+
+        Args:
+            name: Gemini model name
+            temperature: Sampling temperature
+
+        Returns:
+            ChatGoogleGenerativeAI instance
+        """
+        key = (name, temperature)
+        llm = self._chat_models.get(key)
+        if llm is not None:
+            return llm
+
+        with self._lock:
+            if key not in self._chat_models:
+                with STAGE_SECONDS.time(stage="client_init"):
+                    from langchain_google_genai import ChatGoogleGenerativeAI
+                    self._chat_models[key] = ChatGoogleGenerativeAI(
+                        model=name,
+                        google_api_key=get_settings().google_api_key,
+                        temperature=temperature
+                    )
+            return self._chat_models[key]
+
+    def warm_up(self) -> None:
+        """Build the default clients now instead of on the first request"""
+        self.generative_model()
+        self.chat_model()
+
+    def override(self, model: Optional[Any] = None, chat: Optional[Any] = None, name: str = MODEL_NAME) -> None:
+        """
+        Replace the clients handed out for a model name (benchmarks and local runs)
+
+        Args:
+            model: Object used in place of the GenerativeModel
+            chat: Object used in place of the ChatGoogleGenerativeAI at temperature 0.1
+            name: Model name the replacements are registered under
+        """
+        with self._lock:
+            if model is not None:
+                self._models[name] = model
+            if chat is not None:
+                self._chat_models[(name, 0.1)] = chat
+
+    def _configure(self, genai: Any) -> None:
+        if not self._configured:
+            genai.configure(api_key=get_settings().google_api_key)
+            self._configured = True
+
+_registry = ClientRegistry()
+
+def get_clients() -> ClientRegistry:
+    """Get the process-wide client registry"""
+    return _registry
+
+def preload_modules() -> None:
+    """
+    Import the client libraries without building any clients
+
+    Used by the production server before it forks its workers, so the
+    libraries are loaded once and shared copy-on-write. No gRPC channel is
+    opened here; each worker builds its own clients after the fork.
+    """
+    import google.generativeai  # noqa: F401
+    import langchain_google_genai  # noqa: F401
+    import PyPDF2  # noqa: F401
+    import PIL.Image  # noqa: F401
+
@@ -0,0 +1,58 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from utils.config import get_settings
+from utils.metrics import IN_FLIGHT, STAGE_SECONDS
+
+_model_semaphore: Optional[asyncio.Semaphore] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+@asynccontextmanager
+async def model_call_slot() -> AsyncIterator[None]:
+    """
+    Hold one of the per-worker slots that cap in-flight model calls
+
+    Every Gemini call (text or vision) should run inside
+    ``async with model_call_slot():`` so a burst of requests queues here
+    instead of opening an unbounded number of upstream connections.
+    The slot count is MODEL_MAX_CONCURRENCY.
+    """
+    global _model_semaphore
+    if _model_semaphore is None:
+        _model_semaphore = asyncio.Semaphore(max(1, get_settings().model_max_concurrency))
+
+    with STAGE_SECONDS.time(stage="model_slot_wait"):
+        await _model_semaphore.acquire()
+    try:
+        with IN_FLIGHT.track_inprogress(kind="model_call"):
+            yield
+    finally:
+        _model_semaphore.release()
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Get the shared process pool for CPU-bound work such as PDF parsing
+
+    The pool is created on first use so importing the app stays cheap, and
+    so each forked server worker gets its own pool.
+
+    Returns:
+        Process pool sized by PROCESS_POOL_WORKERS (when 0, the CPUs are split
+        evenly between SERVER_WORKERS server processes)
+    """
+    global _process_pool
+    if _process_pool is None:
+        settings = get_settings()
+        workers = settings.process_pool_workers or max(1, (os.cpu_count() or 1) // max(1, settings.server_workers))
+        _process_pool = ProcessPoolExecutor(max_workers=workers)
+    return _process_pool
+
+def shutdown_process_pool() -> None:
+    """Shut down the shared process pool if it was started"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
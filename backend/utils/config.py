@@ -1,6 +1,7 @@
 import os
 from dotenv import load_dotenv
 from dataclasses import dataclass
+from functools import lru_cache
 
 load_dotenv()
 
@@ -12,8 +13,140 @@ class Settings:
     backend_port: int = int(os.getenv("BACKEND_PORT", "8000"))
     frontend_port: int = int(os.getenv("FRONTEND_PORT", "8501"))
 
+    # Upload limits; request bodies over the limit are rejected before they are read
+    max_upload_mb: float = float(os.getenv("MAX_UPLOAD_MB", "10"))
+    max_batch_request_mb: float = float(os.getenv("MAX_BATCH_REQUEST_MB", "500"))
+
+    # Analysis result cache
+    analysis_cache_enabled: bool = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() == "true"
+    analysis_cache_max_entries: int = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "512"))
+    analysis_cache_ttl_seconds: int = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", "86400"))
+    analysis_cache_db_path: str = os.getenv("ANALYSIS_CACHE_DB_PATH", "")
+    # Near-duplicate cache on the extracted text (in memory, per worker). Off by default: a hit
+    # returns the analysis of another upload whose text differs only in letterhead, dates and IDs
+    semantic_cache_enabled: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    semantic_cache_threshold: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))
+    semantic_cache_max_entries: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+
+    # LLM analysis: "parallel" runs the summary and terms prompts concurrently,
+    # "merged" asks for both in a single JSON response
+    analysis_mode: str = os.getenv("ANALYSIS_MODE", "parallel")
+    analysis_timeout_seconds: float = float(os.getenv("ANALYSIS_TIMEOUT_SECONDS", "60"))
+    terms_timeout_seconds: float = float(os.getenv("TERMS_TIMEOUT_SECONDS", "30"))
+
+    # Report text is compacted (page numbers, repeated headers/footers and boilerplate removed)
+    # before prompts are built; reports over the per-call budget of estimated tokens are split
+    # into chunks analyzed concurrently and merged
+    prompt_compaction_enabled: bool = os.getenv("PROMPT_COMPACTION_ENABLED", "true").lower() == "true"
+    prompt_token_budget: int = int(os.getenv("PROMPT_TOKEN_BUDGET", "2500"))
+    chunk_parallelism: int = int(os.getenv("CHUNK_PARALLELISM", "4"))
+
+    # Lab rows (test, value, unit, range) are parsed locally and sent to the model as a table;
+    # reports with every value in range and little other text skip the key-findings work
+    lab_parser_enabled: bool = os.getenv("LAB_PARSER_ENABLED", "true").lower() == "true"
+    lab_min_rows: int = int(os.getenv("LAB_MIN_ROWS", "3"))
+    lab_normal_max_other_chars: int = int(os.getenv("LAB_NORMAL_MAX_OTHER_CHARS", "400"))
+
+    # Local glossary of medical terms; only terms it does not know are sent to the model,
+    # and the model's explanations are added to it (empty seed path = bundled glossary)
+    glossary_enabled: bool = os.getenv("GLOSSARY_ENABLED", "true").lower() == "true"
+    glossary_seed_path: str = os.getenv("GLOSSARY_SEED_PATH", "")
+    glossary_db_path: str = os.getenv("GLOSSARY_DB_PATH", "glossary.db")
+
+    # Build the Gemini clients in a background thread once the app has started, so
+    # neither startup nor the first request waits for them
+    warm_clients_on_startup: bool = os.getenv("WARM_CLIENTS_ON_STARTUP", "true").lower() == "true"
+
+    # Model backend: "gemini", "mock" (deterministic answers, no network), "record" (gemini, with every
+    # answer saved to MODEL_REPLAY_PATH) or "replay" (answers from MODEL_REPLAY_PATH only)
+    model_backend: str = os.getenv("MODEL_BACKEND", "gemini")
+    model_replay_path: str = os.getenv("MODEL_REPLAY_PATH", "")
+    model_mock_latency_ms: float = float(os.getenv("MODEL_MOCK_LATENCY_MS", "0"))
+    # Gemini model (empty = gemini-2.0-flash-exp); text prompts of at least MODEL_ROUTE_TOKENS
+    # estimated tokens go to MODEL_LARGE_NAME when it is set
+    model_name: str = os.getenv("MODEL_NAME", "")
+    model_large_name: str = os.getenv("MODEL_LARGE_NAME", "")
+    model_route_tokens: int = int(os.getenv("MODEL_ROUTE_TOKENS", "2000"))
+
+    # Client-side limits on Gemini calls, shared by all server workers (0 disables)
+    model_requests_per_minute: float = float(os.getenv("MODEL_REQUESTS_PER_MINUTE", "1000"))
+    model_tokens_per_minute: float = float(os.getenv("MODEL_TOKENS_PER_MINUTE", "1000000"))
+
+    # Transient model failures (429/5xx/timeouts) are retried with jittered exponential backoff
+    model_max_attempts: int = int(os.getenv("MODEL_MAX_ATTEMPTS", "4"))
+    model_backoff_base_seconds: float = float(os.getenv("MODEL_BACKOFF_BASE_SECONDS", "0.5"))
+    model_backoff_max_seconds: float = float(os.getenv("MODEL_BACKOFF_MAX_SECONDS", "8"))
+    model_attempt_timeout_seconds: float = float(os.getenv("MODEL_ATTEMPT_TIMEOUT_SECONDS", "45"))
+
+    # After this many consecutive failed model calls, fail fast with 503 for the recovery period;
+    # a call counts once, after its MODEL_MAX_ATTEMPTS attempts have all failed
+    circuit_failure_threshold: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    circuit_recovery_seconds: float = float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "30"))
+
+    # Maximum number of in-flight model calls per worker process
+    model_max_concurrency: int = int(os.getenv("MODEL_MAX_CONCURRENCY", "16"))
+
+    # Process pool used for CPU-bound extraction work (0 = one process per CPU)
+    process_pool_workers: int = int(os.getenv("PROCESS_POOL_WORKERS", "0"))
+    pdf_pages_per_task: int = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+    # PDF pages with less text than this are treated as scanned: rendered at PDF_RENDER_DPI
+    # (pypdfium2, or the page's embedded image without it) and sent to image OCR
+    pdf_ocr_enabled: bool = os.getenv("PDF_OCR_ENABLED", "true").lower() == "true"
+    pdf_text_min_chars: int = int(os.getenv("PDF_TEXT_MIN_CHARS", "50"))
+    pdf_render_dpi: int = int(os.getenv("PDF_RENDER_DPI", "200"))
+
+    # Image OCR: "gemini" uses Gemini Vision only, "tesseract" tries local OCR first
+    # and escalates to Gemini Vision below the confidence threshold
+    ocr_engine: str = os.getenv("OCR_ENGINE", "gemini")
+    ocr_confidence_threshold: float = float(os.getenv("OCR_CONFIDENCE_THRESHOLD", "0.8"))
+    ocr_min_chars: int = int(os.getenv("OCR_MIN_CHARS", "20"))
+
+    # Image pre-processing before OCR
+    image_preprocess_enabled: bool = os.getenv("IMAGE_PREPROCESS_ENABLED", "true").lower() == "true"
+    image_max_dimension: int = int(os.getenv("IMAGE_MAX_DIMENSION", "2048"))
+    image_grayscale: bool = os.getenv("IMAGE_GRAYSCALE", "true").lower() == "true"
+    image_jpeg_quality: int = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+    # Image reports may be several files and/or multi-page TIFFs; pages are sent to OCR
+    # concurrently, at most IMAGE_PAGE_CONCURRENCY at a time per report
+    image_max_files: int = int(os.getenv("IMAGE_MAX_FILES", "10"))
+    image_max_pages: int = int(os.getenv("IMAGE_MAX_PAGES", "30"))
+    image_page_concurrency: int = int(os.getenv("IMAGE_PAGE_CONCURRENCY", "8"))
+
+    # Analysis history per patient (uploads with a patient_id); writes are batched. Off by default:
+    # /history/{patient_id} has no authentication, so anyone with a patient id could read it
+    history_enabled: bool = os.getenv("HISTORY_ENABLED", "false").lower() == "true"
+    history_db_path: str = os.getenv("HISTORY_DB_PATH", "history.db")
+    history_batch_size: int = int(os.getenv("HISTORY_BATCH_SIZE", "500"))
+    history_flush_seconds: float = float(os.getenv("HISTORY_FLUSH_SECONDS", "1"))
+
+    # Prometheus-style metrics on /metrics; when disabled, instrumentation is a no-op
+    metrics_enabled: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+    # Batch analysis queue; the rate limit is shared by all server workers
+    batch_db_path: str = os.getenv("BATCH_DB_PATH", "batch_jobs.db")
+    batch_concurrency: int = int(os.getenv("BATCH_CONCURRENCY", "4"))
+    batch_rate_limit_per_minute: float = float(os.getenv("BATCH_RATE_LIMIT_PER_MINUTE", "60"))
+    batch_max_files: int = int(os.getenv("BATCH_MAX_FILES", "5000"))
+    # Items held longer than this by a worker are assumed abandoned and picked up again
+    batch_lease_seconds: float = float(os.getenv("BATCH_LEASE_SECONDS", "900"))
+    # On shutdown, in-progress batch items get this long to finish before being requeued
+    batch_drain_seconds: float = float(os.getenv("BATCH_DRAIN_SECONDS", "20"))
+    # Finished jobs (and their results) are deleted this long after their last item finished; 0 keeps them
+    batch_retention_seconds: float = float(os.getenv("BATCH_RETENTION_SECONDS", "604800"))
+
+    # Production server (run_backend.py --production). Each server worker is a
+    # separate process; the process pool is split between them.
+    server_workers: int = int(os.getenv("SERVER_WORKERS", "1"))
+    server_preload: bool = os.getenv("SERVER_PRELOAD", "true").lower() == "true"
+    # Recycle a worker after this many requests (plus random jitter) to bound memory growth; 0 disables
+    server_max_requests: int = int(os.getenv("SERVER_MAX_REQUESTS", "1000"))
+    server_max_requests_jitter: int = int(os.getenv("SERVER_MAX_REQUESTS_JITTER", "100"))
+    # Seconds a stopping worker gets to finish in-flight requests and drain batch items
+    server_graceful_timeout: float = float(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30"))
+
+@lru_cache(maxsize=None)
 def get_settings() -> Settings:
-    """Get application settings"""
+    """Get application settings (resolved once per process)"""
     return Settings()
 
 def validate_settings():
@@ -0,0 +1,287 @@
+import abc
+import contextlib
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.config import get_settings
+
+# Metrics are recorded only when enabled; otherwise every call returns immediately
+_enabled = get_settings().metrics_enabled
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow model calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class _Metric(abc.ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    @abc.abstractmethod
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not _enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in self._values.items()]
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        if not _enabled:
+            return
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if not _enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def track_inprogress(self, **labels: str):
+        """Context manager that counts the enclosed block as in progress"""
+        if not _enabled:
+            return _NULL_CONTEXT
+        return _InProgress(self, labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in self._values.items()]
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not _enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += value
+
+    def time(self, **labels: str):
+        """Context manager that observes the duration of the enclosed block in seconds"""
+        if not _enabled:
+            return _NULL_CONTEXT
+        return _Timer(self, labels)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(bound)))} {cumulative}")
+                cumulative += counts[-1]
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total[0])}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+class _InProgress:
+    def __init__(self, gauge: Gauge, labels: Dict[str, str]):
+        self.gauge = gauge
+        self.labels = labels
+
+    def __enter__(self):
+        self.gauge.inc(**self.labels)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.gauge.dec(**self.labels)
+        return False
+
+REGISTRY: List[_Metric] = []
+
+def enabled() -> bool:
+    """Whether metrics are being recorded"""
+    return _enabled
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# Pipeline metrics shared by the API and services
+STAGE_SECONDS = Histogram(
+    "medical_analyzer_stage_seconds",
+    "Time spent in each pipeline stage"
+)
+REQUEST_SECONDS = Histogram(
+    "medical_analyzer_request_seconds",
+    "End-to-end analysis request latency by endpoint"
+)
+IN_FLIGHT = Gauge(
+    "medical_analyzer_in_flight",
+    "Work currently in progress (requests, model calls)"
+)
+FALLBACKS = Counter(
+    "medical_analyzer_fallbacks_total",
+    "Fallback paths taken (unparseable model output, direct model call)"
+)
+MODEL_TOKENS = Counter(
+    "medical_analyzer_model_tokens_total",
+    "Model tokens used, by direction"
+)
+CACHE_LOOKUPS = Counter(
+    "medical_analyzer_cache_lookups_total",
+    "Analysis cache lookups by result"
+)
+OCR_SECONDS = Histogram(
+    "medical_analyzer_ocr_seconds",
+    "OCR latency by engine"
+)
+OCR_ESCALATIONS = Counter(
+    "medical_analyzer_ocr_escalations_total",
+    "Images escalated from the primary OCR engine to the fallback"
+)
+STARTUP_SECONDS = Gauge(
+    "medical_analyzer_startup_seconds",
+    "Startup cost by phase (app import, client warm-up, first analysis request)"
+)
+MODEL_RETRIES = Counter(
+    "medical_analyzer_model_retries_total",
+    "Model calls retried after a transient upstream failure, by error type"
+)
+CIRCUIT_STATE = Gauge(
+    "medical_analyzer_circuit_state",
+    "Upstream circuit breaker state (0 closed, 1 half-open, 2 open)"
+)
+CIRCUIT_EVENTS = Counter(
+    "medical_analyzer_circuit_events_total",
+    "Circuit breaker transitions and calls rejected while open"
+)
+RATE_LIMIT_AVAILABLE = Gauge(
+    "medical_analyzer_rate_limit_available",
+    "Tokens left in the shared model rate-limit buckets after the last acquire"
+)
+COALESCED_REQUESTS = Counter(
+    "medical_analyzer_coalesced_requests_total",
+    "Analyses by single-flight role (leader ran the work, follower shared it)"
+)
+GLOSSARY_TERMS = Counter(
+    "medical_analyzer_glossary_terms_total",
+    "Complex terms explained, by source (local glossary or model)"
+)
+LAB_REPORTS = Counter(
+    "medical_analyzer_lab_reports_total",
+    "Reports by lab parsing result (structured table, all values normal, or raw text)"
+)
+MODEL_OUTPUT_PARSES = Counter(
+    "medical_analyzer_model_output_parses_total",
+    "Model answers parsed, by prompt kind and result (complete, repaired from partial output, failed)"
+)
+TOKENS_SAVED = Histogram(
+    "medical_analyzer_prompt_tokens_saved",
+    "Estimated prompt tokens saved per request, by stage (compaction, lab table, glossary)",
+    buckets=(0, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+)
+PDF_PAGES = Counter(
+    "medical_analyzer_pdf_pages_total",
+    "PDF pages by route (text layer read locally, scanned page sent to OCR, or no text found)"
+)
+PDF_PAGE_SECONDS = Histogram(
+    "medical_analyzer_pdf_page_seconds",
+    "Time to get the text of one PDF page, by route"
+)
+HISTORY_WRITES = Counter(
+    "medical_analyzer_history_writes_total",
+    "Rows written to the analysis history store, by table"
+)
+MODEL_ROUTES = Counter(
+    "medical_analyzer_model_routes_total",
+    "Text prompts by the model they were routed to"
+)
+MODEL_REPLAYS = Counter(
+    "medical_analyzer_model_replays_total",
+    "Record/replay backend lookups by result (hit served from disk, miss)"
+)
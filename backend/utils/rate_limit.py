@@ -0,0 +1,132 @@
+import asyncio
+import sqlite3
+import time
+from typing import Optional, Tuple
+
+from utils.sqlite import ProcessLocalConnection
+
+class AsyncTokenBucket:
+    """
+    Token bucket rate limiter for asyncio code
+
+    Tokens refill continuously at ``rate_per_minute``; callers wait in
+    FIFO order until enough tokens are available.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        # Default burst allowance is one second's worth of tokens
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate_per_second)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """A non-positive rate disables limiting"""
+        return self.rate_per_second > 0
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Wait until the requested number of tokens is available and take them
+
+        Args:
+            tokens: Number of tokens to take (capped at the bucket capacity)
+
+        Returns:
+            Tokens left in the bucket after the take (infinite when disabled)
+        """
+        if not self.enabled:
+            return float("inf")
+
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return self._tokens
+                await asyncio.sleep((tokens - self._tokens) / self.rate_per_second)
+
+    def available(self) -> float:
+        """Tokens currently available"""
+        if not self.enabled:
+            return float("inf")
+        self._refill()
+        return self._tokens
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+class SharedTokenBucket(AsyncTokenBucket):
+    """
+    Token bucket whose state lives in SQLite, shared by every server worker
+
+    An in-process bucket per worker would let N workers together exceed the
+    configured rate N times over. Here each take is a short IMMEDIATE
+    transaction on a row keyed by ``name``, so all processes using the same
+    database file draw from one bucket. Waiters within a process are still
+    served in FIFO order.
+    """
+
+    def __init__(self, db_path: str, name: str, rate_per_minute: float, capacity: Optional[float] = None):
+        super().__init__(rate_per_minute, capacity)
+        self.name = name
+        self._connection = ProcessLocalConnection(db_path, setup=self._create_schema, isolation_level=None)
+
+    @staticmethod
+    def _create_schema(db: sqlite3.Connection) -> None:
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        if not self.enabled:
+            return float("inf")
+
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                wait, available = await asyncio.to_thread(self._try_take, tokens)
+                if wait <= 0:
+                    return available
+                await asyncio.sleep(wait)
+
+    def available(self) -> float:
+        if not self.enabled:
+            return float("inf")
+        row = self._connection.get().execute(
+            "SELECT tokens, updated_at FROM rate_limits WHERE name = ?", (self.name,)
+        ).fetchone()
+        if row is None:
+            return self.capacity
+        return min(self.capacity, row[0] + (time.time() - row[1]) * self.rate_per_second)
+
+    def _try_take(self, tokens: float) -> Tuple[float, float]:
+        """Take tokens if available; return (0, or the seconds to wait before retrying; tokens left)"""
+        db = self._connection.get()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = db.execute("SELECT tokens, updated_at FROM rate_limits WHERE name = ?", (self.name,)).fetchone()
+            available = self.capacity if row is None else min(
+                self.capacity, row[0] + max(0.0, now - row[1]) * self.rate_per_second
+            )
+            if available >= tokens:
+                available -= tokens
+                wait = 0.0
+            else:
+                wait = (tokens - available) / self.rate_per_second
+            db.execute(
+                "INSERT OR REPLACE INTO rate_limits (name, tokens, updated_at) VALUES (?, ?, ?)",
+                (self.name, available, now),
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return wait, available
+
@@ -0,0 +1,271 @@
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+from utils.concurrency import model_call_slot
+from utils.config import get_settings
+from utils.metrics import CIRCUIT_EVENTS, CIRCUIT_STATE, MODEL_RETRIES, RATE_LIMIT_AVAILABLE, STAGE_SECONDS
+from utils.rate_limit import AsyncTokenBucket, SharedTokenBucket
+
+T = TypeVar("T")
+
+# HTTP statuses and gRPC status names that mean "try again later"
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_GRPC_CODES = {"RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL", "ABORTED"}
+
+class UpstreamUnavailableError(Exception):
+    """The model API is throttling or failing; the caller should retry after retry_after seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Check whether a model call failed for a transient upstream reason
+
+    Covers timeouts and connection errors, google.api_core errors (which carry
+    the HTTP status as ``code``), gRPC errors (``code()`` returns a status
+    enum) and anything else exposing ``status_code``.
+    """
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+
+    code = getattr(error, "code", None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            code = None
+    if isinstance(code, int) and code in RETRYABLE_STATUS_CODES:
+        return True
+    if getattr(code, "name", None) in RETRYABLE_GRPC_CODES:
+        return True
+
+    status_code = getattr(error, "status_code", None)
+    if isinstance(status_code, int) and status_code in RETRYABLE_STATUS_CODES:
+        return True
+
+    cause = error.__cause__
+    return cause is not None and cause is not error and is_retryable(cause)
+
+class CircuitBreaker:
+    """
+    Fail fast while the upstream is unhealthy
+
+    After failure_threshold consecutive failed calls the circuit opens and
+    calls are rejected for recovery_seconds. A call retried by ModelCallGuard
+    counts once, when its last attempt fails. Then a single probe call is
+    let through (half-open): success closes the circuit, failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+    # Gauge values for each state
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_seconds = recovery_seconds
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(0, name=name)
+
+    def before_call(self) -> None:
+        """
+        Admit a call or reject it
+
+        Raises:
+            UpstreamUnavailableError: The circuit is open, or a probe is already in flight
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                remaining = self._opened_at + self.recovery_seconds - time.monotonic()
+                if remaining > 0:
+                    CIRCUIT_EVENTS.inc(name=self.name, event="rejected")
+                    raise UpstreamUnavailableError(f"{self.name} is unavailable (circuit open)", remaining)
+                self._set_state(self.HALF_OPEN)
+
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    CIRCUIT_EVENTS.inc(name=self.name, event="rejected")
+                    raise UpstreamUnavailableError(f"{self.name} is recovering (probe in flight)", 1.0)
+                self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                CIRCUIT_EVENTS.inc(name=self.name, event="closed")
+                self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.OPEN:
+                # Calls admitted before the circuit opened are still finishing
+                return
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                CIRCUIT_EVENTS.inc(name=self.name, event="opened")
+                self._set_state(self.OPEN)
+
+    def record_neutral(self) -> None:
+        """The call ended without telling us anything about upstream health (cancelled, bad input)"""
+        with self._lock:
+            self._probing = False
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit lets calls through again (0 when closed)"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.recovery_seconds - time.monotonic())
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        CIRCUIT_STATE.set(self._STATE_VALUES[state], name=self.name)
+
+class ModelCallGuard:
+    """
+    Admission control for every Gemini call
+
+    Each attempt passes the circuit breaker, takes a request token and an
+    estimated number of model tokens from the (cross-worker) rate limiters,
+    and then holds a model call slot. Transient upstream failures are retried
+    with full-jitter exponential backoff, and only the last failed attempt of
+    a call counts towards opening the circuit; once retries are exhausted or the
+    circuit opens, UpstreamUnavailableError is raised so the API can answer
+    503 with Retry-After instead of piling more load on the upstream.
+    """
+
+    def __init__(self, breaker: CircuitBreaker, request_limiter: Optional[AsyncTokenBucket] = None,
+                 token_limiter: Optional[AsyncTokenBucket] = None, max_attempts: int = 4,
+                 backoff_base_seconds: float = 0.5, backoff_max_seconds: float = 8.0,
+                 attempt_timeout_seconds: Optional[float] = None):
+        self.breaker = breaker
+        self.request_limiter = request_limiter
+        self.token_limiter = token_limiter
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.attempt_timeout_seconds = attempt_timeout_seconds
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number attempt + 1"""
+        return random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt))
+
+    async def call(self, operation: Callable[[], Awaitable[T]], estimated_tokens: int = 0) -> T:
+        """
+        Run a model call with rate limiting, retries and the circuit breaker
+
+        Args:
+            operation: Zero-argument coroutine factory making one model call
+            estimated_tokens: Prompt plus expected output tokens, for the tokens/minute limit
+
+        Returns:
+            The operation's result
+
+        Raises:
+            UpstreamUnavailableError: The upstream stayed unhealthy
+        """
+        for attempt in range(self.max_attempts):
+            try:
+                async with self._attempt(estimated_tokens, final=attempt + 1 >= self.max_attempts):
+                    if self.attempt_timeout_seconds:
+                        return await asyncio.wait_for(operation(), timeout=self.attempt_timeout_seconds)
+                    return await operation()
+            except UpstreamUnavailableError:
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                delay = self.backoff(attempt)
+                if attempt + 1 >= self.max_attempts:
+                    raise UpstreamUnavailableError(
+                        f"Model API unavailable after {self.max_attempts} attempts: {str(e)}",
+                        max(delay, self.breaker.retry_after(), 1.0)
+                    ) from e
+                MODEL_RETRIES.inc(reason=type(e).__name__)
+                print(f"Model call failed ({type(e).__name__}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def attempt(self, estimated_tokens: int = 0) -> AsyncIterator[None]:
+        """
+        Admit a single model call attempt (no retries), for calls that cannot be replayed
+        such as streams that have already yielded output
+
+        Args:
+            estimated_tokens: Prompt plus expected output tokens, for the tokens/minute limit
+
+        Raises:
+            UpstreamUnavailableError: The circuit is open
+        """
+        async with self._attempt(estimated_tokens, final=True):
+            yield
+
+    @asynccontextmanager
+    async def _attempt(self, estimated_tokens: int, final: bool) -> AsyncIterator[None]:
+        """One attempt; a transient failure counts against the circuit only if no retry follows"""
+        self.breaker.before_call()
+        try:
+            with STAGE_SECONDS.time(stage="rate_limit_wait"):
+                await self._acquire(self.request_limiter, 1, "requests")
+                await self._acquire(self.token_limiter, estimated_tokens, "tokens")
+            async with model_call_slot():
+                yield
+        except BaseException as e:
+            if final and isinstance(e, Exception) and is_retryable(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_neutral()
+            raise
+        self.breaker.record_success()
+
+    async def _acquire(self, limiter: Optional[AsyncTokenBucket], tokens: float, name: str) -> None:
+        if limiter is None or not limiter.enabled or tokens <= 0:
+            return
+        # The shared bucket reports what is left from its own transaction, so no extra query runs on the event loop
+        RATE_LIMIT_AVAILABLE.set(await limiter.acquire(tokens), limiter=name)
+
+_guard: Optional[ModelCallGuard] = None
+
+def get_model_guard() -> ModelCallGuard:
+    """
+    Get the process-wide guard for Gemini calls, built from settings on first use
+
+    The rate-limit buckets live in BATCH_DB_PATH, so all server workers share
+    one requests/minute and one tokens/minute budget.
+    """
+    global _guard
+    if _guard is None:
+        settings = get_settings()
+        _guard = ModelCallGuard(
+            CircuitBreaker(
+                "gemini",
+                failure_threshold=settings.circuit_failure_threshold,
+                recovery_seconds=settings.circuit_recovery_seconds
+            ),
+            request_limiter=SharedTokenBucket(
+                settings.batch_db_path, "model_requests", settings.model_requests_per_minute
+            ),
+            token_limiter=SharedTokenBucket(
+                settings.batch_db_path, "model_tokens", settings.model_tokens_per_minute
+            ),
+            max_attempts=settings.model_max_attempts,
+            backoff_base_seconds=settings.model_backoff_base_seconds,
+            backoff_max_seconds=settings.model_backoff_max_seconds,
+            attempt_timeout_seconds=settings.model_attempt_timeout_seconds or None
+        )
+    return _guard
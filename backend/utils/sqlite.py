@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import threading
+from typing import Callable, List, Optional
+
+# How long a writer waits for another process's transaction before failing
+BUSY_TIMEOUT_SECONDS = 30.0
+
+def is_busy_error(error: BaseException) -> bool:
+    """Check whether a SQLite error means another connection held the lock past the busy timeout"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+class ProcessLocalConnection:
+    """
+    SQLite connection opened lazily and reopened in every process
+
+    SQLite connections must not be used across fork(). When the app is
+    preloaded and forked into several server workers, each worker opens its
+    own connection to the same database file on first use; WAL mode and a
+    busy timeout let the workers share it safely.
+    """
+
+    def __init__(self, db_path: str, setup: Optional[Callable[[sqlite3.Connection], None]] = None,
+                 isolation_level: Optional[str] = ""):
+        self.db_path = db_path
+        self._setup = setup
+        self._isolation_level = isolation_level
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        # Connections inherited from a parent process are kept open, never closed:
+        # closing them in the child would drop the child's own POSIX file locks
+        self._inherited: List[sqlite3.Connection] = []
+
+    def get(self) -> sqlite3.Connection:
+        """Get this process's connection, opening it (and creating the schema) if needed"""
+        pid = os.getpid()
+        if self._connection is not None and self._pid == pid:
+            return self._connection
+
+        with self._lock:
+            if self._connection is None or self._pid != pid:
+                if self._connection is not None:
+                    self._inherited.append(self._connection)
+                connection = sqlite3.connect(
+                    self.db_path,
+                    timeout=BUSY_TIMEOUT_SECONDS,
+                    check_same_thread=False,
+                    isolation_level=self._isolation_level,
+                )
+                if self.db_path != ":memory:":
+                    connection.execute("PRAGMA journal_mode=WAL")
+                if self._setup is not None:
+                    self._setup(connection)
+                self._connection = connection
+                self._pid = pid
+            return self._connection
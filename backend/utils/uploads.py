@@ -0,0 +1,51 @@
+import hashlib
+from dataclasses import dataclass
+
+from fastapi import HTTPException, UploadFile
+
+# Size of the chunks read from an upload while scanning it
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+@dataclass
+class UploadInfo:
+    """Size and content hash of an upload, computed in one pass"""
+    size: int
+    sha256: str
+
+async def scan_upload(file: UploadFile, max_bytes: int, chunk_size: int = UPLOAD_CHUNK_SIZE) -> UploadInfo:
+    """
+    Check an upload's size and hash it in fixed-size chunks
+
+    The multipart parser has already spooled the upload to a temporary file
+    (memory for small files, disk for large ones). This walks that file one
+    chunk at a time, so the whole upload is never held in memory. Oversized
+    uploads are rejected as soon as the running size passes the limit.
+
+    Args:
+        file: Uploaded file
+        max_bytes: Maximum accepted size in bytes
+        chunk_size: Bytes read per step
+
+    Returns:
+        Size and SHA-256 of the upload (the file is rewound afterwards)
+
+    Raises:
+        HTTPException: 413 if the upload is larger than max_bytes
+    """
+    max_mb = max_bytes / (1024 * 1024)
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {max_mb:g} MB limit")
+
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"File exceeds the {max_mb:g} MB limit")
+        digest.update(chunk)
+
+    await file.seek(0)
+    return UploadInfo(size=size, sha256=digest.hexdigest())
@@ -0,0 +1,146 @@
+"""
+Synthetic lab report corpus for benchmarks
+
+Reports are generated from a fixed seed so runs are comparable. PDFs are
+written directly (one Helvetica text layer per page) so no PDF library is
+needed; images are rendered with Pillow.
+"""
+
+import io
+import random
+from typing import List, Tuple
+
+# (test name, unit, low, high)
+LAB_TESTS = [
+    ("Hemoglobin", "g/dL", 13.5, 17.5),
+    ("WBC Count", "10^3/uL", 4.0, 11.0),
+    ("Platelet Count", "10^3/uL", 150, 450),
+    ("Fasting Glucose", "mg/dL", 70, 99),
+    ("HbA1c", "%", 4.0, 5.6),
+    ("Total Cholesterol", "mg/dL", 125, 200),
+    ("LDL Cholesterol", "mg/dL", 0, 100),
+    ("HDL Cholesterol", "mg/dL", 40, 60),
+    ("Triglycerides", "mg/dL", 0, 150),
+    ("Creatinine", "mg/dL", 0.7, 1.3),
+    ("eGFR", "mL/min/1.73m2", 90, 120),
+    ("ALT", "U/L", 7, 56),
+    ("AST", "U/L", 10, 40),
+    ("TSH", "mIU/L", 0.4, 4.0),
+    ("Vitamin D", "ng/mL", 30, 100),
+    ("Sodium", "mmol/L", 135, 145),
+    ("Potassium", "mmol/L", 3.5, 5.1),
+]
+
+def report_lines(rng: random.Random, page: int, pages: int, rows: int = 30) -> List[str]:
+    """Lines of one synthetic lab report page"""
+    lines = [
+        "City Hospital Laboratory Services",
+        f"Patient: Test Patient {rng.randint(1000, 9999)}    Collected: 2026-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+        "Test                 Result    Unit            Reference   Flag",
+    ]
+    for _ in range(rows):
+        name, unit, low, high = rng.choice(LAB_TESTS)
+        span = high - low
+        value = round(rng.uniform(low - span * 0.3, high + span * 0.3), 1)
+        flag = "H" if value > high else "L" if value < low else ""
+        lines.append(f"{name:<20} {value:<9} {unit:<15} {low}-{high}   {flag}")
+    lines.append("This report is intended for the ordering physician.")
+    lines.append(f"Page {page} of {pages}")
+    return lines
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """
+    Write a minimal PDF with one text layer per page
+
+    Args:
+        pages: Lines of text for each page
+
+    Returns:
+        PDF file bytes
+    """
+    page_count = len(pages)
+    font_id = 3
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        font_id: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    for index, lines in enumerate(pages):
+        page_id = 4 + index * 2
+        content_id = page_id + 1
+        kids.append(f"{page_id} 0 R")
+        stream = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        stream_bytes = stream.encode("latin-1")
+        objects[page_id] = (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode("latin-1")
+        objects[content_id] = b"<< /Length %d >>\nstream\n" % len(stream_bytes) + stream_bytes + b"\nendstream"
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {page_count} >>".encode("latin-1")
+
+    output = io.BytesIO()
+    output.write(b"%PDF-1.4\n")
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = output.tell()
+        output.write(b"%d 0 obj\n" % object_id + objects[object_id] + b"\nendobj\n")
+
+    xref_offset = output.tell()
+    size = max(objects) + 1
+    output.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+    for object_id in range(1, size):
+        output.write(b"%010d 00000 n \n" % offsets[object_id])
+    output.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_offset))
+    return output.getvalue()
+
+def make_image(lines: List[str], width: int = 1700, height: int = 2200, fmt: str = "JPEG") -> bytes:
+    """
+    Render report lines onto a page-sized image
+
+    Args:
+        lines: Text lines to draw
+        width: Image width in pixels
+        height: Image height in pixels
+        fmt: Pillow output format
+
+    Returns:
+        Encoded image bytes
+    """
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    y = 60
+    for line in lines:
+        draw.text((60, y), line, fill="black")
+        y += 24
+    output = io.BytesIO()
+    image.save(output, format=fmt, quality=92)
+    return output.getvalue()
+
+def build_corpus(size: int, pdf_pages: int = 4, seed: int = 1234, image_ratio: float = 0.5) -> List[Tuple[str, str, bytes]]:
+    """
+    Build a reproducible mix of PDF and image reports
+
+    Args:
+        size: Number of reports
+        pdf_pages: Pages per PDF report
+        seed: Random seed
+        image_ratio: Fraction of reports that are images
+
+    Returns:
+        (filename, file_type, data) for each report
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(size):
+        if rng.random() < image_ratio:
+            data = make_image(report_lines(rng, 1, 1))
+            corpus.append((f"report_{index}.jpg", "image", data))
+        else:
+            pages = [report_lines(rng, page, pdf_pages) for page in range(1, pdf_pages + 1)]
+            corpus.append((f"report_{index}.pdf", "pdf", make_pdf(pages)))
+    return corpus
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Measure analysis history write throughput and trend lookup latency
+
+Fills a fresh history database with synthetic patients (each with several
+reports of a panel of lab tests) through the batched writer, then times
+trend lookups for random patients, for all tests and for a single test.
+
+Usage:
+    python benchmarks/history_benchmark.py --patients 20000 --output history.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from services.history import AnalysisHistory  # noqa: E402
+
+TESTS = [
+    ("Hemoglobin", "g/dL", 13.0, 17.0), ("WBC", "10^3/uL", 4.0, 11.0), ("Platelets", "10^3/uL", 150, 450),
+    ("Glucose", "mg/dL", 70, 100), ("HbA1c", "%", 4.0, 5.6), ("Creatinine", "mg/dL", 0.7, 1.3),
+    ("ALT", "U/L", 7, 56), ("AST", "U/L", 10, 40), ("TSH", "mIU/L", 0.4, 4.0), ("LDL", "mg/dL", 0, 100),
+]
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=20000, help="Synthetic patients")
+    parser.add_argument("--reports", type=int, default=5, help="Reports per patient")
+    parser.add_argument("--lookups", type=int, default=1000, help="Timed trend lookups")
+    parser.add_argument("--batch-size", type=int, default=500, help="History write batch size")
+    parser.add_argument("--db", help="Database path (default: a temporary file)")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    return parser.parse_args()
+
+def synthetic_analysis(rng: random.Random) -> Dict[str, Any]:
+    lab_results = []
+    for test, unit, low, high in TESTS:
+        value = round(rng.uniform(low * 0.7, high * 1.3), 2)
+        status = "low" if value < low else "high" if value > high else "normal"
+        lab_results.append({"test": test, "value": value, "unit": unit, "low": low, "high": high, "status": status})
+    return {
+        "success": True, "summary": "Synthetic report", "key_findings": [], "lifestyle_recommendations": [],
+        "precautions": [], "confidence_score": 0.9, "complex_terms": {}, "lab_results": lab_results,
+    }
+
+def percentile(timings: List[float], share: float) -> float:
+    return round(timings[min(len(timings) - 1, int(len(timings) * share))], 3)
+
+async def run(args: argparse.Namespace, db_path: str) -> Dict[str, Any]:
+    rng = random.Random(0)
+    history = AnalysisHistory(db_path, batch_size=args.batch_size, flush_seconds=3600)
+
+    # Flushed here rather than by the background writer, so the timing covers exactly the writes
+    started = time.perf_counter()
+    recorded = 0
+    for patient in range(args.patients):
+        for report in range(args.reports):
+            history.record(f"patient-{patient}", f"report-{report}", f"2024-{report % 12 + 1:02d}-01T00:00:00",
+                           "pdf", synthetic_analysis(rng))
+            recorded += 1
+            if recorded % args.batch_size == 0:
+                await history.flush()
+    await history.flush()
+    write_seconds = time.perf_counter() - started
+    reports = args.patients * args.reports
+
+    results: Dict[str, Any] = {
+        "reports": reports,
+        "lab_rows": reports * len(TESTS),
+        "write_seconds": round(write_seconds, 2),
+        "reports_per_second": round(reports / write_seconds),
+    }
+    for name, tests in (("all_tests", None), ("one_test", ["glucose"])):
+        timings = []
+        for _ in range(args.lookups):
+            patient = f"patient-{rng.randrange(args.patients)}"
+            lookup_started = time.perf_counter()
+            await history.trends(patient, tests)
+            timings.append((time.perf_counter() - lookup_started) * 1000)
+        timings.sort()
+        results[f"trends_{name}_p50_ms"] = percentile(timings, 0.5)
+        results[f"trends_{name}_p95_ms"] = percentile(timings, 0.95)
+    await history.stop()
+    return results
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        results = asyncio.run(run(args, args.db or os.path.join(directory, "history.db")))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Measure how reliably and how fast model answers are parsed
+
+Runs a corpus of model responses through the tolerant JSON parser and,
+for comparison, through the old approach (slice from the first "{" to the
+last "}" and json.loads it). Every complete response is also cut off at
+several points to simulate truncated answers. For each parser the report
+gives the share of responses that produced a usable object, the share of
+expected fields recovered, and the parse time.
+
+The corpus is JSON Lines with "name", "kind" ("analysis" or "terms") and
+"text" fields; benchmarks/data/model_responses.jsonl covers the usual
+failure modes, and recorded responses in the same format can be passed
+with --corpus.
+
+Usage:
+    python benchmarks/parse_benchmark.py --output parse.json
+    python benchmarks/parse_benchmark.py --corpus recorded.jsonl --output after.json --compare parse.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from models import AnalysisResponse  # noqa: E402
+from services.json_stream import model_field_validators, parse_json_object  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(ROOT, "benchmarks", "data", "model_responses.jsonl")
+ANALYSIS_FIELDS = ["summary", "key_findings", "lifestyle_recommendations", "precautions", "confidence_score"]
+VALIDATORS = model_field_validators(AnalysisResponse, exclude=("success", "error_message", "lab_results"))
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSON Lines file of model responses")
+    parser.add_argument("--truncations", type=int, default=8, help="Truncated copies made of each complete response")
+    parser.add_argument("--repeat", type=int, default=200, help="Timing repetitions per response")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Print the change against an earlier results file")
+    return parser.parse_args()
+
+def load_corpus(path: str, truncations: int) -> List[Dict[str, str]]:
+    """Corpus entries plus truncated copies of every response that is valid JSON"""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entries.append(json.loads(line))
+
+    truncated = []
+    for entry in entries:
+        text = entry["text"]
+        if legacy_parse(text) is None or len(text) < 40:
+            continue
+        for step in range(1, truncations + 1):
+            cut = len(text) * step // (truncations + 1)
+            truncated.append({"name": f"{entry['name']}@{cut}", "kind": entry["kind"], "text": text[:cut]})
+    return entries + truncated
+
+def legacy_parse(text: str) -> Optional[Dict[str, Any]]:
+    """The previous parsing: first "{" to last "}", all or nothing"""
+    start, end = text.find("{"), text.rfind("}") + 1
+    if start == -1 or end == 0:
+        return None
+    try:
+        value = json.loads(text[start:end])
+    except json.JSONDecodeError:
+        return None
+    return value if isinstance(value, dict) else None
+
+def tolerant_parse(text: str, kind: str) -> Optional[Dict[str, Any]]:
+    result = parse_json_object(text, VALIDATORS if kind == "analysis" else None)
+    if result.value is None:
+        return None
+    if kind == "terms":
+        return {k: v for k, v in result.value.items() if isinstance(v, str) and k != result.repaired_key}
+    return result.value
+
+def field_score(value: Optional[Dict[str, Any]], kind: str) -> float:
+    """Share of the expected fields present with a usable type"""
+    if not value:
+        return 0.0
+    if kind == "terms":
+        return 1.0
+    usable = 0
+    for name in ANALYSIS_FIELDS:
+        try:
+            VALIDATORS[name](value[name])
+            usable += 1
+        except (KeyError, ValueError):
+            pass
+    return usable / len(ANALYSIS_FIELDS)
+
+def measure(entries: List[Dict[str, str]], parse: Callable[[str, str], Any], repeat: int) -> Dict[str, Any]:
+    parsed, scores, timings = 0, [], []
+    for entry in entries:
+        value = parse(entry["text"], entry["kind"])
+        if entry["kind"] == "analysis":
+            usable = bool(value) and any(name in value for name in ANALYSIS_FIELDS)
+        else:
+            usable = value is not None
+        parsed += usable
+        scores.append(field_score(value, entry["kind"]) if usable else 0.0)
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            parse(entry["text"], entry["kind"])
+        timings.append((time.perf_counter() - started) / repeat * 1e6)
+
+    timings.sort()
+    return {
+        "responses": len(entries),
+        "parse_success_rate": round(parsed / len(entries), 4),
+        "fields_recovered": round(statistics.mean(scores), 4),
+        "p50_us": round(timings[len(timings) // 2], 1),
+        "p95_us": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 1),
+    }
+
+def print_comparison(results: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    for parser, metrics in results["parsers"].items():
+        before = baseline.get("parsers", {}).get(parser)
+        if not before:
+            continue
+        for name, value in metrics.items():
+            if name in before and before[name]:
+                change = (value - before[name]) / before[name] * 100
+                print(f"{parser:9} {name:20} {before[name]:>10} -> {value:>10} ({change:+.1f}%)")
+
+def main() -> None:
+    args = parse_args()
+    entries = load_corpus(args.corpus, args.truncations)
+    results = {
+        "corpus": args.corpus,
+        "parsers": {
+            "legacy": measure(entries, lambda text, kind: legacy_parse(text), args.repeat),
+            "tolerant": measure(entries, tolerant_parse, args.repeat),
+        },
+    }
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Load-test the Medical Report Analyzer API against stubbed Gemini models
+
+Drives /analyze/pdf and /analyze/image in-process (httpx ASGI transport)
+with a synthetic corpus at a fixed concurrency, and writes latency
+percentiles, throughput and peak RSS to a JSON file that can be compared
+between runs.
+
+By default the Gemini SDK clients are replaced by stubs with latency and
+fault injection. --model-backend mock uses the app's own mock model client
+instead (--latency-ms per call), and --model-backend replay serves answers
+recorded with MODEL_BACKEND=record from --replay-path.
+
+Usage:
+    python benchmarks/run_benchmark.py --requests 200 --concurrency 16
+    python benchmarks/run_benchmark.py --output after.json --compare before.json
+    python benchmarks/run_benchmark.py --model-backend replay --replay-path recordings.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from typing import Any, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from benchmarks.corpus import build_corpus
+from benchmarks.stubs import StubConfig, install_stubs
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100, help="Total requests to send")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+    parser.add_argument("--corpus-size", type=int, default=20, help="Distinct synthetic reports")
+    parser.add_argument("--pdf-pages", type=int, default=4, help="Pages per synthetic PDF")
+    parser.add_argument("--image-ratio", type=float, default=0.5, help="Fraction of image reports")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="Stub text model latency")
+    parser.add_argument("--vision-latency-ms", type=float, default=1500.0, help="Stub vision model latency")
+    parser.add_argument("--jitter-ms", type=float, default=200.0, help="Uniform latency jitter")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of stub calls that fail with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of stub calls that fail with 429")
+    parser.add_argument("--model-backend", choices=("stub", "mock", "replay"), default="stub",
+                        help="Stubbed Gemini SDK clients, the mock model client, or recorded answers")
+    parser.add_argument("--replay-path", help="Recorded answers for --model-backend replay")
+    parser.add_argument("--cache", action="store_true", help="Keep the analysis cache enabled")
+    parser.add_argument("--seed", type=int, default=1234, help="Corpus and stub random seed")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write results")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    return parser.parse_args()
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def peak_rss_mb() -> Dict[str, float]:
+    """Peak resident set size of this process and its (pool) children"""
+    scale = 1024 * 1024 if platform.system() == "Darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"self": round(own / scale, 1), "children_max": round(children / scale, 1)}
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0,
+    }
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    import httpx
+    import main as app_module
+
+    if args.model_backend == "stub":
+        install_stubs(app_module, StubConfig(
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            vision_latency_ms=args.vision_latency_ms,
+            failure_rate=args.failure_rate,
+            throttle_rate=args.throttle_rate,
+            seed=args.seed,
+        ))
+
+    corpus = build_corpus(args.corpus_size, pdf_pages=args.pdf_pages, seed=args.seed, image_ratio=args.image_ratio)
+    latencies: Dict[str, List[float]] = {"pdf": [], "image": []}
+    errors: Dict[str, int] = {}
+    next_request = iter(range(args.requests))
+
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+
+        async def worker() -> None:
+            for index in next_request:
+                filename, file_type, data = corpus[index % len(corpus)]
+                mime = "application/pdf" if file_type == "pdf" else "image/jpeg"
+                started = time.perf_counter()
+                try:
+                    response = await client.post(f"/analyze/{file_type}", files={"file": (filename, data, mime)})
+                    status = response.status_code
+                except Exception as e:
+                    status = type(e).__name__
+                elapsed = time.perf_counter() - started
+                if status == 200:
+                    latencies[file_type].append(elapsed)
+                else:
+                    errors[str(status)] = errors.get(str(status), 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall_seconds = time.perf_counter() - started
+
+    completed = len(latencies["pdf"]) + len(latencies["image"])
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(completed / wall_seconds, 2) if wall_seconds else 0.0,
+        "completed": completed,
+        "errors": errors,
+        "latency": {
+            "all": summarize(latencies["pdf"] + latencies["image"]),
+            "pdf": summarize(latencies["pdf"]),
+            "image": summarize(latencies["image"]),
+        },
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    """Print the change in headline numbers against a previous run"""
+    rows = [("throughput_rps", current["throughput_rps"], previous["throughput_rps"])]
+    for group in ("all", "pdf", "image"):
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            rows.append((f"{group}.{key}", current["latency"][group][key], previous["latency"][group][key]))
+    rows.append(("peak_rss_mb.self", current["peak_rss_mb"]["self"], previous["peak_rss_mb"]["self"]))
+
+    print(f"\n{'metric':<20} {'previous':>12} {'current':>12} {'change':>9}")
+    for name, now, before in rows:
+        change = f"{(now - before) / before:+.1%}" if before else "n/a"
+        print(f"{name:<20} {before:>12} {now:>12} {change:>9}")
+
+def main() -> None:
+    args = parse_args()
+
+    # Configure the app before it is imported
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    os.environ.setdefault("METRICS_ENABLED", "true")
+    if not args.cache:
+        os.environ["ANALYSIS_CACHE_ENABLED"] = "false"
+    os.environ.setdefault("BATCH_DB_PATH", ":memory:")
+    # Keep terms learned during a run out of the next run
+    os.environ.setdefault("GLOSSARY_DB_PATH", "")
+    # Client-side model rate limits would cap throughput before the service does; set these to measure them
+    os.environ.setdefault("MODEL_REQUESTS_PER_MINUTE", "0")
+    os.environ.setdefault("MODEL_TOKENS_PER_MINUTE", "0")
+    if args.model_backend != "stub":
+        if args.model_backend == "replay" and not args.replay_path:
+            raise SystemExit("--model-backend replay needs --replay-path")
+        os.environ["MODEL_BACKEND"] = args.model_backend
+        os.environ["MODEL_REPLAY_PATH"] = args.replay_path or ""
+        os.environ["MODEL_MOCK_LATENCY_MS"] = str(args.latency_ms)
+
+    results = asyncio.run(run(args))
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(json.dumps({key: results[key] for key in ("throughput_rps", "completed", "errors", "latency", "peak_rss_mb")}, indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
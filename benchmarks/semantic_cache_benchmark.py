@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Measure the near-duplicate (semantic) cache: hit rate, false hits and lookup time
+
+Builds synthetic lab reports and fills the cache with their analyses, then
+looks up variants of them:
+
+- reexport: the same results with a new print date, times, sample id and
+  letterhead. These should hit.
+- changed_value: one result changed. These must miss.
+- added_test: one extra test row. These must miss.
+- other_patient: a different patient's report on the same panel. These must miss.
+
+A false hit is any lookup of a must-miss variant that returns an analysis.
+Lookup latency is measured with the cache holding --entries reports.
+
+Usage:
+    python benchmarks/semantic_cache_benchmark.py --output semantic.json
+    python benchmarks/semantic_cache_benchmark.py --threshold 0.8 --compare semantic.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from services.semantic_cache import SemanticCache  # noqa: E402
+
+NAMESPACE = "pdf:benchmark"
+LABS = [
+    ("City Diagnostics", "Plot 12, Ring Road, Sector 4"),
+    ("Metro Pathology Labs", "2nd Floor, Central Plaza"),
+    ("Sunrise Clinical Laboratory", "Near General Hospital"),
+]
+TESTS = [
+    ("Hemoglobin", "g/dL", 13.0, 17.0, "Photometry"), ("Total Leukocyte Count", "cells/cumm", 4000, 11000, "Impedance"),
+    ("Platelet Count", "lakh/cumm", 1.5, 4.1, "Impedance"), ("Fasting Glucose", "mg/dL", 70, 100, "Hexokinase"),
+    ("HbA1c", "%", 4.0, 5.6, "HPLC"), ("Serum Creatinine", "mg/dL", 0.7, 1.3, "Jaffe"),
+    ("Blood Urea", "mg/dL", 15, 40, "Urease"), ("SGPT (ALT)", "U/L", 7, 56, "IFCC"), ("SGOT (AST)", "U/L", 10, 40, "IFCC"),
+    ("Total Cholesterol", "mg/dL", 125, 200, "CHOD-PAP"), ("Triglycerides", "mg/dL", 40, 150, "GPO-PAP"),
+    ("HDL Cholesterol", "mg/dL", 40, 60, "Direct"), ("LDL Cholesterol", "mg/dL", 0, 100, "Calculated"),
+    ("TSH", "uIU/mL", 0.4, 4.2, "CLIA"), ("Vitamin D", "ng/mL", 30, 100, "CLIA"), ("Vitamin B12", "pg/mL", 200, 900, "CLIA"),
+]
+NOTES = (
+    "Interpretation: results should be correlated clinically with history and other investigations. "
+    "Values outside the reference interval are flagged. Fasting for eight to twelve hours is advised "
+    "before lipid and glucose tests. Kindly repeat the test if results do not match the clinical picture."
+)
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=500, help="Reports stored and varied")
+    parser.add_argument("--entries", type=int, default=5000, help="Cache size for the latency measurement")
+    parser.add_argument("--threshold", type=float, default=0.85, help="Similarity threshold")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Print the change against an earlier results file")
+    return parser.parse_args()
+
+def make_report(rng: random.Random) -> Dict[str, Any]:
+    tests = rng.sample(TESTS, rng.randint(8, len(TESTS)))
+    return {
+        "lab": rng.randrange(len(LABS)),
+        "name": rng.choice(["Asha", "Ravi", "Meera", "John", "Fatima", "Chen"]) + " " + rng.choice(["Rao", "Khan", "Smith", "Das"]),
+        "age": rng.randint(18, 85),
+        "sex": rng.choice(["Male", "Female"]),
+        "rows": [(name, round(rng.uniform(low * 0.6, high * 1.4), 1), unit, low, high, method)
+                 for name, unit, low, high, method in tests],
+        "printed": (rng.randint(1, 28), rng.randint(1, 12)),
+        "sample": rng.randint(100000, 999999),
+    }
+
+def render(report: Dict[str, Any]) -> str:
+    lab_name, address = LABS[report["lab"]]
+    day, month = report["printed"]
+    lines = [
+        lab_name, address, "Department of Laboratory Medicine",
+        f"Patient Name: {report['name']}  Age: {report['age']} Years  Sex: {report['sex']}",
+        f"Sample ID: LAB{report['sample']}  Collected: {day:02d}/{month:02d}/2024 08:{day:02d} AM",
+        "Test Name  Result  Unit  Reference Range  Method",
+    ]
+    lines += [f"{name}  {value}  {unit}  {low} - {high}  {method}" for name, value, unit, low, high, method in report["rows"]]
+    lines += [NOTES, f"Printed on {day:02d}/{month:02d}/2024 {day % 12 + 1}:15 PM", "*** End of Report ***"]
+    return "\n".join(lines)
+
+def variants(report: Dict[str, Any], rng: random.Random) -> List[Tuple[str, Dict[str, Any]]]:
+    reexport = dict(report, lab=(report["lab"] + 1) % len(LABS), printed=(rng.randint(1, 28), rng.randint(1, 12)),
+                    sample=rng.randint(100000, 999999))
+    rows = list(report["rows"])
+    index = rng.randrange(len(rows))
+    name, value, unit, low, high, method = rows[index]
+    changed = dict(report, rows=rows[:index] + [(name, round(value * 1.1 + 0.1, 1), unit, low, high, method)] + rows[index + 1:])
+    missing = [test for test in TESTS if test[0] not in {row[0] for row in rows}]
+    extra = rng.choice(missing) if missing else TESTS[0]
+    added = dict(report, rows=rows + [(extra[0], round(extra[3] * 0.5, 1), extra[1], extra[2], extra[3], extra[4])])
+    other = make_report(rng)
+    other["rows"] = [(n, round(v * rng.uniform(0.8, 1.2), 1), u, lo, hi, m) for n, v, u, lo, hi, m in rows]
+    return [("reexport", reexport), ("changed_value", changed), ("added_test", added), ("other_patient", other)]
+
+def measure(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(7)
+    cache = SemanticCache(threshold=args.threshold, max_entries=max(args.entries, args.reports))
+    reports = [make_report(rng) for _ in range(args.reports)]
+    for index, report in enumerate(reports):
+        cache.add(render(report), NAMESPACE, {"report": index})
+
+    outcomes: Dict[str, Dict[str, int]] = {}
+    for index, report in enumerate(reports):
+        for kind, variant in variants(report, rng):
+            counts = outcomes.setdefault(kind, {"lookups": 0, "hits": 0, "wrong_hits": 0})
+            value = cache.lookup(render(variant), NAMESPACE)
+            counts["lookups"] += 1
+            if value is not None:
+                counts["hits"] += 1
+                counts["wrong_hits"] += value["report"] != index
+
+    # Latency with a full cache
+    while cache.stats()["entries"] < args.entries:
+        cache.add(render(make_report(rng)), NAMESPACE, {"report": -1})
+    timings = []
+    for report in reports[:200]:
+        text = render(variants(report, rng)[0][1])
+        started = time.perf_counter()
+        cache.lookup(text, NAMESPACE)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+
+    must_miss = [outcomes[kind] for kind in ("changed_value", "added_test", "other_patient")]
+    return {
+        "threshold": args.threshold,
+        "reports": args.reports,
+        "reexport_hit_rate": round(outcomes["reexport"]["hits"] / outcomes["reexport"]["lookups"], 4),
+        "reexport_wrong_hits": outcomes["reexport"]["wrong_hits"],
+        "false_hit_rate": round(sum(o["hits"] for o in must_miss) / sum(o["lookups"] for o in must_miss), 4),
+        "outcomes": outcomes,
+        "guard_rejections": cache.stats()["guard_rejections"],
+        "entries": args.entries,
+        "lookup_p50_ms": round(timings[len(timings) // 2], 3),
+        "lookup_p95_ms": round(timings[int(len(timings) * 0.95)], 3),
+    }
+
+def main() -> None:
+    args = parse_args()
+    results = measure(args)
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for name in ("reexport_hit_rate", "false_hit_rate", "lookup_p50_ms", "lookup_p95_ms"):
+            print(f"{name:20} {baseline.get(name)!s:>10} -> {results[name]!s:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Measure cold-start cost of the Medical Report Analyzer API
+
+Each run starts a fresh interpreter and times importing the app, building
+the Gemini clients (no network calls are made), and the first and second
+analysis requests against stubbed models. Medians across runs are written
+to a JSON file that can be compared between runs.
+
+Usage:
+    python benchmarks/startup.py --runs 5 --output startup.json
+    python benchmarks/startup.py --output after.json --compare startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter; prints one JSON object of timings in milliseconds
+CHILD = r"""
+import asyncio, json, os, sys, time
+sys.path.insert(0, {root!r})
+sys.path.insert(0, os.path.join({root!r}, "backend"))
+
+started = time.perf_counter()
+import main
+import_ms = (time.perf_counter() - started) * 1000
+
+from utils.clients import get_clients
+started = time.perf_counter()
+get_clients().warm_up()
+clients_ms = (time.perf_counter() - started) * 1000
+
+import httpx
+from benchmarks.corpus import build_corpus
+from benchmarks.stubs import StubConfig, install_stubs
+
+install_stubs(main, StubConfig(latency_ms=0, jitter_ms=0, vision_latency_ms=0))
+_, _, pdf = build_corpus(1, pdf_pages=4, seed=1, image_ratio=0.0)[0]
+
+async def requests():
+    timings = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+        for _ in range(2):
+            started = time.perf_counter()
+            response = await client.post("/analyze/pdf", files={{"file": ("report.pdf", pdf, "application/pdf")}})
+            response.raise_for_status()
+            timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+first_ms, second_ms = asyncio.run(requests())
+main.shutdown_process_pool()
+print(json.dumps({{
+    "import_ms": import_ms,
+    "client_init_ms": clients_ms,
+    "first_request_ms": first_ms,
+    "second_request_ms": second_ms,
+}}))
+"""
+
+def run_once() -> Dict[str, float]:
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "benchmark")
+    env["ANALYSIS_CACHE_ENABLED"] = "false"
+    env["BATCH_DB_PATH"] = ":memory:"
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD.format(root=ROOT)],
+        env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to start")
+    parser.add_argument("--output", default="startup_results.json", help="Where to write results")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    args = parser.parse_args()
+
+    samples: Dict[str, List[float]] = {}
+    for _ in range(args.runs):
+        for phase, value in run_once().items():
+            samples.setdefault(phase, []).append(value)
+
+    results = {
+        "runs": args.runs,
+        "median_ms": {phase: round(statistics.median(values), 1) for phase, values in samples.items()},
+        "samples_ms": {phase: [round(value, 1) for value in values] for phase, values in samples.items()},
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results["median_ms"], indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)["median_ms"]
+        print(f"\n{'phase (median ms)':<20} {'previous':>10} {'current':>10} {'change':>9}")
+        for phase, now in results["median_ms"].items():
+            before = previous.get(phase)
+            change = f"{(now - before) / before:+.1%}" if before else "n/a"
+            print(f"{phase:<20} {before if before is not None else '-':>10} {now:>10} {change:>9}")
+
+if __name__ == "__main__":
+    main()
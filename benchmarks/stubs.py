@@ -0,0 +1,162 @@
+"""
+Local stand-ins for the Gemini clients used by the backend
+
+FakeChatModel replaces ChatGoogleGenerativeAI and FakeGenerativeModel replaces
+genai.GenerativeModel. Both inject configurable latency and failures so the
+API can be load-tested without network access or an API key.
+"""
+
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, List, Optional
+
+ANALYSIS_RESPONSE = {
+    "summary": "Most results are within normal limits. LDL cholesterol is mildly elevated.",
+    "key_findings": [
+        "LDL cholesterol is above the reference range",
+        "Blood glucose and HbA1c are normal",
+        "Kidney function (eGFR) is normal"
+    ],
+    "lifestyle_recommendations": [
+        "Reduce saturated fat intake",
+        "Exercise for at least 30 minutes most days"
+    ],
+    "precautions": [
+        "Repeat the lipid panel in 3 months",
+        "This analysis is for informational purposes only"
+    ],
+    "confidence_score": 0.88
+}
+
+TERMS_RESPONSE = {
+    "LDL": "Low-density lipoprotein, often called 'bad' cholesterol",
+    "HbA1c": "Average blood sugar over the past 2-3 months",
+    "eGFR": "An estimate of how well the kidneys filter blood"
+}
+
+class StubModelError(Exception):
+    """Injected upstream failure; ``code`` is the HTTP status, like google.api_core errors"""
+
+    def __init__(self, message: str, code: int):
+        super().__init__(message)
+        self.code = code
+
+@dataclass
+class StubConfig:
+    """Latency and failure injection for the stub models"""
+    latency_ms: float = 800.0
+    jitter_ms: float = 200.0
+    vision_latency_ms: float = 1500.0
+    failure_rate: float = 0.0
+    throttle_rate: float = 0.0
+    seed: Optional[int] = None
+
+class _StubBase:
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.calls = 0
+
+    def _delay(self, base_ms: float) -> float:
+        jitter = self.random.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+        return max(0.0, base_ms + jitter) / 1000
+
+    def _maybe_fail(self) -> None:
+        self.calls += 1
+        roll = self.random.random()
+        if roll < self.config.throttle_rate:
+            raise StubModelError("Injected throttling (429 Resource exhausted)", 429)
+        if roll < self.config.throttle_rate + self.config.failure_rate:
+            raise StubModelError("Injected model failure (503 Service unavailable)", 503)
+
+    @staticmethod
+    def _answer(prompt: str) -> str:
+        if "identify complex medical terms" in prompt:
+            return json.dumps(TERMS_RESPONSE)
+        if '"complex_terms"' in prompt:
+            return json.dumps({**ANALYSIS_RESPONSE, "complex_terms": TERMS_RESPONSE})
+        return json.dumps(ANALYSIS_RESPONSE)
+
+@dataclass
+class _Message:
+    content: str
+    usage_metadata: Optional[dict] = None
+
+class FakeChatModel(_StubBase):
+    """Stand-in for ChatGoogleGenerativeAI (ainvoke/astream)"""
+
+    async def ainvoke(self, messages: List[Any]) -> _Message:
+        prompt = messages[-1].content
+        await asyncio.sleep(self._delay(self.config.latency_ms))
+        self._maybe_fail()
+        answer = self._answer(prompt)
+        return _Message(answer, {"input_tokens": len(prompt) // 4, "output_tokens": len(answer) // 4})
+
+    async def astream(self, messages: List[Any]) -> AsyncIterator[_Message]:
+        prompt = messages[-1].content
+        # Time to first token is a fraction of the full latency
+        total = self._delay(self.config.latency_ms)
+        await asyncio.sleep(total * 0.2)
+        self._maybe_fail()
+        answer = self._answer(prompt)
+        pieces = [answer[i:i + 16] for i in range(0, len(answer), 16)]
+        for piece in pieces:
+            await asyncio.sleep(total * 0.8 / len(pieces))
+            yield _Message(piece)
+
+@dataclass
+class _Usage:
+    prompt_token_count: int
+    candidates_token_count: int
+
+@dataclass
+class _GenerateResponse:
+    text: str
+    usage_metadata: Optional[_Usage] = None
+
+class FakeGenerativeModel(_StubBase):
+    """Stand-in for genai.GenerativeModel (text and vision calls)"""
+
+    VISION_TEXT = (
+        "City Hospital Laboratory\n"
+        "Lipid Panel\n"
+        "Total Cholesterol 212 mg/dL 125-200 H\n"
+        "LDL Cholesterol 141 mg/dL 0-100 H\n"
+        "HDL Cholesterol 52 mg/dL 40-60\n"
+        "HbA1c 5.4 % 4.0-5.6\n"
+    )
+
+    def _respond(self, contents: Any) -> _GenerateResponse:
+        self._maybe_fail()
+        if isinstance(contents, list):
+            return _GenerateResponse(self.VISION_TEXT, _Usage(258, len(self.VISION_TEXT) // 4))
+        answer = self._answer(contents)
+        return _GenerateResponse(answer, _Usage(len(contents) // 4, len(answer) // 4))
+
+    async def generate_content_async(self, contents: Any, **kwargs: Any) -> _GenerateResponse:
+        base = self.config.vision_latency_ms if isinstance(contents, list) else self.config.latency_ms
+        await asyncio.sleep(self._delay(base))
+        return self._respond(contents)
+
+    def generate_content(self, contents: Any, **kwargs: Any) -> _GenerateResponse:
+        base = self.config.vision_latency_ms if isinstance(contents, list) else self.config.latency_ms
+        time.sleep(self._delay(base))
+        return self._respond(contents)
+
+def install_stubs(app_module: Any, config: StubConfig) -> None:
+    """
+    Swap the Gemini clients of an imported backend ``main`` module for stubs
+
+    Args:
+        app_module: The imported backend main module
+        config: Latency and failure injection settings
+    """
+    chat = FakeChatModel(config)
+    model = FakeGenerativeModel(config)
+
+    # Both services (and the Gemini Vision OCR engine) get their clients from the shared registry
+    from utils.clients import get_clients
+    get_clients().override(model=model, chat=chat)
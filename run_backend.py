@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 """
 Startup script for the Medical Report Analyzer Backend
+
+    python run_backend.py                 # development: one process, auto-reload
+    python run_backend.py --production    # multi-worker server, no reload
 """
 
+import argparse
 import os
 import sys
 from dotenv import load_dotenv
@@ -13,11 +17,86 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'backend'))
 # Load environment variables
 load_dotenv()
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Start the Medical Report Analyzer backend")
+    parser.add_argument("--production", action="store_true",
+                        help="Run multiple worker processes without auto-reload")
+    parser.add_argument("--workers", type=int,
+                        help="Worker processes in production mode (default: SERVER_WORKERS, else one per CPU)")
+    return parser.parse_args()
+
+def run_production(workers=None):
+    """
+    Start the multi-worker production server
+
+    Uses gunicorn with uvicorn workers when gunicorn is installed: the app is
+    preloaded once and forked, workers are recycled after SERVER_MAX_REQUESTS
+    requests, and a stopping worker gets SERVER_GRACEFUL_TIMEOUT seconds to
+    finish in-flight analyses. Without gunicorn, uvicorn's own multi-process
+    mode is used (no preloading).
+    """
+    # Workers size their process pools from SERVER_WORKERS, so resolve it before the app is imported
+    workers = workers or int(os.getenv("SERVER_WORKERS", "0")) or os.cpu_count() or 1
+    os.environ["SERVER_WORKERS"] = str(workers)
+
+    from utils.config import get_settings
+    settings = get_settings()
+
+    print(f"🏥 Starting Medical Report Analyzer Backend with {workers} workers...")
+    print(f"📍 Server will be available at: http://{settings.backend_host}:{settings.backend_port}")
+    print("-" * 50)
+
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        import uvicorn
+        print("gunicorn is not installed; using uvicorn workers without preloading")
+        uvicorn.run(
+            "main:app",
+            host=settings.backend_host,
+            port=settings.backend_port,
+            workers=workers,
+            limit_max_requests=settings.server_max_requests or None,
+            timeout_graceful_shutdown=int(settings.server_graceful_timeout),
+            log_level="info"
+        )
+        return
+
+    class ProductionServer(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{settings.backend_host}:{settings.backend_port}",
+                "workers": workers,
+                "worker_class": "uvicorn.workers.UvicornWorker",
+                "preload_app": settings.server_preload,
+                "max_requests": settings.server_max_requests,
+                "max_requests_jitter": settings.server_max_requests_jitter,
+                "graceful_timeout": int(settings.server_graceful_timeout),
+                "loglevel": "info",
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            if settings.server_preload:
+                # Load the client libraries in the parent so forked workers share them
+                from utils.clients import preload_modules
+                preload_modules()
+            from main import app
+            return app
+
+    ProductionServer().run()
+
 def main():
     """Start the backend server"""
+    args = parse_args()
     try:
-        # Import and run the backend
-        from backend.main import app
+        if args.production:
+            run_production(args.workers)
+            return
+        
+        # Import the app here (uvicorn reloads it by path) so missing dependencies are reported below
+        from backend.main import app  # noqa: F401
         import uvicorn
         from backend.utils.config import get_settings
         